@@ -0,0 +1,76 @@
+"""Benchmark of pydump with many derived type objects
+This builds a binary tree of Type1 objects, linked through the next and prev
+pointers, and times the dumping of it. The time should scale linearly with
+the number of objects, so the dump is also done with a tenth of the objects,
+and the benchmark fails if the time grows much faster than the number of
+objects, or if not all of the objects are written.
+usage: python dumpbenchmark.py [nobjects] [filename]
+If a file name is given, the data is written to that file, otherwise it is
+discarded so that only the time spent in pydump is measured.
+"""
+import sys,time
+from Forthon import *
+from examplepy import *
+
+# --- The largest allowed ratio of the dump times for ten times as many
+# --- objects. It would be 10 for linear scaling and 100 for quadratic.
+maxtimeratio = 30.
+
+class NullWriter:
+    """Data writer that discards the data, counting the number of writes."""
+    file_type = 'null'
+    def __init__(self,fname=None):
+        self.nwrites = 0
+    def write(self,name,v):
+        self.nwrites = self.nwrites + 1
+    def defent(self,name,v,shape):
+        self.nwrites = self.nwrites + 1
+    def close(self):
+        pass
+
+def maketree(nobjects):
+    # --- The objects are linked so that the children of object i are
+    # --- objects 2*i+1 and 2*i+2, keeping the depth of the tree small.
+    objects = [Type1() for i in range(nobjects)]
+    for i in range(nobjects):
+        objects[i].j = i
+        if 2*i+1 < nobjects: objects[i].next = objects[2*i+1]
+        if 2*i+2 < nobjects: objects[i].prev = objects[2*i+2]
+    return objects
+
+def timedump(nobjects,fname=None):
+    starttime = time.time()
+    objects = maketree(nobjects)
+    example.t2 = objects[0]
+    print 'Created %d Type1 objects in %f seconds'%(nobjects,time.time()-starttime)
+
+    if fname is None:
+        fname = 'null'
+        datawriter = NullWriter
+    else:
+        datawriter = None
+
+    starttime = time.time()
+    fobjlist = pydump(fname,attr='Module2',datawriter=datawriter,
+                      returnfobjlist=1)
+    dumptime = time.time() - starttime
+    print 'Dumped %d objects in %f seconds'%(len(fobjlist),dumptime)
+    return len(fobjlist),dumptime
+
+nobjects = 100000
+if len(sys.argv) > 1: nobjects = int(sys.argv[1])
+fname = None
+if len(sys.argv) > 2: fname = sys.argv[2]
+
+nsmall,smalltime = timedump(nobjects/10,fname)
+nlarge,largetime = timedump(nobjects,fname)
+
+# --- Each Type1 object has a static Type2 object. The objects in t1 are
+# --- also written.
+if nlarge != 2*nobjects + 2:
+    print 'Error: %d objects were written, expected %d'%(nlarge,2*nobjects+2)
+    sys.exit(1)
+if largetime > maxtimeratio*max(smalltime,0.01):
+    print 'Error: the dump time grew by a factor of %f for ten times the objects'%(largetime/smalltime)
+    sys.exit(1)
+print 'Dump time scales with the number of objects'
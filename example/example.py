@@ -71,6 +71,101 @@ print xx
 print example.xxx
 print ''
 
+print 'Testing changing the size of a growable array in place'
+example.ng = 4
+example.gchange('Module1')
+example.g[...] = reshape(arange(8.),(2,4),order='F')
+example.ng = 5
+example.gchange('Module1')
+address = example.g.ctypes.data
+example.ng = 6
+example.gchange('Module1')
+print example.g
+print example.g.ctypes.data == address
+print 'Should be'
+print '[[ 0.  2.  4.  6.  2.  2.]'
+print ' [ 1.  3.  5.  7.  2.  2.]]'
+print 'True'
+print ''
+
+print 'Testing an array mapped to a file'
+import glob
+example.nm = 3
+example.gchange('Module1')
+example.mm[0] = 1.
+print example.mm,len(glob.glob('example.mm.*'))
+example.nm = 0
+example.gchange('Module1')
+print len(glob.glob('example.mm.*'))
+print 'Should be'
+print '[ 1.  3.  3.] 1'
+print '0'
+print 'With a scratch directory that does not exist, the array is allocated'
+print 'in memory, after the warning below'
+setscratchdir('/nonexistent')
+example.nm = 2
+example.gchange('Module1')
+setscratchdir(None)
+print example.mm
+print 'Should be'
+print '[ 3.  3.]'
+print ''
+
+print 'Testing subroutines that release the GIL'
+import threading
+aa = [fzeros(4,'d') for i in range(2)]
+threads = [threading.Thread(target=testreleasegil,args=(4,a)) for a in aa]
+for t in threads: t.start()
+for t in threads: t.join()
+print aa[0],aa[1]
+try:
+    testkaboom()
+except RuntimeError,e:
+    print e
+testreleasegil(4,aa[0])
+print aa[0]
+print 'Should be'
+print '[  1.   4.   9.  16.] [  1.   4.   9.  16.]'
+print 'testkaboom was called'
+print '[  1.   4.   9.  16.]'
+print ''
+
+print 'Testing the intents of array arguments'
+print 'The strided arrays are copied into temporaries. The temporary of the'
+print 'intent in argument is not copied back, and the one of the intent out'
+print 'argument is copied back.'
+aa = arange(6.)[::2]
+bb = (7.*ones(6))[::2]
+cc = fones(3,'d')
+testintents(3,aa,bb,cc)
+print aa,bb,cc
+print 'Should be'
+print '[ 0.  2.  4.] [ 2.  2.  2.] [ 2.  2.  2.]'
+print ''
+
+print 'Testing returning intent out scalars'
+m,x = testoutscalars(3,[1.,2.,3.])
+print m,x
+print testoutfunction(4.)
+print 'Should be'
+print '6 6.0'
+print '(8.0, 7)'
+print ''
+
+print 'Testing passing an assumed shape array'
+print 'A strided view is passed without a copy, so the change made to it in'
+print 'fortran is seen even though the argument is intent in.'
+xx = reshape(arange(12.),(4,3),order='F')
+print testassumedshape(xx[::2,:])
+print xx
+print 'Should be'
+print '30.0'
+print '[[ -1.  -1.  -1.]'
+print ' [  1.   5.   9.]'
+print ' [  2.   6.  10.]'
+print ' [  3.   7.  11.]]'
+print ''
+
 print 'Testing set and get actions on variables'
 print 'The text "action1 is being set to 1" should be printed below'
 example.action1 = 1
@@ -27,7 +27,7 @@ example
 # group will have that attribute (unless explicitly removed). The attributes
 # are primarily used in python to select subsets of variables. For example the
 # command example.varlist('test') will return a list of all variables with
-# the attribute test. There are three special attributes.
+# the attribute test. There are five special attributes.
 #   dump: The function dump will by default write to the dump file all
 #         variables with the attribute dump.
 #   fassign: This only affects array pointers. For arrays with
@@ -36,6 +36,19 @@ example
 #            have it be recognized in python.
 #   hidden: Variables with this attribute will be hidden and not be accessible
 #           from python.
+#   growable: This only affects dynamic arrays. For arrays with this
+#             attribute, gchange allocates extra space in the last dimension
+#             so that when only the last dimension changes, the array can be
+#             resized in place without copying the data. The extra space
+#             grows geometrically so repeated small increases are cheap.
+#   mmap: This only affects dynamic arrays. For arrays with this attribute,
+#         the space is a shared memory mapping of a file in the scratch
+#         directory, so the array can be larger than the physical memory and
+#         can be opened by other processes. The file is named
+#         pkg.varname.pid.n, and is removed when the array is freed, but is
+#         left on disk if the process dies. The scratch directory can be set
+#         with setscratchdir(), or with the environment variable
+#         FORTHON_SCRATCHDIR, and defaults to the current directory.
 #
 # The definition of scalar variables has the following format
 #   varname type /initvalue/ [units] +attr1 -attr2 SET GET # documentation
@@ -85,10 +98,35 @@ example
 # each followed by a colon and its type (e.g. x:real,i:integer). The type
 # can be any of the types of scalars. For array arguments, the elemental type
 # is given.
+# The type can be followed by the intent of the argument, one of in, out,
+# or inout, for example x:real:in. The default is inout. When an array
+# argument has to be copied into a temporary (for example if it has the wrong
+# type or is not contiguous), the temporary is only copied back for
+# arguments that are not intent in, and the data is only copied into it for
+# arguments that are not intent out.
+# Numeric scalar arguments that are intent out are not passed in from python.
+# Instead, their values are returned, after the function value for functions,
+# as a tuple if there is more than one value. For example, with
+# sub(n:integer,m:integer:out,x:real:out), m,x = sub(n).
+# Array arguments can be declared as assumed shape, for example
+# x(:,:):real. These are passed with a C descriptor which includes the
+# strides, so that views of arrays, such as a[::2,:], are passed without
+# being copied. The fortran routine must have assumed shape dummy arguments
+# and be declared with bind(C), for example
+#   subroutine sub(x) bind(C)
+#   real(8):: x(:,:)
+# Only numeric arguments can be assumed shape, and a routine with assumed
+# shape arguments cannot have string arguments.
 # Though subroutines are listed inside of modules, this does not imply that
 # the fortran module will contain the subroutine. Actually, because
 # fortran compilers do name mangling of subroutines in modules, the
 # subroutines must be outside of a module.
+# Subroutines and functions with the releasegil attribute (e.g. +releasegil)
+# release the python global interpreter lock while the fortran is running,
+# allowing other python threads to run. This can be done for all routines
+# with the --releasegil command line option. Note that the routine must not
+# access any python data that other threads may be changing. Any callbacks
+# into python (such as gallot or gchange) will reacquire the lock.
 #
 # Functions can be defined using the format
 #   funname(arglist) funtype function # documentation
@@ -124,6 +162,10 @@ xxx(:,:) _real # Sample multidimensional array
 l1 logical /.false./ # Sample logical variable
 realvar real /1./
 varreal real /2./
+ng integer /0/ # Size of the growable array
+g(2,ng) _real /2./ +growable # Sample array that can be resized in place
+nm integer /0/ # Size of the mapped array
+mm(nm) _real /3./ +mmap # Sample array whose space is a mapped file
 
 %%%%% Type2:
 ii integer
@@ -162,6 +204,17 @@ testsub10(ii:integer,aa(1:nn,3):real,nn:integer) subroutine
 a1() subroutine
 a2() subroutine
 a3() subroutine
+testreleasegil(n:integer,a(n):real) subroutine +releasegil
+   # Test a subroutine that releases the GIL
+testkaboom() subroutine +releasegil # Test an error with the GIL released
+testassumedshape(a(:,:):real:in,s:real:out) subroutine
+   # Test passing an assumed shape array
+testintents(n:integer,a(n):real:in,b(n):real:out,c(n):real) subroutine
+   # Test the intents of array arguments
+testoutscalars(n:integer,m:integer:out,x:real:out,a(n):real) subroutine
+   # Test returning intent out scalars
+testoutfunction(m:integer:out,x:real) real function
+   # Test returning an intent out scalar from a function
 
 ****** Stringtest:
 tstring character*4 /"////"/ # test "/" in strings
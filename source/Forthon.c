@@ -4,6 +4,10 @@
 #include "Python.h"
 #include "forthonf2c.h"
 
+/* Note that these routines may be called from fortran routines whose      */
+/* wrappers have released the GIL, so each must acquire the GIL before     */
+/* doing anything with python objects.                                     */
+
 static char* cstrfromfstr(char *fstr,int fstrlen)
 {
   char* cname;
@@ -18,6 +22,8 @@ void
 {
   char *cname;
   PyObject *m, *d, *f, *r;
+  PyGILState_STATE gstate;
+  gstate = PyGILState_Ensure();
   cname = cstrfromfstr(FSTRPTR(name),FSTRLEN1(name));
 
   m = PyImport_ImportModule("Forthon");
@@ -33,6 +39,7 @@ void
 
   PyMem_Free(cname);
   if (PyErr_Occurred()) PyErr_Print();
+  PyGILState_Release(gstate);
 }
 
 void
@@ -40,6 +47,8 @@ void
 {
   char *cname;
   PyObject *m, *d, *f, *r;
+  PyGILState_STATE gstate;
+  gstate = PyGILState_Ensure();
   cname = cstrfromfstr(FSTRPTR(name),FSTRLEN1(name));
 
   m = PyImport_ImportModule("Forthon");
@@ -54,6 +63,7 @@ void
   Py_XDECREF(m);
 
   PyMem_Free(cname);
+  PyGILState_Release(gstate);
 }
 
 void
@@ -61,6 +71,8 @@ void
 {
   char *cname;
   PyObject *m, *d, *f, *r;
+  PyGILState_STATE gstate;
+  gstate = PyGILState_Ensure();
   cname = cstrfromfstr(FSTRPTR(name),FSTRLEN1(name));
 
   m = PyImport_ImportModule("Forthon");
@@ -75,6 +87,7 @@ void
   Py_XDECREF(m);
 
   PyMem_Free(cname);
+  PyGILState_Release(gstate);
 }
 
 void
@@ -82,6 +95,8 @@ void
 {
   char *cname;
   PyObject *m, *d, *f, *r;
+  PyGILState_STATE gstate;
+  gstate = PyGILState_Ensure();
   cname = cstrfromfstr(FSTRPTR(name),FSTRLEN1(name));
 
   m = PyImport_ImportModule("Forthon");
@@ -96,6 +111,7 @@ void
   Py_XDECREF(m);
 
   PyMem_Free(cname);
+  PyGILState_Release(gstate);
 }
 
 /* The following routines are used when dealing with fortran derived types. */
@@ -103,6 +119,8 @@ void
 %fname('tallot')+'(PyObject **self)'
 {
   PyObject *pname, *f, *r;
+  PyGILState_STATE gstate;
+  gstate = PyGILState_Ensure();
   pname = Py_BuildValue("s","gallot");
   f = PyObject_GetAttr(*self,pname);
   if (f != NULL) {
@@ -111,12 +129,15 @@ void
     Py_XDECREF(r);
   }
   Py_DECREF(pname);
+  PyGILState_Release(gstate);
 }
 
 void
 %fname('tchange')+'(PyObject **self)'
 {
   PyObject *pname, *f, *r;
+  PyGILState_STATE gstate;
+  gstate = PyGILState_Ensure();
   pname = Py_BuildValue("s","gchange");
   f = PyObject_GetAttr(*self,pname);
   if (f != NULL) {
@@ -125,12 +146,15 @@ void
     Py_XDECREF(r);
   }
   Py_DECREF(pname);
+  PyGILState_Release(gstate);
 }
 
 void
 %fname('tfree')+'(PyObject **self)'
 {
   PyObject *pname, *f, *r;
+  PyGILState_STATE gstate;
+  gstate = PyGILState_Ensure();
   pname = Py_BuildValue("s","gfree");
   f = PyObject_GetAttr(*self,pname);
   if (f != NULL) {
@@ -139,6 +163,7 @@ void
     Py_XDECREF(r);
   }
   Py_DECREF(pname);
+  PyGILState_Release(gstate);
 }
 
 /* ---------------------------------------------------------------------- */
@@ -148,28 +173,36 @@ void
 {
   char *ctext;
   PyObject *pystdout;
+  PyGILState_STATE gstate;
+  gstate = PyGILState_Ensure();
   ctext = cstrfromfstr(FSTRPTR(text),FSTRLEN1(text));
   pystdout = PySys_GetObject("stdout");
   PyFile_WriteString(ctext,pystdout);
   PyFile_WriteString("\n",pystdout);
   PyMem_Free(ctext);
+  PyGILState_Release(gstate);
 }
 
 void
 %fname('parsestr')+'(FSTRING fstr SL1)'
 {
   char *cfstr;
+  PyGILState_STATE gstate;
+  gstate = PyGILState_Ensure();
   cfstr = (char *) PyMem_Malloc((FSTRLEN1(fstr)+1)*sizeof(char));
   memcpy(cfstr,FSTRPTR(fstr),FSTRLEN1(fstr));
   cfstr[FSTRLEN1(fstr)+0] = (char)0;
   PyRun_SimpleString(cfstr);
   PyMem_Free(cfstr);
+  PyGILState_Release(gstate);
 }
 
 void
 %fname('execuser')+'(FSTRING fstr SL1)'
 {
   char *cfstr;
+  PyGILState_STATE gstate;
+  gstate = PyGILState_Ensure();
   cfstr = (char *) PyMem_Malloc((FSTRLEN1(fstr)+3)*sizeof(char));
   memcpy(cfstr,FSTRPTR(fstr),FSTRLEN1(fstr));
   if (cfstr[FSTRLEN1(fstr)-1]==')') {
@@ -182,6 +215,7 @@ void
     }
   PyRun_SimpleString(cfstr);
   PyMem_Free(cfstr);
+  PyGILState_Release(gstate);
 }
 
 int
@@ -236,6 +270,8 @@ void
   /* This should be more robust, since it lets python take care of the */
   /* portability. */
   PyObject *m, *d, *f, *r;
+  PyGILState_STATE gstate;
+  gstate = PyGILState_Ensure();
   m = PyImport_ImportModule("time");
   if (m != NULL) {
     d = PyModule_GetDict(m);
@@ -247,6 +283,7 @@ void
         Py_XDECREF(r);
   }}}
   Py_XDECREF(m);
+  PyGILState_Release(gstate);
   *io  = (double) 0.;
   *sys = (double) 0.;
   *mem = (double) 0.;
@@ -295,21 +332,63 @@ void
 /* an error value which the wrapper checks. It there was an exception,     */
 /* the the wrapper returns.                                                */
 /* Note that stackenvironment is used as a global and is what is passed */
-/* into the calls to setjmp. */
+/* into the calls to setjmp. It is thread local since fortran routines    */
+/* can be running in several threads at once when the GIL is released.   */
+/* The GIL is always held by this thread after the longjmp, so the      */
+/* wrapper does not need to reacquire it, even if it had been released   */
+/* around the call to fortran.                                           */
+/* The longjmp skips over any calls to callpythonfunc that are in        */
+/* progress, for example when kaboom is called from fortran that was     */
+/* called from a python callback, so the PyGILState_Ensure done by each  */
+/* of them must also be released. Their states are kept in a linked list */
+/* with the nodes on the stack of callpythonfunc, with gilstates the     */
+/* innermost one.                                                        */
 
 #include <setjmp.h>
-jmp_buf stackenvironment;
-int lstackenvironmentset;
+FORTHON_THREADLOCAL jmp_buf stackenvironment;
+FORTHON_THREADLOCAL int lstackenvironmentset;
+
+/* The number of wrappers in this thread that have released the GIL and  */
+/* are still running. Each also counts itself in Forthon_fstate->nreleased, */
+/* so after a longjmp, the outermost wrapper uses this to undo the counts */
+/* of the wrappers that were skipped over.                                */
+FORTHON_THREADLOCAL long lnreleased;
+
+typedef struct Forthon_gilstate_ {
+  PyGILState_STATE gstate;
+  struct Forthon_gilstate_ *prev;
+} Forthon_gilstate;
+static FORTHON_THREADLOCAL Forthon_gilstate *gilstates;
+
+/* Releases gstate and the states of the calls to callpythonfunc in   */
+/* progress, innermost first, then does the longjmp. Releasing a state */
+/* that was unlocked, i.e. the GIL was not held when it was ensured,   */
+/* releases the GIL, so it is reacquired, since it is needed for the   */
+/* next release and by the wrapper after the longjmp. */
+static void longjmpwithgilstate(PyGILState_STATE gstate)
+{
+  PyThreadState *tstate = PyGILState_GetThisThreadState();
+  for (;;) {
+    PyGILState_Release(gstate);
+    if (gstate == PyGILState_UNLOCKED) PyEval_RestoreThread(tstate);
+    if (gilstates == NULL) break;
+    gstate = gilstates->gstate;
+    gilstates = gilstates->prev;
+    }
+  lstackenvironmentset = 0;
+  longjmp(stackenvironment,1);
+}
 
 void
 %fname('kaboom')+'(FSTRING message SL1)'
 {
   char *errormessage;
+  PyGILState_STATE gstate;
+  gstate = PyGILState_Ensure();
   errormessage = cstrfromfstr(FSTRPTR(message),FSTRLEN1(message));
   PyErr_SetString(PyExc_RuntimeError,errormessage);
   PyMem_Free(errormessage);
-  lstackenvironmentset = 0;
-  longjmp(stackenvironment,1);
+  longjmpwithgilstate(gstate);
   /* exit(1); */
 }
 
@@ -327,6 +406,10 @@ void
   PyObject *r=NULL;
   int m_is_borrowed = 1;
   char *errormessage=NULL;
+  Forthon_gilstate gilstate;
+  gilstate.gstate = PyGILState_Ensure();
+  gilstate.prev = gilstates;
+  gilstates = &gilstate;
   cfname = (char *) PyMem_Malloc((FSTRLEN1(fname)+1)*sizeof(char));
   cmname = (char *) PyMem_Malloc((FSTRLEN2(mname)+1)*sizeof(char));
 
@@ -426,6 +509,8 @@ void
     Py_XDECREF(m);
     }
   Py_XDECREF(r);
+  gilstates = gilstate.prev;
+  PyGILState_Release(gilstate.gstate);
 
   return;
 
@@ -436,7 +521,7 @@ err:
     }
   PyMem_Free(cfname);
   PyMem_Free(cmname);
-  lstackenvironmentset = 0;
-  longjmp(stackenvironment,1);
+  gilstates = gilstate.prev;
+  longjmpwithgilstate(gilstate.gstate);
 }
 
@@ -24,15 +24,44 @@ typedef PyArrayObject PyArrayObject_fields;
 #include <pythonrun.h>
 #include "forthonf2c.h"
 
+#ifndef _WIN32
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <fcntl.h>
+#include <unistd.h>
+#include <errno.h>
+#include <sys/time.h>
+#ifndef MAP_ANONYMOUS
+#define MAP_ANONYMOUS MAP_ANON
+#endif
+#else
+#include <malloc.h>
+#include <time.h>
+#endif
+
 static PyObject *ErrorObject;
 
 #define returnnone {Py_INCREF(Py_None);return Py_None;}
 
+/* Checks if the object is a fortran ordered, aligned and writeable  */
+/* array of the requested type, which can be passed to fortran as is. */
+static int Forthon_isfarray(PyObject *A2, int ARRAY_TYPE) {
+  return (PyArray_Check(A2) &&
+          PyArray_TYPE((PyArrayObject *)A2) == ARRAY_TYPE &&
+          PyArray_ISFARRAY((PyArrayObject *)A2) &&
+          PyArray_ISNOTSWAPPED((PyArrayObject *)A2));
+}
+
 /* This converts a python object into a python array,         */
 /* requesting fortran ordering.                               */
 static PyArrayObject* FARRAY_FROMOBJECT(PyObject *A2, int ARRAY_TYPE) {
   PyArrayObject *A1;
   PyArray_Descr *descr;
+  /* If the object can be passed as is, it is used directly. */
+  if (Forthon_isfarray(A2,ARRAY_TYPE)) {
+    Py_INCREF(A2);
+    return (PyArrayObject *)A2;
+    }
   descr = PyArray_DescrFromType(ARRAY_TYPE);
   A1 = (PyArrayObject *)PyArray_CheckFromAny(A2,descr,0,0,NPY_ARRAY_BEHAVED_NS|NPY_ARRAY_F_CONTIGUOUS,NULL);
   return A1;
@@ -77,8 +106,19 @@ typedef struct Fortranarray_{
   char* attributes;
   char* comment;
   char* dimstring;
+  unsigned long generation;
   } Fortranarray;
 
+/* ######################################################################### */
+/* # Memory statistics, which are kept for each dynamic array, for each group */
+/* # and for the object as a whole. */
+typedef struct {
+  long live;
+  long peak;
+  long nallocs;
+  double lastresize;
+  } Forthon_memstats;
+
 /* ######################################################################### */
 /* # Write definition of fortran package type */
 typedef struct ForthonObject_ {
@@ -93,6 +133,12 @@ typedef struct ForthonObject_ {
   void (*setstaticdims)(struct ForthonObject_ *);
   PyMethodDef *fmethods;
   PyObject *scalardict,*arraydict;
+  PyObject *vardict;
+  PyObject *methoddict;
+  PyObject *groupdict,*attrdict;
+  PyObject *recorddict;
+  Forthon_memstats *memstats;
+  int *memgroup;
   PyObject *__module__;
   char *fobj;
   void (*fobjdeallocate)(char *);
@@ -107,6 +153,11 @@ static PyObject *Forthon_getattro(ForthonObject *self,PyObject *name);
 static int Forthon_setattro(ForthonObject *self,PyObject *name,PyObject *v);
 static PyMethodDef *getForthonPackage_methods(void);
 
+/* Dictionary of the indices of the generic methods in the */
+/* ForthonPackage_methods list. This is shared by all objects and is */
+/* created by the first call to Forthon_BuildDicts. */
+static PyObject *ForthonPackage_methodindex=NULL;
+
 /* ######################################################################### */
 /* ######################################################################### */
 /* ######################################################################### */
@@ -114,6 +165,123 @@ static PyMethodDef *getForthonPackage_methods(void);
 /* dynamically allocated in the package. */
 static long totmembytes=0;
 
+/* ######################################################################### */
+/* Returns the wall clock time in seconds. */
+static double Forthon_walltime(void)
+{
+#ifdef _WIN32
+  return (double)time(NULL);
+#else
+  struct timeval tv;
+  gettimeofday(&tv,NULL);
+  return (double)tv.tv_sec + 1.e-6*(double)tv.tv_usec;
+#endif
+}
+
+/* ######################################################################### */
+/* Create the memory statistics of an object. The memstats has an entry for */
+/* each array, then an entry for each group, indexed by the first array in */
+/* the group, and then the entry for the whole object. memgroup gives the */
+/* index of the first array in the group of each array. These are created */
+/* when something is first allocated. */
+static void Forthon_initmemstats(ForthonObject *self)
+{
+  int i,j;
+  self->memstats = (Forthon_memstats *)PyMem_Malloc(
+                      (2*self->narrays+1)*sizeof(Forthon_memstats));
+  memset(self->memstats,0,(2*self->narrays+1)*sizeof(Forthon_memstats));
+  self->memgroup = (int *)PyMem_Malloc((self->narrays+1)*sizeof(int));
+  for (i=0;i<self->narrays;i++) {
+    /* Arrays in the same group are usually next to each other. */
+    if (i > 0 && strcmp(self->farrays[i].group,self->farrays[i-1].group)==0) {
+      self->memgroup[i] = self->memgroup[i-1];
+      continue;
+      }
+    for (j=0;j<i;j++)
+      if (strcmp(self->farrays[i].group,self->farrays[j].group)==0) break;
+    self->memgroup[i] = (j < i)?self->memgroup[j]:i;
+    }
+}
+
+/* ######################################################################### */
+/* Add nbytes, which is negative when space is freed, to the memory used by */
+/* array i. This updates totmembytes and the statistics of the array, of */
+/* its group and of the object. */
+static void Forthon_addmembytes(ForthonObject *self,long i,long nbytes)
+{
+  Forthon_memstats *stats[3];
+  double now;
+  int k;
+  totmembytes += nbytes;
+  if (self->memstats == NULL) {
+    if (nbytes <= 0) return;
+    Forthon_initmemstats(self);
+    }
+  stats[0] = &(self->memstats[i]);
+  stats[1] = &(self->memstats[self->narrays+self->memgroup[i]]);
+  stats[2] = &(self->memstats[2*self->narrays]);
+  now = Forthon_walltime();
+  for (k=0;k<3;k++) {
+    stats[k]->live += nbytes;
+    if (stats[k]->live > stats[k]->peak) stats[k]->peak = stats[k]->live;
+    if (nbytes > 0) stats[k]->nallocs++;
+    stats[k]->lastresize = now;
+    }
+}
+
+/* ######################################################################### */
+/* Call statistics of the wrapped fortran routines of the package. These */
+/* are only recorded when instrumenting is turned on with                 */
+/* instrumentroutines, so that otherwise, the cost is one test per call.  */
+/* The routines are the first nroutines entries of routinemethods, the    */
+/* method list of the package module, which is set at initialization.     */
+/* The time is the wall clock time of the whole wrapper, including the    */
+/* conversion of the arguments, and bytes is the total size of the array  */
+/* arguments passed into fortran.                                         */
+typedef struct {
+  long ncalls;
+  double total;
+  double min;
+  double max;
+  long bytes;
+} Forthon_routinestats;
+static int Forthon_instrumenting=0;
+static int Forthon_nroutines=0;
+static PyMethodDef *Forthon_routinemethods=NULL;
+static Forthon_routinestats *Forthon_routinestatslist=NULL;
+
+/* This is a macro since it is only used by packages with routines. */
+#define Forthon_addroutinestats(k,start,n,ax) { \
+  Forthon_routinestats *_stats = Forthon_routinestatslist + (k); \
+  double _dt = Forthon_walltime() - (start); \
+  int _i; \
+  for (_i=0;_i<(n);_i++) \
+    if ((ax)[_i] != NULL) _stats->bytes += (long)PyArray_NBYTES((ax)[_i]); \
+  if (_stats->ncalls == 0 || _dt < _stats->min) _stats->min = _dt; \
+  if (_dt > _stats->max) _stats->max = _dt; \
+  _stats->total += _dt; \
+  _stats->ncalls++;}
+
+/* This is the directory where the files backing the arrays with the mmap */
+/* attribute are created. If it is not set, the environment variable */
+/* FORTHON_SCRATCHDIR is used, or the current directory if that is not set. */
+static char *Forthon_scratchdir=NULL;
+static long Forthon_nmmapfiles=0;
+
+/* These control how the space for dynamic arrays is allocated and are set */
+/* with setallocator. If they are all zero, numpy's allocator is used. */
+/* alignment: the data is aligned to this many bytes (a power of two). */
+/* hugepages: the space is advised to be backed by transparent huge pages */
+/*            and arrays larger than a huge page are aligned to one. */
+/* firsttouch: the space is mapped directly from the operating system and */
+/*             is not touched when it is zero initialized, so that with */
+/*             NUMA first touch placement, pages end up on the node of */
+/*             the thread that first uses them. */
+static long Forthon_alignment=0;
+static int Forthon_hugepages=0;
+static int Forthon_firsttouch=0;
+#define FORTHON_HUGEPAGESIZE (2*1024*1024)
+
 /* ######################################################################### */
 /* Utility function used by attribute handling routines.                     */
 /* It returns the index of the string v in the string s. If the string is    */
@@ -134,7 +302,122 @@ static int strfind(char *v,char *s)
 
 /* ###################################################################### */
 /* Utility routines used in wrapping the subroutines                      */
-/* It checks if the argument can be cast to the desired type.             */
+/* ######################################################################### */
+/* # The wrappers of the fortran subroutines use the fastcall calling        */
+/* # convention where it is available. The arguments are passed in as a C   */
+/* # array, avoiding the creation and parsing of a tuple.                    */
+/* FORTHON_WRAPPERPASSARGS passes the arguments on to another routine. */
+#if PY_VERSION_HEX >= 0x03070000
+#define FORTHON_WRAPPERARGS PyObject *const *args,Py_ssize_t nargs
+#define FORTHON_WRAPPERPASSARGS args,nargs
+#define FORTHON_WRAPPERFLAGS METH_FASTCALL
+#else
+#define FORTHON_WRAPPERARGS PyObject *args
+#define FORTHON_WRAPPERPASSARGS args
+#define FORTHON_WRAPPERFLAGS METH_VARARGS
+#endif
+
+/* Get the n arguments passed into the wrapper of the subroutine name. */
+static int Forthon_getsubroutineargs(FORTHON_WRAPPERARGS,char *name,int n,
+                                     PyObject **pyobj)
+{
+  int i;
+#if PY_VERSION_HEX < 0x03070000
+  Py_ssize_t nargs = PyTuple_GET_SIZE(args);
+#endif
+  if (nargs != n) {
+    PyErr_Format(PyExc_TypeError,"%s() takes exactly %d argument%s (%d given)",
+                 name,n,(n == 1)?"":"s",(int)nargs);
+    return 0;
+    }
+  for (i=0;i<n;i++) {
+#if PY_VERSION_HEX >= 0x03070000
+    pyobj[i] = args[i];
+#else
+    pyobj[i] = PyTuple_GET_ITEM(args,i);
+#endif
+    }
+  return 1;
+}
+
+/* ######################################################################### */
+/* # Scalar arguments to subroutines that are passed in as python numbers    */
+/* # are converted directly into a C variable, rather than into a temporary  */
+/* # array. This returns 1 if the conversion was done, otherwise 0, in which */
+/* # case the argument is converted into an array as usual. Only numbers     */
+/* # that can be safely cast are converted here. This includes numpy scalars, */
+/* # such as elements taken from arrays. Since the storage is on the C stack  */
+/* # of the wrapper, it is safe for recursive calls from python callbacks.    */
+typedef union {
+  long l;
+  double d;
+  float f;
+  Py_complex c;
+  float fc[2];
+  } Forthon_scalararg;
+
+static int Forthon_getscalararg(PyObject *pyobj,int type_num,
+                                Forthon_scalararg *scalar)
+{
+  int isint;
+  Py_complex c;
+  PyArray_Descr *descr;
+  if (PyArray_IsScalar(pyobj,Generic)) {
+    descr = PyArray_DescrFromScalar(pyobj);
+    isint = PyArray_CanCastSafely(descr->type_num,type_num);
+    Py_DECREF(descr);
+    if (!isint) return 0;
+    descr = PyArray_DescrFromType(type_num);
+    isint = PyArray_CastScalarToCtype(pyobj,scalar,descr);
+    Py_DECREF(descr);
+    if (isint != 0) PyErr_Clear();
+    return (isint == 0);
+    }
+#if PY_MAJOR_VERSION < 3
+  isint = PyInt_Check(pyobj) || PyLong_Check(pyobj);
+#else
+  isint = PyLong_Check(pyobj);
+#endif
+  switch (type_num) {
+    case NPY_LONG:
+      if (!isint) return 0;
+#if PY_MAJOR_VERSION < 3
+      scalar->l = PyInt_AsLong(pyobj);
+#else
+      scalar->l = PyLong_AsLong(pyobj);
+#endif
+      break;
+    case NPY_DOUBLE:
+      if (!isint && !PyFloat_Check(pyobj)) return 0;
+      scalar->d = PyFloat_AsDouble(pyobj);
+      break;
+    case NPY_FLOAT:
+      if (!isint && !PyFloat_Check(pyobj)) return 0;
+      scalar->f = (float)PyFloat_AsDouble(pyobj);
+      break;
+    case NPY_CDOUBLE:
+      if (!isint && !PyFloat_Check(pyobj) && !PyComplex_Check(pyobj)) return 0;
+      scalar->c = PyComplex_AsCComplex(pyobj);
+      break;
+    case NPY_CFLOAT:
+      if (!isint && !PyFloat_Check(pyobj) && !PyComplex_Check(pyobj)) return 0;
+      c = PyComplex_AsCComplex(pyobj);
+      scalar->fc[0] = (float)c.real;
+      scalar->fc[1] = (float)c.imag;
+      break;
+    default:
+      return 0;
+    }
+  /* For example, an integer too large for a long */
+  if (PyErr_Occurred()) {
+    PyErr_Clear();
+    return 0;
+    }
+  return 1;
+}
+
+/* ######################################################################### */
+/* # It checks if the argument can be cast to the desired type.              */
 static int Forthon_checksubroutineargtype(PyObject *pyobj,int type_num)
 {
   int ret;
@@ -168,14 +451,18 @@ static int Forthon_checksubroutineargtype(PyObject *pyobj,int type_num)
 /* if the Python array is not contiguous or not in Fortran ordering, a temporary */
 /* copy of the array is made and passed into Fortrh. This routine copies */
 /* the data back into the original Python array after the Fortran routine finishes. */
+/* The intents has a character for each argument, 'i' for intent(in), 'o' */
+/* for intent(out) and 'b' for both. Arguments which are intent(in) are    */
+/* not copied back. If intents is NULL, then all are copied back.          */
 static void Forthon_restoresubroutineargs(int n,PyObject **pyobj,
-                                          PyArrayObject **ax)
+                                          PyArrayObject **ax,
+                                          const char *intents)
 {
   int i,ret;
   /* Loop over the arguments */
   for (i=0;i<n;i++) {
-    /* For each input value that is an array... */
-    if (PyArray_Check(pyobj[i])) {
+    /* For each input value that is an array that may have been changed... */
+    if (PyArray_Check(pyobj[i]) && (intents == NULL || intents[i] != 'i')) {
       /* ... check if a copy was made to pass into the wrapped subroutine... */
       if (pyobj[i] != (PyObject *)ax[i]) {
         /* ... If so, copy it back. */
@@ -199,34 +486,307 @@ static void Forthon_restoresubroutineargs(int n,PyObject **pyobj,
     }
 }
 
+/* ###################################################################### */
+/* This converts an intent(out) subroutine argument into an array. It is  */
+/* the same as FARRAY_FROMOBJECT, except that when a temporary is needed, */
+/* the data is not copied into it since it will be overwritten anyway.    */
+/* This is a macro since it is only used by some packages.                */
+#define Forthon_outarrayfromobject(A2,ARRAY_TYPE) \
+  ((PyArray_Check(A2) && !Forthon_isfarray(A2,ARRAY_TYPE)) ? \
+   (PyArrayObject *)PyArray_EMPTY(PyArray_NDIM((PyArrayObject *)(A2)), \
+                                  PyArray_DIMS((PyArrayObject *)(A2)), \
+                                  ARRAY_TYPE,1) : \
+   FARRAY_FROMOBJECT(A2,ARRAY_TYPE))
+
+#ifdef FORTHON_CFI
+#include <ISO_Fortran_binding.h>
+/* ###################################################################### */
+/* These are used for assumed shape subroutine arguments, which are       */
+/* passed to fortran with a C descriptor that includes the strides, so    */
+/* that views, such as a[::2,:], can be passed without being copied.     */
+/* Arrays of the correct type are used directly as long as they are       */
+/* aligned, writeable and in native byte order, otherwise a fortran       */
+/* ordered copy is made.                                                  */
+static PyArrayObject *Forthon_stridedarrayfromobject(PyObject *A2,
+                                                     int ARRAY_TYPE)
+{
+  if (PyArray_Check(A2) && PyArray_TYPE((PyArrayObject *)A2) == ARRAY_TYPE &&
+      PyArray_ISBEHAVED((PyArrayObject *)A2) &&
+      PyArray_ISNOTSWAPPED((PyArrayObject *)A2)) {
+    Py_INCREF(A2);
+    return (PyArrayObject *)A2;
+    }
+  return FARRAY_FROMOBJECT(A2,ARRAY_TYPE);
+}
+
+/* Fills in the descriptor for the array, argument argname of the routine */
+/* fname. Returns 0 with an exception set if the array has the wrong      */
+/* number of dimensions or a type that has no C descriptor type.          */
+static int Forthon_setcdesc(CFI_cdesc_t *desc,PyArrayObject *ax,int rank,
+                            char *argname,char *fname)
+{
+  CFI_index_t extents[CFI_MAX_RANK];
+  CFI_type_t type;
+  int j;
+  if (PyArray_NDIM(ax) != rank) {
+    PyErr_Format(ErrorObject,"Argument %s in %s has the wrong number of dimensions",
+                 argname,fname);
+    return 0;
+    }
+  switch (PyArray_TYPE(ax)) {
+    case NPY_DOUBLE:      type = CFI_type_double; break;
+    case NPY_FLOAT:       type = CFI_type_float; break;
+    case NPY_LONGDOUBLE:  type = CFI_type_long_double; break;
+    case NPY_CDOUBLE:     type = CFI_type_double_Complex; break;
+    case NPY_CFLOAT:      type = CFI_type_float_Complex; break;
+    case NPY_CLONGDOUBLE: type = CFI_type_long_double_Complex; break;
+    case NPY_BYTE:        type = CFI_type_signed_char; break;
+    case NPY_SHORT:       type = CFI_type_short; break;
+    case NPY_INT:         type = CFI_type_int; break;
+    case NPY_LONG:        type = CFI_type_long; break;
+    case NPY_LONGLONG:    type = CFI_type_long_long; break;
+    case NPY_BOOL:        type = CFI_type_Bool; break;
+    default:
+      PyErr_Format(PyExc_TypeError,"Argument %s in %s has a type that cannot be passed as an assumed shape array",
+                   argname,fname);
+      return 0;
+    }
+  for (j=0;j<rank;j++) extents[j] = PyArray_DIM(ax,j);
+  if (CFI_establish(desc,PyArray_BYTES(ax),CFI_attribute_other,type,
+                    PyArray_ITEMSIZE(ax),rank,extents) != CFI_SUCCESS) {
+    PyErr_Format(ErrorObject,"The descriptor for argument %s in %s could not be made",
+                 argname,fname);
+    return 0;
+    }
+  /* Replace the contiguous strides with the actual ones */
+  for (j=0;j<rank;j++) desc->dim[j].sm = PyArray_STRIDE(ax,j);
+  return 1;
+}
+#endif
+
+/* ###################################################################### */
+/* The generation is incremented every time that fortran may have run,    */
+/* after each call to a wrapped routine and after each set or get action. */
+/* Arrays remember the generation when their pointer was last fetched     */
+/* from fortran, and updatearray only fetches it again if the generation  */
+/* has changed, or if fortran is running in this thread (i.e. in a        */
+/* callback) or in another thread which released the GIL (nreleased).     */
+/* This is shared by all packages through a capsule in the sys module,    */
+/* since the fortran in one package can change the arrays of another.     */
+/* Note that fortran that is not called through Forthon, for example from */
+/* another extension, will not increment the generation.                  */
+typedef struct {
+  unsigned long generation;
+  long nreleased;
+} Forthon_fortranstate;
+static Forthon_fortranstate *Forthon_fstate=NULL;
+extern FORTHON_THREADLOCAL int lstackenvironmentset;
+
+static void Forthon_initfortranstate(void)
+{
+#if PY_VERSION_HEX >= 0x02070000
+  PyObject *c;
+  if (Forthon_fstate != NULL) return;
+  c = PySys_GetObject("_Forthon_fortranstate");
+  if (c != NULL && PyCapsule_CheckExact(c)) {
+    Forthon_fstate = (Forthon_fortranstate *)PyCapsule_GetPointer(c,
+                                               "Forthon_fortranstate");
+    if (Forthon_fstate != NULL) return;
+    PyErr_Clear();
+    }
+  /* This is never freed since it is shared by all packages. */
+  Forthon_fstate = (Forthon_fortranstate *)PyMem_Malloc(sizeof(Forthon_fortranstate));
+  Forthon_fstate->generation = 1;
+  Forthon_fstate->nreleased = 0;
+  c = PyCapsule_New(Forthon_fstate,"Forthon_fortranstate",NULL);
+  PySys_SetObject("_Forthon_fortranstate",c);
+  Py_XDECREF(c);
+#else
+  static Forthon_fortranstate fstate={1,0};
+  Forthon_fstate = &fstate;
+#endif
+}
+
 /* ###################################################################### */
 /* Builds a scalar and an array dictionary for the package. The           */
 /* dictionaries are then used in the getattr and setattr to look up the   */
 /* indices given a variable name. That lookup is faster than a linear     */
 /* scan through the list of variables.                                    */
+/* The vardict combines the two so that getattr and setattr only need a   */
+/* single lookup. Its values are the scalar index, or -(index+1) for      */
+/* arrays, and are unboxed with Forthon_slotfromobject, which is much     */
+/* faster than PyArg_Parse. Note that the dictionary lookup itself is     */
+/* fast since python strings cache their hash values.                     */
+#if PY_MAJOR_VERSION >= 3
+#define Forthon_slotfromobject(pyi) PyLong_AsLong(pyi)
+#else
+#define Forthon_slotfromobject(pyi) PyInt_AS_LONG(pyi)
+#endif
 static void Forthon_BuildDicts(ForthonObject *self)
 {
   int i;
-  PyObject *sdict,*adict,*iobj;
+  PyObject *sdict,*adict,*vdict,*mdict,*iobj;
+  PyMethodDef *ml;
   sdict = PyDict_New();
   adict = PyDict_New();
-  for (i=0;i<self->nscalars;i++) {
+  vdict = PyDict_New();
+  for (i=0;i<self->narrays;i++) {
     iobj = Py_BuildValue("i",i);
-    PyDict_SetItemString(sdict,self->fscalars[i].name,iobj);
+    PyDict_SetItemString(adict,self->farrays[i].name,iobj);
+    Py_DECREF(iobj);
+    iobj = Py_BuildValue("i",-(i+1));
+    PyDict_SetItemString(vdict,self->farrays[i].name,iobj);
     Py_DECREF(iobj);
     }
-  for (i=0;i<self->narrays;i++) {
+  /* The scalars are added to vdict last so that they take precedence, */
+  /* as in getattr and setattr. */
+  for (i=0;i<self->nscalars;i++) {
     iobj = Py_BuildValue("i",i);
-    PyDict_SetItemString(adict,self->farrays[i].name,iobj);
+    PyDict_SetItemString(sdict,self->fscalars[i].name,iobj);
+    PyDict_SetItemString(vdict,self->fscalars[i].name,iobj);
     Py_DECREF(iobj);
     }
   self->scalardict = sdict;
   self->arraydict = adict;
+  self->vardict = vdict;
+
+  /* These are built when first needed. */
+  self->groupdict = NULL;
+  self->attrdict = NULL;
+  self->recorddict = NULL;
+  self->memstats = NULL;
+  self->memgroup = NULL;
+
+  /* The index of the generic methods only needs to be built once. */
+  if (ForthonPackage_methodindex == NULL) {
+    ForthonPackage_methodindex = PyDict_New();
+    ml = getForthonPackage_methods();
+    for (i=0;ml[i].ml_name != NULL;i++) {
+      iobj = Py_BuildValue("i",i);
+      PyDict_SetItemString(ForthonPackage_methodindex,ml[i].ml_name,iobj);
+      Py_DECREF(iobj);
+      }
+    }
+
+  /* For packages, the bound method objects are created once and saved */
+  /* so that getattr can return them directly. The generic methods are  */
+  /* added last so that they take precedence, as in getattr. Packages are */
+  /* never deleted, so the reference cycle this creates is harmless.    */
+  /* Derived type instances can be numerous and short lived so they     */
+  /* create the method objects as needed instead.                       */
+  self->methoddict = NULL;
+  if (self->fobj == NULL) {
+    mdict = PyDict_New();
+    ml = self->fmethods;
+    for (;ml->ml_name != NULL;ml++) {
+      iobj = PyCFunction_New(ml,(PyObject *)self);
+      PyDict_SetItemString(mdict,ml->ml_name,iobj);
+      Py_DECREF(iobj);
+      }
+    ml = getForthonPackage_methods();
+    for (;ml->ml_name != NULL;ml++) {
+      iobj = PyCFunction_New(ml,(PyObject *)self);
+      PyDict_SetItemString(mdict,ml->ml_name,iobj);
+      Py_DECREF(iobj);
+      }
+    self->methoddict = mdict;
+    }
 }
 static void Forthon_DeleteDicts(ForthonObject *self)
 {
   Py_XDECREF(self->scalardict);
   Py_XDECREF(self->arraydict);
+  Py_XDECREF(self->vardict);
+  Py_XDECREF(self->methoddict);
+  Py_XDECREF(self->groupdict);
+  Py_XDECREF(self->attrdict);
+  Py_XDECREF(self->recorddict);
+  if (self->memstats != NULL) PyMem_Free(self->memstats);
+  if (self->memgroup != NULL) PyMem_Free(self->memgroup);
+  self->memstats = NULL;
+  self->memgroup = NULL;
+}
+
+/* ###################################################################### */
+/* Builds the group and attribute dictionaries. These map each group name */
+/* and each attribute to a tuple of two lists, the indices of the scalars */
+/* and of the arrays that are in the group or have the attribute. The     */
+/* entry "*" in the group dictionary includes all variables. These allow  */
+/* the group routines to loop over only the members of the group. They   */
+/* are built when first needed since most derived type instances never    */
+/* use them.                                                              */
+static void Forthon_addtomembers(PyObject *dict,char *key,int isarray,int i)
+{
+  PyObject *members,*iobj;
+  members = PyDict_GetItemString(dict,key);
+  if (members == NULL) {
+    members = Py_BuildValue("(NN)",PyList_New(0),PyList_New(0));
+    PyDict_SetItemString(dict,key,members);
+    Py_DECREF(members);
+    }
+  iobj = Py_BuildValue("i",i);
+  PyList_Append(PyTuple_GET_ITEM(members,isarray),iobj);
+  Py_DECREF(iobj);
+}
+static void Forthon_BuildGroupDict(ForthonObject *self)
+{
+  int i;
+  self->groupdict = PyDict_New();
+  for (i=0;i<self->nscalars;i++) {
+    Forthon_addtomembers(self->groupdict,"*",0,i);
+    Forthon_addtomembers(self->groupdict,self->fscalars[i].group,0,i);
+    }
+  for (i=0;i<self->narrays;i++) {
+    Forthon_addtomembers(self->groupdict,"*",1,i);
+    Forthon_addtomembers(self->groupdict,self->farrays[i].group,1,i);
+    }
+}
+static void Forthon_addattributestomembers(PyObject *dict,char *attributes,
+                                           int isarray,int i)
+{
+  char *attr,*word,*c;
+  /* Loop over the white space separated words in the attributes. */
+  attr = (char *)PyMem_Malloc(strlen(attributes)+1);
+  strcpy(attr,attributes);
+  c = attr;
+  while (*c != (char)0) {
+    while (Py_ISSPACE(*c)) c++;
+    if (*c == (char)0) break;
+    word = c;
+    while (*c != (char)0 && !Py_ISSPACE(*c)) c++;
+    if (*c != (char)0) *(c++) = (char)0;
+    Forthon_addtomembers(dict,word,isarray,i);
+    }
+  PyMem_Free(attr);
+}
+static void Forthon_BuildAttrDict(ForthonObject *self)
+{
+  int i;
+  self->attrdict = PyDict_New();
+  for (i=0;i<self->nscalars;i++)
+    Forthon_addattributestomembers(self->attrdict,self->fscalars[i].attributes,0,i);
+  for (i=0;i<self->narrays;i++)
+    Forthon_addattributestomembers(self->attrdict,self->farrays[i].attributes,1,i);
+}
+/* This must be called whenever the attributes of a variable are changed. */
+static void Forthon_DeleteAttrDict(ForthonObject *self)
+{
+  Py_XDECREF(self->attrdict);
+  self->attrdict = NULL;
+}
+
+/* Gets the lists of the indices of the scalars and arrays in the group s. */
+/* The lists are borrowed references. Returns 0 if the group is not found. */
+static int Forthon_getgroupmembers(ForthonObject *self,char *s,
+                                   PyObject **scalars,PyObject **arrays)
+{
+  PyObject *members;
+  if (self->groupdict == NULL) Forthon_BuildGroupDict(self);
+  members = PyDict_GetItemString(self->groupdict,s);
+  if (members == NULL) return 0;
+  *scalars = PyTuple_GET_ITEM(members,0);
+  *arrays = PyTuple_GET_ITEM(members,1);
+  return 1;
 }
 
 /* ######################################################################### */
@@ -282,6 +842,341 @@ static PyArrayObject *ForthonPackage_PyArrayFromFarray(Fortranarray *farray,void
   return pya;
 }
 
+/* ######################################################################### */
+/* # Fill an array with the initial value of farray, converting the value to */
+/* # the type of the array.                                                  */
+static void Forthon_fillinitvalue(PyArrayObject *pya,Fortranarray *farray)
+{
+  PyObject *value;
+  if (PyTypeNum_ISINTEGER(farray->type) || PyTypeNum_ISBOOL(farray->type))
+    value = PyLong_FromLong((long)farray->initvalue);
+  else
+    value = PyFloat_FromDouble(farray->initvalue);
+  PyArray_FillWithScalar(pya,value);
+  Py_DECREF(value);
+}
+
+/* ######################################################################### */
+/* # Create a new fortran ordered array, getting the space from the          */
+/* # allocator selected by setallocator. If zeroit is true, the data is      */
+/* # zeroed. When the allocator is not customized, numpy's allocator is      */
+/* # used, with PyArray_Zeros getting memory from calloc. Otherwise, the     */
+/* # space is owned by a capsule set as the base of the array, which frees   */
+/* # it when the array is deleted.                                           */
+#if PY_VERSION_HEX >= 0x02070000
+typedef struct {
+  void *base;
+  size_t nbytes;
+  int mapped;
+} Forthon_allocinfo;
+
+static void Forthon_freecapsule(PyObject *capsule)
+{
+  Forthon_allocinfo *info;
+  info = (Forthon_allocinfo *)PyCapsule_GetPointer(capsule,NULL);
+#ifdef _WIN32
+  _aligned_free(info->base);
+#else
+  if (info->mapped) munmap(info->base,info->nbytes);
+  else              free(info->base);
+#endif
+  PyMem_Free(info);
+}
+#endif
+
+static PyArrayObject *Forthon_newarray(int nd,npy_intp *dims,int type,
+                                       int zeroit)
+{
+#if PY_VERSION_HEX >= 0x02070000
+  PyArrayObject *pya;
+  PyArray_Descr *descr;
+  PyObject *capsule;
+  Forthon_allocinfo *info;
+  size_t nbytes,alignment;
+  void *data;
+#ifndef _WIN32
+  size_t pagesize;
+#endif
+
+  if (Forthon_alignment > 0 || Forthon_hugepages || Forthon_firsttouch) {
+    descr = PyArray_DescrFromType(type);
+    nbytes = (size_t)descr->elsize*(size_t)PyArray_MultiplyList(dims,nd);
+    Py_DECREF(descr);
+    if (nbytes == 0) nbytes = 1;
+    alignment = (size_t)Forthon_alignment;
+    if (alignment < sizeof(void *)) alignment = sizeof(void *);
+    info = (Forthon_allocinfo *)PyMem_Malloc(sizeof(Forthon_allocinfo));
+    info->mapped = 0;
+#ifdef _WIN32
+    info->base = _aligned_malloc(nbytes,alignment);
+    if (info->base == NULL) {
+      PyMem_Free(info);
+      return NULL;
+      }
+    data = info->base;
+#else
+    if (Forthon_hugepages || Forthon_firsttouch) {
+      /* Anonymous mappings are zero filled by the operating system, and */
+      /* each page is only placed when it is first touched. The mapping */
+      /* is made larger so that the data can be aligned inside of it. */
+      pagesize = (size_t)sysconf(_SC_PAGESIZE);
+      if (Forthon_hugepages && nbytes >= FORTHON_HUGEPAGESIZE &&
+          alignment < FORTHON_HUGEPAGESIZE) alignment = FORTHON_HUGEPAGESIZE;
+      if (alignment < pagesize) alignment = pagesize;
+      info->nbytes = nbytes + alignment - pagesize;
+      info->base = mmap(NULL,info->nbytes,PROT_READ|PROT_WRITE,
+                        MAP_PRIVATE|MAP_ANONYMOUS,-1,0);
+      if (info->base == MAP_FAILED) {
+        PyMem_Free(info);
+        return NULL;
+        }
+      info->mapped = 1;
+      data = (void *)(((size_t)info->base + alignment - 1) & ~(alignment - 1));
+#ifdef MADV_HUGEPAGE
+      if (Forthon_hugepages)
+        madvise(data,(nbytes + pagesize - 1) & ~(pagesize - 1),MADV_HUGEPAGE);
+#endif
+      zeroit = 0;
+      }
+    else {
+      if (posix_memalign(&(info->base),alignment,nbytes) != 0) {
+        PyMem_Free(info);
+        return NULL;
+        }
+      data = info->base;
+      }
+#endif
+    pya = (PyArrayObject *)PyArray_New(&PyArray_Type,nd,dims,type,NULL,
+                                       data,0,NPY_ARRAY_FARRAY,NULL);
+    capsule = PyCapsule_New((void *)info,NULL,Forthon_freecapsule);
+    if (pya == NULL) {
+      Py_DECREF(capsule);
+      return NULL;
+      }
+#if NPY_API_VERSION >= 0x00000007
+    PyArray_SetBaseObject(pya,capsule);
+#else
+    pya->base = capsule;
+#endif
+    if (zeroit) memset(data,0,nbytes);
+    return pya;
+    }
+#endif
+
+  if (zeroit)
+    return (PyArrayObject *)PyArray_Zeros(nd,dims,PyArray_DescrFromType(type),1);
+  else
+    return (PyArrayObject *)PyArray_New(&PyArray_Type,nd,dims,type,NULL,
+                                        NULL,0,NPY_ARRAY_FARRAY,NULL);
+}
+
+/* ######################################################################### */
+/* # The space of growable arrays, see ForthonPackage_growarray. The array   */
+/* # is a view of the space, with the capsule holding this as its base.      */
+#if PY_VERSION_HEX >= 0x02070000
+typedef struct {
+  PyArrayObject *space;
+  npy_intp capacity;
+  ForthonObject *owner;
+  long index;
+} Forthon_growinfo;
+
+static void Forthon_freegrowcapsule(PyObject *capsule)
+{
+  Forthon_growinfo *info;
+  info = (Forthon_growinfo *)PyCapsule_GetPointer(capsule,"Forthon_growinfo");
+  Py_DECREF(info->space);
+  PyMem_Free(info);
+}
+
+/* Returns the growinfo if the array is a view of space allocated by */
+/* ForthonPackage_growarray, otherwise NULL. */
+static Forthon_growinfo *Forthon_getgrowinfo(PyArrayObject *pya)
+{
+  PyObject *base;
+  if (pya == NULL) return NULL;
+  base = PyArray_BASE(pya);
+  if (base == NULL || !PyCapsule_IsValid(base,"Forthon_growinfo")) return NULL;
+  return (Forthon_growinfo *)PyCapsule_GetPointer(base,"Forthon_growinfo");
+}
+#endif
+
+/* Returns the number of bytes of memory used by the array. For growable */
+/* arrays, this includes the extra capacity. */
+static long Forthon_arraymembytes(PyArrayObject *pya)
+{
+#if PY_VERSION_HEX >= 0x02070000
+  Forthon_growinfo *info = Forthon_getgrowinfo(pya);
+  if (info != NULL) return (long)PyArray_NBYTES(info->space);
+#endif
+  return (long)PyArray_NBYTES(pya);
+}
+
+/* ######################################################################### */
+/* # Allocate the space for an array with the mmap attribute. The space is    */
+/* # a shared mapping of a file in the scratch directory, so that the array  */
+/* # can be larger than the physical memory, can be opened by other          */
+/* # processes, and is left on disk if the process dies. The file is named   */
+/* # pkg.var.pid.n. When the array is freed, the mapping is released and the */
+/* # file is removed. Since a new file is sized with ftruncate, it is zero   */
+/* # filled without any pages being touched. If the mapping can not be       */
+/* # made, a message is printed and NULL is returned.                        */
+#ifndef _WIN32
+typedef struct {
+  void *data;
+  size_t nbytes;
+  char filename[1];
+} Forthon_mmapinfo;
+
+#if PY_VERSION_HEX >= 0x02070000
+static void Forthon_munmapcapsule(PyObject *capsule)
+{
+  Forthon_mmapinfo *info;
+  info = (Forthon_mmapinfo *)PyCapsule_GetPointer(capsule,NULL);
+  munmap(info->data,info->nbytes);
+  unlink(info->filename);
+  PyMem_Free(info);
+}
+
+static PyArrayObject *ForthonPackage_mmaparray(ForthonObject *self,
+                                               Fortranarray *farray)
+{
+  PyArrayObject *pya;
+  PyArray_Descr *descr;
+  PyObject *capsule;
+  Forthon_mmapinfo *info;
+  char *dirname;
+  size_t nbytes;
+  void *data;
+  int fd;
+
+  dirname = Forthon_scratchdir;
+  if (dirname == NULL) dirname = getenv("FORTHON_SCRATCHDIR");
+  if (dirname == NULL || *dirname == (char)0) dirname = ".";
+
+  descr = PyArray_DescrFromType(farray->type);
+  nbytes = (size_t)descr->elsize*
+           (size_t)PyArray_MultiplyList(farray->dimensions,farray->nd);
+  Py_DECREF(descr);
+  /* A zero length mapping is not allowed. */
+  if (nbytes == 0) nbytes = 1;
+
+  info = (Forthon_mmapinfo *)PyMem_Malloc(sizeof(Forthon_mmapinfo) +
+                                          strlen(dirname) +
+                                          strlen(self->name) +
+                                          strlen(farray->name) + 64);
+  if (info == NULL) return NULL;
+  sprintf(info->filename,"%s/%s.%s.%ld.%ld",dirname,self->name,farray->name,
+          (long)getpid(),Forthon_nmmapfiles++);
+
+  fd = open(info->filename,O_RDWR|O_CREAT|O_TRUNC,0666);
+  if (fd < 0) {
+    printf("Unable to create the file %s: %s\n",info->filename,strerror(errno));
+    PyMem_Free(info);
+    return NULL;
+    }
+  if (ftruncate(fd,(off_t)nbytes) != 0) {
+    printf("Unable to extend the file %s: %s\n",info->filename,strerror(errno));
+    close(fd);
+    unlink(info->filename);
+    PyMem_Free(info);
+    return NULL;
+    }
+  data = mmap(NULL,nbytes,PROT_READ|PROT_WRITE,MAP_SHARED,fd,0);
+  /* The mapping keeps its own reference to the file. */
+  close(fd);
+  if (data == MAP_FAILED) {
+    printf("Unable to map the file %s: %s\n",info->filename,strerror(errno));
+    unlink(info->filename);
+    PyMem_Free(info);
+    return NULL;
+    }
+  info->data = data;
+  info->nbytes = nbytes;
+
+  pya = ForthonPackage_PyArrayFromFarray(farray,data);
+  if (pya == NULL) {
+    munmap(data,nbytes);
+    unlink(info->filename);
+    PyMem_Free(info);
+    return NULL;
+    }
+
+  /* The capsule releases the mapping when the array is deleted. */
+  capsule = PyCapsule_New((void *)info,NULL,Forthon_munmapcapsule);
+  if (capsule == NULL) {
+    Py_DECREF(pya);
+    munmap(data,nbytes);
+    unlink(info->filename);
+    PyMem_Free(info);
+    return NULL;
+    }
+#if NPY_API_VERSION >= 0x00000007
+  PyArray_SetBaseObject(pya,capsule);
+#else
+  pya->base = capsule;
+#endif
+  return pya;
+}
+#endif
+#endif
+
+/* ######################################################################### */
+/* # Allocate new space for a dynamic array and fill it with its initial     */
+/* # value. If the initial value is zero, the space is zeroed by the         */
+/* # allocator, which by default gets the memory from calloc. This avoids    */
+/* # touching every page since the operating system can supply zeroed pages  */
+/* # lazily. Otherwise, the array is filled using numpy's typed fill, with   */
+/* # the value converted to the type of the array. If iverbose is set, the   */
+/* # choice is printed out.                                                  */
+/* # Arrays with the mmap attribute get their space from a mapped file, or   */
+/* # from the allocator if that fails.                                       */
+static PyArrayObject *ForthonPackage_allocatearray(ForthonObject *self,
+                                                   Fortranarray *farray,
+                                                   int iverbose)
+{
+  PyArrayObject *pya;
+
+#if !defined(_WIN32) && PY_VERSION_HEX >= 0x02070000
+  if (farray->type != NPY_STRING && strfind(" mmap ",farray->attributes) >= 0) {
+    pya = ForthonPackage_mmaparray(self,farray);
+    if (pya != NULL) {
+      if (farray->initvalue != 0.) Forthon_fillinitvalue(pya,farray);
+      if (iverbose) printf("Allocating %s.%s %d mapped to a file\n",self->name,
+                                     farray->name,(int)PyArray_SIZE(pya));
+      return pya;
+      }
+    /* If the file can not be mapped, for example if the scratch directory */
+    /* does not exist, the space is allocated in memory instead. */
+    PyErr_Clear();
+    printf("Warning: %s.%s could not be mapped to a file and is allocated in memory\n",
+           self->name,farray->name);
+    }
+#endif
+
+  if (farray->type == NPY_STRING) {
+    pya = ForthonPackage_PyArrayFromFarray(farray,NULL);
+    if (pya == NULL) return NULL;
+    PyArray_FILLWBYTE(pya,(int)' ');
+    if (iverbose) printf("Allocating %s.%s %d blank filled\n",self->name,farray->name,
+                                   (int)PyArray_SIZE(pya));
+    }
+  else if (farray->initvalue == 0.) {
+    pya = Forthon_newarray(farray->nd,farray->dimensions,farray->type,1);
+    if (pya == NULL) return NULL;
+    if (iverbose) printf("Allocating %s.%s %d zeroed\n",self->name,farray->name,
+                                   (int)PyArray_SIZE(pya));
+    }
+  else {
+    pya = Forthon_newarray(farray->nd,farray->dimensions,farray->type,0);
+    if (pya == NULL) return NULL;
+    Forthon_fillinitvalue(pya,farray);
+    if (iverbose) printf("Allocating %s.%s %d filled with %g\n",self->name,farray->name,
+                                   (int)PyArray_SIZE(pya),farray->initvalue);
+    }
+  return pya;
+}
+
 /* ######################################################################### */
 /* # Update the data element of a dynamic, fortran assignable array.         */
 /* ------------------------------------------------------------------------- */
@@ -308,6 +1203,11 @@ static void ForthonPackage_updatearray(ForthonObject *self,long i)
   int j;
   /* If the getarraypointer routine exists, call it to assign a value to data.s */
   if (farray->getarraypointer != NULL) {
+    /* Skip the call if fortran cannot have changed the pointer since the */
+    /* last time it was fetched. */
+    if (farray->generation == Forthon_fstate->generation &&
+        lstackenvironmentset == 0 && Forthon_fstate->nreleased == 0) return;
+    farray->generation = Forthon_fstate->generation;
     /* Force the pointer to be null, since if the array is not associated, */
     /* the getarraypointer routine just returns and does nothing. This ensures  */
     /* that when the fortan array has been nullified, that garbage data    */
@@ -385,12 +1285,12 @@ static void ForthonPackage_staticarrays(ForthonObject *self)
           memset(c,(int)' ',
                  (int)(PyArray_SIZE(self->farrays[i].pya)*itemsize-(long)c+
                  (long)self->farrays[i].data.s));
-        /* Add the array size to totmembytes. */
-        totmembytes += (long)PyArray_NBYTES(self->farrays[i].pya)*itemsize;
+        /* Add the array size to the memory statistics. */
+        Forthon_addmembytes(self,i,(long)PyArray_NBYTES(self->farrays[i].pya)*itemsize);
         }
       else {
-        /* Add the array size to totmembytes. */
-        totmembytes += (long)PyArray_NBYTES(self->farrays[i].pya);
+        /* Add the array size to the memory statistics. */
+        Forthon_addmembytes(self,i,(long)PyArray_NBYTES(self->farrays[i].pya));
         }
       }
     }
@@ -558,8 +1458,8 @@ static int Forthon_freearray(ForthonObject *self,void *closure)
 
   if (farray->dynamic) {
     if (farray->pya != NULL) {
-      /* Subtract the array size from totmembytes. */
-      totmembytes -= (long)PyArray_NBYTES(farray->pya);
+      /* Subtract the array size from the memory statistics. */
+      Forthon_addmembytes(self,(long)closure,-Forthon_arraymembytes(farray->pya));
       Py_XDECREF(farray->pya);
       farray->pya = NULL;
       (farray->setarraypointer)(0,(self->fobj),farray->dimensions);
@@ -584,6 +1484,7 @@ static int Forthon_setscalardouble(ForthonObject *self,PyObject *value,
     if (fscalar->setaction != NULL) {
       if (self->fobj == NULL) fscalar->setaction(&lv);
       else                    fscalar->setaction((self->fobj),&lv);
+      Forthon_fstate->generation++;
       }
     memcpy((fscalar->data),&lv,sizeof(double));}
   else {
@@ -606,6 +1507,7 @@ static int Forthon_setscalarcdouble(ForthonObject *self,PyObject *value,
     if (fscalar->setaction != NULL) {
       if (self->fobj == NULL) fscalar->setaction(&lv);
       else                    fscalar->setaction((self->fobj),&lv);
+      Forthon_fstate->generation++;
       }
     memcpy((fscalar->data),&lv,2*sizeof(double));}
   else {
@@ -628,6 +1530,7 @@ static int Forthon_setscalarfloat(ForthonObject *self,PyObject *value,
     if (fscalar->setaction != NULL) {
       if (self->fobj == NULL) fscalar->setaction(&lv);
       else                    fscalar->setaction((self->fobj),&lv);
+      Forthon_fstate->generation++;
       }
     memcpy((fscalar->data),&lv,sizeof(float));}
   else {
@@ -651,6 +1554,7 @@ static int Forthon_setscalarcfloat(ForthonObject *self,PyObject *value,
     if (fscalar->setaction != NULL) {
       if (self->fobj == NULL) fscalar->setaction(&lv);
       else                    fscalar->setaction((self->fobj),&lv);
+      Forthon_fstate->generation++;
       }
     memcpy((fscalar->data),&lv,2*sizeof(float));}
   else {
@@ -673,6 +1577,7 @@ static int Forthon_setscalarinteger(ForthonObject *self,PyObject *value,
     if (fscalar->setaction != NULL) {
       if (self->fobj == NULL) fscalar->setaction(&lv);
       else                    fscalar->setaction((self->fobj),&lv);
+      Forthon_fstate->generation++;
       }
     memcpy((fscalar->data),&lv,sizeof(long));}
   else {
@@ -736,6 +1641,7 @@ static int Forthon_setscalarderivedtype(ForthonObject *self,PyObject *value,
       fscalar->setaction(((ForthonObject *)value)->fobj);
     else
       fscalar->setaction((self->fobj),((ForthonObject *)value)->fobj);
+    Forthon_fstate->generation++;
     }
 
   /* This does the assignment in Fortran. */
@@ -816,6 +1722,7 @@ static int Forthon_setarray(ForthonObject *self,PyObject *value,
           farray->setaction(PyArray_BYTES(ax));
         else
           farray->setaction((self->fobj),PyArray_BYTES(ax));
+        Forthon_fstate->generation++;
         }
       if (farray->pya != NULL) {Py_XDECREF(farray->pya);}
       farray->pya = ax;
@@ -883,6 +1790,134 @@ static int Forthon_setarraydict(ForthonObject *self,void *closure)
 }
 */
 
+/* ######################################################################### */
+/* # Get and set a variable given its slot in the vardict. Scalars have     */
+/* # slots i >= 0 and arrays have slots -(i+1). These do the work of        */
+/* # getattr and setattr, including calling any get or set actions.         */
+static PyObject *Forthon_getvariable(ForthonObject *self,long i)
+{
+  if (i >= 0) {
+    if (self->fscalars[i].getaction != NULL) {
+      if (self->fobj == NULL) self->fscalars[i].getaction();
+      else                    self->fscalars[i].getaction((self->fobj));
+      Forthon_fstate->generation++;
+      }
+    if (self->fscalars[i].type == NPY_DOUBLE) {
+      return Forthon_getscalardouble(self,(void *)i);}
+    else if (self->fscalars[i].type == NPY_CDOUBLE) {
+      return Forthon_getscalarcdouble(self,(void *)i);}
+    else if (self->fscalars[i].type == NPY_FLOAT) {
+      return Forthon_getscalarfloat(self,(void *)i);}
+    else if (self->fscalars[i].type == NPY_CFLOAT) {
+      return Forthon_getscalarcfloat(self,(void *)i);}
+    else if (self->fscalars[i].type == NPY_OBJECT) {
+      return Forthon_getscalarderivedtype(self,(void *)i);}
+    else {
+      return Forthon_getscalarinteger(self,(void *)i);}
+    }
+
+  /* Otherwise, it is an array */
+  i = -(i+1);
+  if (self->farrays[i].getaction != NULL) {
+    if (self->fobj == NULL) self->farrays[i].getaction();
+    else                    self->farrays[i].getaction((self->fobj));
+    Forthon_fstate->generation++;
+    }
+  return Forthon_getarray(self,(void *)i);
+}
+/* ------------------------------------------------------------------------- */
+static int Forthon_setvariable(ForthonObject *self,long i,PyObject *v)
+{
+  if (i >= 0) {
+    if (self->fscalars[i].parameter) {
+      PyErr_SetString(PyExc_TypeError, "Cannot set a parameter");
+      return -1;
+      }
+    if (self->fscalars[i].type == NPY_DOUBLE) {
+      return Forthon_setscalardouble(self,v,(void *)i);}
+    else if (self->fscalars[i].type == NPY_CDOUBLE) {
+      return Forthon_setscalarcdouble(self,v,(void *)i);}
+    else if (self->fscalars[i].type == NPY_FLOAT) {
+      return Forthon_setscalarfloat(self,v,(void *)i);}
+    else if (self->fscalars[i].type == NPY_CFLOAT) {
+      return Forthon_setscalarcfloat(self,v,(void *)i);}
+    else if (self->fscalars[i].type == NPY_OBJECT) {
+      return Forthon_setscalarderivedtype(self,v,(void *)i);}
+    else {
+      return Forthon_setscalarinteger(self,v,(void *)i);}
+    }
+
+  /* Otherwise, it is an array */
+  i = -(i+1);
+  return Forthon_setarray(self,v,(void *)i);
+}
+
+/* ######################################################################### */
+/* # Check whether the value can be assigned to the variable in the slot,   */
+/* # without changing anything. If not, an exception is set and 0 is       */
+/* # returned. For arrays, the value converted into an array is returned   */
+/* # in ax (which is NULL when the value is None). Whether the shape of the */
+/* # array is correct can only be checked when it is assigned since it can */
+/* # depend on other variables.                                            */
+static int Forthon_checkvariablevalue(ForthonObject *self,long i,PyObject *v,
+                                      PyArrayObject **ax)
+{
+  Fortranscalar *fscalar;
+  Fortranarray *farray;
+  double dv;
+  float fv;
+  Py_complex cv;
+  int ok;
+
+  *ax = NULL;
+  if (i >= 0) {
+    fscalar = &(self->fscalars[i]);
+    if (fscalar->parameter) {
+      PyErr_SetString(PyExc_TypeError, "Cannot set a parameter");
+      return 0;
+      }
+    if (fscalar->type == NPY_DOUBLE) {
+      ok = PyArg_Parse(v,"d",&dv);}
+    else if (fscalar->type == NPY_FLOAT) {
+      ok = PyArg_Parse(v,"f",&fv);}
+    else if (fscalar->type == NPY_CDOUBLE || fscalar->type == NPY_CFLOAT) {
+      ok = PyArg_Parse(v,"D",&cv);}
+    else if (fscalar->type == NPY_OBJECT) {
+      if (v == Py_None) {
+        ok = fscalar->dynamic;}
+      else {
+        ok = (strcmp("Forthon",Py_TYPE(v)->tp_name) == 0 &&
+              strcmp(((ForthonObject *)v)->typename,fscalar->typename) == 0);}
+      }
+    else {
+      PyLong_AsLong(v);
+      ok = !PyErr_Occurred();}
+    if (!ok) {
+      PyErr_Clear();
+      PyErr_Format(ErrorObject,"Right hand side has incorrect type for %s",
+                   fscalar->name);
+      }
+    return ok;
+    }
+
+  farray = &(self->farrays[-(i+1)]);
+  if (v == Py_None) {
+    if (!farray->dynamic) {
+      PyErr_SetString(PyExc_TypeError, "Cannot delete a static array");
+      return 0;
+      }
+    return 1;
+    }
+  *ax = FARRAY_FROMOBJECT(v,farray->type);
+  if (*ax == NULL) {
+    PyErr_Clear();
+    PyErr_Format(ErrorObject,"Right hand side has incorrect type for %s",
+                 farray->name);
+    return 0;
+    }
+  return 1;
+}
+
 /* ######################################################################### */
 static int Forthon_traverse(ForthonObject *self,visitproc visit,void *arg)
 {
@@ -902,9 +1937,11 @@ static int Forthon_traverse(ForthonObject *self,visitproc visit,void *arg)
 
 
 /* ------------------------------------------------------------------------- */
+/* This releases the references to other python objects, breaking any     */
+/* reference cycles. It is the tp_clear of the garbage collector and is     */
+/* also called by Forthon_dealloc, so it can be called more than once.      */
 static int Forthon_clear(ForthonObject *self)
 {
-  /* Note that this is called by Forthon_dealloc. */
   int i;
   int createnew=0;
   npy_intp nullit=1;
@@ -927,11 +1964,20 @@ static int Forthon_clear(ForthonObject *self)
         }
       }
     }
+  return 0;
+}
+
+/* ------------------------------------------------------------------------- */
+/* Frees the arrays and the fortran object. This is only called by */
+/* Forthon_dealloc. */
+static void Forthon_free(ForthonObject *self)
+{
+  int i;
   for (i=0;i<self->narrays;i++) {
     /* ForthonPackage_updatearray(self,(long)i); */
     if (self->farrays[i].pya != NULL) {
-      /* Subtract the array size from totmembytes. */
-      totmembytes -= (long)PyArray_NBYTES(self->farrays[i].pya);
+      /* Subtract the array size from the memory statistics. */
+      Forthon_addmembytes(self,i,-Forthon_arraymembytes(self->farrays[i].pya));
       Py_DECREF(self->farrays[i].pya);
       }
     PyMem_Free(self->farrays[i].dimensions);
@@ -951,7 +1997,6 @@ static int Forthon_clear(ForthonObject *self)
   Py_DECREF(self->__module__);
 
   Forthon_DeleteDicts(self);
-  return 0;
 }
 
 /* ######################################################################### */
@@ -1062,7 +2107,7 @@ static PyObject *ForthonPackage_getdict(PyObject *_self_,PyObject *args)
 }
 
 /* ######################################################################### */
-static char deprefix_doc[] = "For each variable in the package, a python object is created which has the same name and same value. For arrays, the new objects points to the same memory location.";
+static char deprefix_doc[] = "For each variable in the package, a python object is created which has the same name and same value. For arrays, the new objects points to the same memory location. Note that the values are copied, so getdictview is faster for large packages and never out of date.";
 static PyObject *ForthonPackage_deprefix(PyObject *_self_,PyObject *args)
 {
   /* ForthonObject *self = (ForthonObject *)_self_; */
@@ -1082,6 +2127,222 @@ static PyObject *ForthonPackage_deprefix(PyObject *_self_,PyObject *args)
   returnnone;
 }
 
+/* ######################################################################### */
+/* # Dictionary view of the variables in a package. This is a mapping which */
+/* # looks up each variable in the package only when it is accessed, so    */
+/* # creating it is cheap and the values never go out of date, even when   */
+/* # arrays are reallocated.                                                */
+typedef struct {
+  PyObject_HEAD
+  ForthonObject *package;
+} ForthonDictViewObject;
+
+static void ForthonDictView_dealloc(ForthonDictViewObject *self)
+{
+  Py_DECREF(self->package);
+  PyObject_Del(self);
+}
+
+/* Unallocated arrays and unassociated derived type pointers are treated  */
+/* as not being in the view, as in getdict, so that the length, iteration, */
+/* and subscripting all agree.                                              */
+static int ForthonDictView_available(ForthonDictViewObject *self,PyObject *pyi)
+{
+  long i;
+  i = Forthon_slotfromobject(pyi);
+  if (i >= 0) {
+    if (self->package->fscalars[i].type != NPY_OBJECT) return 1;
+    ForthonPackage_updatederivedtype(self->package,i,1);
+    return (self->package->fscalars[i].data != NULL);
+    }
+  i = -(i+1);
+  ForthonPackage_updatearray(self->package,i);
+  return (self->package->farrays[i].pya != NULL);
+}
+
+static PyObject *ForthonDictView_keys(ForthonDictViewObject *self,
+                                      PyObject *args)
+{
+  PyObject *result,*key,*pyi;
+  Py_ssize_t pos=0;
+  result = PyList_New(0);
+  while (PyDict_Next(self->package->vardict,&pos,&key,&pyi)) {
+    if (ForthonDictView_available(self,pyi)) PyList_Append(result,key);
+    }
+  return result;
+}
+
+static Py_ssize_t ForthonDictView_length(ForthonDictViewObject *self)
+{
+  PyObject *key,*pyi;
+  Py_ssize_t pos=0,n=0;
+  while (PyDict_Next(self->package->vardict,&pos,&key,&pyi)) {
+    if (ForthonDictView_available(self,pyi)) n++;
+    }
+  return n;
+}
+
+static PyObject *ForthonDictView_subscript(ForthonDictViewObject *self,
+                                           PyObject *key)
+{
+  PyObject *pyi;
+  pyi = PyDict_GetItem(self->package->vardict,key);
+  if (pyi == NULL || !ForthonDictView_available(self,pyi)) {
+    PyErr_SetObject(PyExc_KeyError,key);
+    return NULL;
+    }
+  return Forthon_getvariable(self->package,Forthon_slotfromobject(pyi));
+}
+
+static int ForthonDictView_ass_subscript(ForthonDictViewObject *self,
+                                         PyObject *key,PyObject *v)
+{
+  PyObject *pyi;
+  pyi = PyDict_GetItem(self->package->vardict,key);
+  if (pyi == NULL) {
+    PyErr_SetObject(PyExc_KeyError,key);
+    return -1;
+    }
+  if (v == NULL) {
+    PyErr_SetString(PyExc_TypeError,"Package variables cannot be deleted");
+    return -1;
+    }
+  return Forthon_setvariable(self->package,Forthon_slotfromobject(pyi),v);
+}
+
+static int ForthonDictView_contains(ForthonDictViewObject *self,PyObject *key)
+{
+  PyObject *pyi;
+  pyi = PyDict_GetItem(self->package->vardict,key);
+  return (pyi != NULL && ForthonDictView_available(self,pyi));
+}
+
+static PyObject *ForthonDictView_iter(ForthonDictViewObject *self)
+{
+  PyObject *keys,*iter;
+  keys = ForthonDictView_keys(self,NULL);
+  if (keys == NULL) return NULL;
+  iter = PyObject_GetIter(keys);
+  Py_DECREF(keys);
+  return iter;
+}
+
+static PyObject *ForthonDictView_values(ForthonDictViewObject *self,
+                                        PyObject *args)
+{
+  PyObject *result,*key,*pyi,*v;
+  Py_ssize_t pos=0;
+  result = PyList_New(0);
+  while (PyDict_Next(self->package->vardict,&pos,&key,&pyi)) {
+    if (!ForthonDictView_available(self,pyi)) continue;
+    v = Forthon_getvariable(self->package,Forthon_slotfromobject(pyi));
+    if (v == NULL) {
+      Py_DECREF(result);
+      return NULL;
+      }
+    PyList_Append(result,v);
+    Py_DECREF(v);
+    }
+  return result;
+}
+
+static PyObject *ForthonDictView_items(ForthonDictViewObject *self,
+                                       PyObject *args)
+{
+  PyObject *result,*key,*pyi,*v,*item;
+  Py_ssize_t pos=0;
+  result = PyList_New(0);
+  while (PyDict_Next(self->package->vardict,&pos,&key,&pyi)) {
+    if (!ForthonDictView_available(self,pyi)) continue;
+    v = Forthon_getvariable(self->package,Forthon_slotfromobject(pyi));
+    if (v == NULL) {
+      Py_DECREF(result);
+      return NULL;
+      }
+    item = Py_BuildValue("(ON)",key,v);
+    PyList_Append(result,item);
+    Py_DECREF(item);
+    }
+  return result;
+}
+
+static PyObject *ForthonDictView_get(ForthonDictViewObject *self,
+                                     PyObject *args)
+{
+  PyObject *key,*pyi,*def=Py_None;
+  if (!PyArg_ParseTuple(args,"O|O",&key,&def)) return NULL;
+  pyi = PyDict_GetItem(self->package->vardict,key);
+  if (pyi == NULL || !ForthonDictView_available(self,pyi)) {
+    Py_INCREF(def);
+    return def;
+    }
+  return Forthon_getvariable(self->package,Forthon_slotfromobject(pyi));
+}
+
+static PyMappingMethods ForthonDictView_as_mapping = {
+  (lenfunc)ForthonDictView_length,                /*mp_length*/
+  (binaryfunc)ForthonDictView_subscript,          /*mp_subscript*/
+  (objobjargproc)ForthonDictView_ass_subscript,   /*mp_ass_subscript*/
+};
+
+static PySequenceMethods ForthonDictView_as_sequence = {
+  0,0,0,0,0,0,0,                                  /*sq_length...*/
+  (objobjproc)ForthonDictView_contains,           /*sq_contains*/
+};
+
+static PyMethodDef ForthonDictView_methods[] = {
+  {"keys"  ,(PyCFunction)ForthonDictView_keys,METH_NOARGS,"Returns a list of the variable names"},
+  {"values",(PyCFunction)ForthonDictView_values,METH_NOARGS,"Returns a list of the variable values"},
+  {"items" ,(PyCFunction)ForthonDictView_items,METH_NOARGS,"Returns a list of (name,value) pairs"},
+  {"get"   ,(PyCFunction)ForthonDictView_get,METH_VARARGS,"get(name,default=None) Returns the value of the variable or the default"},
+  {NULL,NULL}};
+
+static PyTypeObject ForthonDictViewType = {
+  PyVarObject_HEAD_INIT(NULL, 0)         /*ob_size*/
+  "ForthonDictView",                     /*tp_name*/
+  sizeof(ForthonDictViewObject),         /*tp_basicsize*/
+  0,                                     /*tp_itemsize*/
+  (destructor)ForthonDictView_dealloc,   /*tp_dealloc*/
+  0,                                     /*tp_print*/
+  0,                                     /*tp_getattr*/
+  0,                                     /*tp_setattr*/
+  0,                                     /*tp_compare*/
+  0,                                     /*tp_repr*/
+  0,                                     /*tp_as_number*/
+  &ForthonDictView_as_sequence,          /*tp_as_sequence*/
+  &ForthonDictView_as_mapping,           /*tp_as_mapping*/
+  0,                                     /*tp_hash*/
+  0,                                     /*tp_call*/
+  0,                                     /*tp_str*/
+  0,                                     /*tp_getattro*/
+  0,                                     /*tp_setattro*/
+  0,                                     /*tp_as_buffer*/
+  Py_TPFLAGS_DEFAULT,                    /*tp_flags*/
+  "Dictionary view of the variables in a Forthon object", /*tp_doc*/
+  0,                                     /*tp_traverse*/
+  0,                                     /*tp_clear*/
+  0,                                     /*tp_richcompare*/
+  0,                                     /*tp_weaklistoffset*/
+  (getiterfunc)ForthonDictView_iter,     /*tp_iter*/
+  0,                                     /*tp_iternext*/
+  ForthonDictView_methods,               /*tp_methods*/
+};
+
+static char getdictview_doc[] = "Returns a dictionary view of the variables in the package. Unlike getdict, the values are only fetched from the package when they are accessed, so it is created immediately and is never out of date, even after arrays are reallocated. Unallocated arrays and unassociated derived type pointers are not included, as in getdict, but can be assigned to. Assigning to an item sets the package variable. It can be used as the locals in eval, for example, eval(expression,globals(),pkg.getdictview()).";
+static PyObject *ForthonPackage_getdictview(PyObject *_self_,PyObject *args)
+{
+  ForthonDictViewObject *view;
+  if (!PyArg_ParseTuple(args,"")) return NULL;
+  if (ForthonDictViewType.tp_dict == NULL) {
+    if (PyType_Ready(&ForthonDictViewType) < 0) return NULL;
+    }
+  view = PyObject_New(ForthonDictViewObject,&ForthonDictViewType);
+  if (view == NULL) return NULL;
+  Py_INCREF(_self_);
+  view->package = (ForthonObject *)_self_;
+  return (PyObject *)view;
+}
+
 /* ######################################################################### */
 static char getfunctions_doc[] = "Builds a list containing all of the function names in the package.";
 static PyObject *ForthonPackage_getfunctions(PyObject *_self_,PyObject *args)
@@ -1119,70 +2380,117 @@ static PyObject *ForthonPackage_getfunctions(PyObject *_self_,PyObject *args)
 /* is done similar to that done in gchange, where what ever                  */
 /* fits into the space is copied. The main purpose of this                   */
 /* routine is to allow a restore from a dump file to work.                   */
-static char forceassign_doc[] = "Forces assignment to a dynamic array, resizing it if necessary";
-static PyObject *ForthonPackage_forceassign(PyObject *_self_,PyObject *args)
+/* If adopt is true, then for dynamic arrays the input must be an array      */
+/* that can be used without being copied, i.e. it is of the correct type,    */
+/* fortran ordered, aligned, writeable and in native byte order.            */
+/* Returns 0 on success, and -1 with the exception set otherwise.           */
+static int Forthon_forceassign(ForthonObject *self,char *name,PyObject *pyobj,
+                               int adopt)
 {
-  ForthonObject *self = (ForthonObject *)_self_;
   long i;
   int j,r=-1;
   npy_intp *pyadims,*axdims;
-  PyObject *pyobj;
   PyArrayObject *ax;
   PyObject *pyi;
-  char *name;
-  if (!PyArg_ParseTuple(args,"sO",&name,&pyobj)) return NULL;
 
   /* Get index for variable from array dictionary */
   /* If it is not found, the pyi is returned as NULL */
   pyi = PyDict_GetItemString(self->arraydict,name);
-  if (pyi != NULL) {
-    PyArg_Parse(pyi,"i",&i);
-    ax = FARRAY_FROMOBJECT(pyobj,self->farrays[i].type);
-    if (self->farrays[i].dynamic && PyArray_NDIM(ax) == self->farrays[i].nd) {
-      /* Free the existing array */
-      Forthon_freearray(self,(void *)i);
-      /* Point to the new one */
-      self->farrays[i].pya = ax;
-      (self->farrays[i].setarraypointer)(PyArray_BYTES(self->farrays[i].pya),(self->fobj),
-                                         PyArray_DIMS(self->farrays[i].pya));
-      totmembytes += (long)PyArray_NBYTES(self->farrays[i].pya);
-      returnnone;}
-    else if (PyArray_NDIM(ax) == self->farrays[i].nd) {
-      /* Copy input data into the array. This does a copy   */
-      /* even if the dimensions do not match. If an input   */
-      /* dimension is larger, the extra data is truncated.  */
-      /* This code ensures that the dimensions of ax        */
-      /* remain intact since there may be other references  */
-      /* to it.                                             */
-      pyadims = PyDimMem_NEW(PyArray_NDIM(ax));
-      axdims = PyDimMem_NEW(PyArray_NDIM(ax));
-      for (j=0;j<PyArray_NDIM(ax);j++) {
-        pyadims[j] = PyArray_DIM(self->farrays[i].pya,j);
-        axdims[j] = PyArray_DIM(ax,j);
-        if (PyArray_DIM(ax,j) < PyArray_DIM(self->farrays[i].pya,j)) {
-          PyArray_DIMS(self->farrays[i].pya)[j] = PyArray_DIM(ax,j);}
-        else {
-          PyArray_DIMS(ax)[j] = PyArray_DIM(self->farrays[i].pya,j);}
-        }
-      r = PyArray_CopyInto(self->farrays[i].pya,ax);
-      for (j=0;j<PyArray_NDIM(ax);j++) {
-        PyArray_DIMS(self->farrays[i].pya)[j] = pyadims[j];
-        PyArray_DIMS(ax)[j] = axdims[j];
-        }
-      PyDimMem_FREE(pyadims);
-      PyDimMem_FREE(axdims);
-      Py_XDECREF(ax);
-      if (r == 0) {
-        returnnone;}
-      else {
-        return NULL;}
+  if (pyi == NULL) {
+    PyErr_SetString(ErrorObject,"First argument must be an array");
+    return -1;
+    }
+  i = Forthon_slotfromobject(pyi);
+  ax = FARRAY_FROMOBJECT(pyobj,self->farrays[i].type);
+  if (ax == NULL) return -1;
+  if (PyArray_NDIM(ax) != self->farrays[i].nd) {
+    Py_DECREF(ax);
+    PyErr_SetString(ErrorObject,
+                "Both arguments must have the same number of dimensions");
+    return -1;
+    }
+  if (self->farrays[i].dynamic) {
+    if (adopt && (PyObject *)ax != pyobj) {
+      Py_DECREF(ax);
+      PyErr_Format(ErrorObject,"%s: adopted arrays must be fortran ordered, aligned and writeable, and have the same type as the package array",name);
+      return -1;
       }
+    /* Free the existing array */
+    Forthon_freearray(self,(void *)i);
+    /* Point to the new one */
+    self->farrays[i].pya = ax;
+    (self->farrays[i].setarraypointer)(PyArray_BYTES(self->farrays[i].pya),(self->fobj),
+                                       PyArray_DIMS(self->farrays[i].pya));
+    Forthon_addmembytes(self,i,Forthon_arraymembytes(self->farrays[i].pya));
+    return 0;
+    }
+
+  /* Copy input data into the array. This does a copy   */
+  /* even if the dimensions do not match. If an input   */
+  /* dimension is larger, the extra data is truncated.  */
+  /* This code ensures that the dimensions of ax        */
+  /* remain intact since there may be other references  */
+  /* to it.                                             */
+  pyadims = PyDimMem_NEW(PyArray_NDIM(ax));
+  axdims = PyDimMem_NEW(PyArray_NDIM(ax));
+  for (j=0;j<PyArray_NDIM(ax);j++) {
+    pyadims[j] = PyArray_DIM(self->farrays[i].pya,j);
+    axdims[j] = PyArray_DIM(ax,j);
+    if (PyArray_DIM(ax,j) < PyArray_DIM(self->farrays[i].pya,j)) {
+      PyArray_DIMS(self->farrays[i].pya)[j] = PyArray_DIM(ax,j);}
     else {
-      PyErr_SetString(ErrorObject,
-                  "Both arguments must have the same number of dimensions");
-      return NULL;}}
-  PyErr_SetString(ErrorObject,"First argument must be an array");
-  return NULL;
+      PyArray_DIMS(ax)[j] = PyArray_DIM(self->farrays[i].pya,j);}
+    }
+  r = PyArray_CopyInto(self->farrays[i].pya,ax);
+  for (j=0;j<PyArray_NDIM(ax);j++) {
+    PyArray_DIMS(self->farrays[i].pya)[j] = pyadims[j];
+    PyArray_DIMS(ax)[j] = axdims[j];
+    }
+  PyDimMem_FREE(pyadims);
+  PyDimMem_FREE(axdims);
+  Py_XDECREF(ax);
+  return r;
+}
+
+static char forceassign_doc[] = "forceassign(name,v,adopt=0) Forces assignment to a dynamic array, resizing it if necessary. If adopt is true, v must be an array that the package can use without a copy (fortran ordered, aligned, writeable, native byte order and the same type as the package array), otherwise an exception is raised. Static arrays are always copied into.";
+static PyObject *ForthonPackage_forceassign(PyObject *_self_,PyObject *args)
+{
+  ForthonObject *self = (ForthonObject *)_self_;
+  PyObject *pyobj;
+  char *name;
+  int adopt=0;
+  if (!PyArg_ParseTuple(args,"sO|i",&name,&pyobj,&adopt)) return NULL;
+  if (Forthon_forceassign(self,name,pyobj,adopt)) return NULL;
+  returnnone;
+}
+
+static char forceassignmany_doc[] = "forceassignmany(arrays,adopt=0) Does forceassign for many arrays in one call. The arrays can be a dictionary or a sequence of (name,array) pairs. If there is an error, the arrays up to the one with the error will have been assigned.";
+static PyObject *ForthonPackage_forceassignmany(PyObject *_self_,PyObject *args)
+{
+  ForthonObject *self = (ForthonObject *)_self_;
+  PyObject *arrays,*items,*item,*pyobj;
+  Py_ssize_t k,n;
+  char *name;
+  int adopt=0;
+  if (!PyArg_ParseTuple(args,"O|i",&arrays,&adopt)) return NULL;
+  if (PyDict_Check(arrays)) items = PyDict_Items(arrays);
+  else                      items = PySequence_Fast(arrays,"The arrays must be a dictionary or a sequence of (name,array) pairs");
+  if (items == NULL) return NULL;
+  n = PySequence_Fast_GET_SIZE(items);
+  for (k=0;k<n;k++) {
+    item = PySequence_Fast_GET_ITEM(items,k);
+    if (!PyTuple_Check(item) || !PyArg_ParseTuple(item,"sO",&name,&pyobj)) {
+      PyErr_SetString(ErrorObject,"The arrays must be a dictionary or a sequence of (name,array) pairs");
+      Py_DECREF(items);
+      return NULL;
+      }
+    if (Forthon_forceassign(self,name,pyobj,adopt)) {
+      Py_DECREF(items);
+      return NULL;
+      }
+    }
+  Py_DECREF(items);
+  returnnone;
 }
 
 /* ######################################################################### */
@@ -1196,27 +2504,33 @@ static PyObject *ForthonPackage_gallot(PyObject *_self_,PyObject *args)
   ForthonObject *self = (ForthonObject *)_self_;
   char *s=NULL;
   long i;
+  Py_ssize_t k;
   int j,r=0,allotit,iverbose=0;
-  PyObject *star;
+  PyObject *star,*slist,*alist;
   if (!PyArg_ParseTuple(args,"|si",&s,&iverbose)) return NULL;
-  self->allocated = 1;
-  if (s == NULL) s = "*";
-
-  /* Check for any scalars of derived type. These must also be allocated */
-  for (i=0;i<self->nscalars;i++) {
-    if (strcmp(s,self->fscalars[i].group)==0 || strcmp(s,"*")==0) {
-      if (!(self->fscalars[i].dynamic)) {
-        if (self->fscalars[i].type == NPY_OBJECT &&
-            self->fscalars[i].data != NULL) {
-          r = 1;
-          star = Py_BuildValue("(s)","*");
-          ForthonPackage_gallot((PyObject *)self->fscalars[i].data,star);
-          Py_DECREF(star);
-      }}}}
+  self->allocated = 1;
+  if (s == NULL) s = "*";
+
+  /* Get the lists of the variables in the group. If the group is not */
+  /* found, then there is nothing to do. */
+  if (!Forthon_getgroupmembers(self,s,&slist,&alist))
+    return Py_BuildValue("i",0);
+
+  /* Check for any scalars of derived type. These must also be allocated */
+  for (k=0;k<PyList_GET_SIZE(slist);k++) {
+    i = Forthon_slotfromobject(PyList_GET_ITEM(slist,k));
+    if (!(self->fscalars[i].dynamic)) {
+      if (self->fscalars[i].type == NPY_OBJECT &&
+          self->fscalars[i].data != NULL) {
+        r = 1;
+        star = Py_BuildValue("(s)","*");
+        ForthonPackage_gallot((PyObject *)self->fscalars[i].data,star);
+        Py_DECREF(star);
+    }}}
 
   /* Process the arrays now that the dimensions are set */
-  for (i=0;i<self->narrays;i++) {
-   if (strcmp(s,self->farrays[i].group)==0 || strcmp(s,"*")==0) {
+  for (k=0;k<PyList_GET_SIZE(alist);k++) {
+    i = Forthon_slotfromobject(PyList_GET_ITEM(alist,k));
     /* Update the array if it is dynamic and fortran assignable. */
     ForthonPackage_updatearray(self,i);
     /* Call the routine which sets the dimensions */
@@ -1235,7 +2549,7 @@ static PyObject *ForthonPackage_gallot(PyObject *_self_,PyObject *args)
       for (j=0;j<self->farrays[i].nd;j++)
         if (self->farrays[i].dimensions[j] <= 0) allotit = 0;
       if (allotit) {
-        self->farrays[i].pya = ForthonPackage_PyArrayFromFarray(&(self->farrays[i]),NULL);
+        self->farrays[i].pya = ForthonPackage_allocatearray(self,&(self->farrays[i]),iverbose);
         /* Check if the allocation was unsuccessful. */
         if (self->farrays[i].pya==NULL) {
           long arraysize=1;
@@ -1249,38 +2563,157 @@ static PyObject *ForthonPackage_gallot(PyObject *_self_,PyObject *args)
         (self->farrays[i].setarraypointer)(PyArray_BYTES(self->farrays[i].pya),
                                            (self->fobj),
                                            PyArray_DIMS(self->farrays[i].pya));
-        /* Fill array with initial value. A check could probably be made */
-        /* of whether the initial value is zero since the initialization */
-        /* doesn't need to be done then. Not having the check gaurantees */
-        /* that it is set correctly, but is slower. */
-        if (self->farrays[i].type == NPY_STRING) {
-          PyArray_FILLWBYTE(self->farrays[i].pya,(int)' ');
-          }
-        else if (self->farrays[i].type == NPY_LONG) {
-          for (j=0;j<PyArray_SIZE(self->farrays[i].pya);j++)
-            *((long *)(PyArray_BYTES(self->farrays[i].pya))+j) = self->farrays[i].initvalue;
-          }
-        else if (self->farrays[i].type == NPY_DOUBLE) {
-          for (j=0;j<PyArray_SIZE(self->farrays[i].pya);j++)
-            *((double *)(PyArray_BYTES(self->farrays[i].pya))+j) = self->farrays[i].initvalue;
-          }
-        else if (self->farrays[i].type == NPY_FLOAT) {
-          for (j=0;j<PyArray_SIZE(self->farrays[i].pya);j++)
-            *((float *)(PyArray_BYTES(self->farrays[i].pya))+j) = (float)self->farrays[i].initvalue;
-          }
-        /* Add the array size to totmembytes. */
-        totmembytes += (long)PyArray_NBYTES(self->farrays[i].pya);
-        if (iverbose) printf("Allocating %s.%s %d\n",self->name,self->farrays[i].name,
-                                       (int)PyArray_SIZE(self->farrays[i].pya));
+        /* Add the array size to the memory statistics. */
+        Forthon_addmembytes(self,i,Forthon_arraymembytes(self->farrays[i].pya));
         }
       }
-    }
   }
 
   /* If a variable was found, returns 1, otherwise returns 0. */
   return Py_BuildValue("i",r);
 }
 
+/* ######################################################################### */
+/* # Change the size of an array with the growable attribute in place.       */
+/* # The space is allocated with extra capacity in the last dimension, which */
+/* # is the slowest varying in fortran ordering, and the array that fortran  */
+/* # sees is a view of the leading part of it with the exact shape. When     */
+/* # only the last dimension changes and the new size fits in the capacity,  */
+/* # a new view is made of the same space so no data is copied. Otherwise,   */
+/* # the capacity is grown geometrically, by a factor of 1.5, so that the    */
+/* # cost of repeated small increases is amortized. Only the newly exposed   */
+/* # elements are filled with the initial value.                             */
+/* # The base of the view is a capsule which records the space, its capacity */
+/* # and the array that it belongs to, so that only space that was allocated */
+/* # here for the array is ever reused.                                      */
+/* # This returns 1 if the change was done, otherwise 0 and the array needs  */
+/* # to be changed in the normal way.                                        */
+static int ForthonPackage_growarray(ForthonObject *self,long i,int iverbose)
+{
+#if PY_VERSION_HEX >= 0x02070000
+  Fortranarray *farray = &(self->farrays[i]);
+  PyArrayObject *pya=farray->pya,*space,*ax,*newpart;
+  PyObject *capsule;
+  Forthon_growinfo *info;
+  npy_intp oldsize,newsize,capacity,oldlast,newlast,*spacedims;
+  int j,nd=farray->nd;
+
+  if (pya == NULL || farray->type == NPY_STRING || nd < 1) return 0;
+  if (strfind(" growable ",farray->attributes) < 0) return 0;
+  if (strfind(" mmap ",farray->attributes) >= 0) return 0;
+  if (PyArray_NDIM(pya) != nd || PyArray_TYPE(pya) != farray->type) return 0;
+
+  /* Only the last dimension can be changed. */
+  for (j=0;j<nd-1;j++)
+    if (farray->dimensions[j] != PyArray_DIM(pya,j)) return 0;
+  oldlast = PyArray_DIM(pya,nd-1);
+  newlast = farray->dimensions[nd-1];
+  if (oldlast == 0) return 0;
+
+  /* Check if the array is a view of space allocated here for this array. */
+  /* Otherwise, for example if the array was assigned by the user, the     */
+  /* space is not reused and the array can only grow, into new space.     */
+  info = Forthon_getgrowinfo(pya);
+  if (info != NULL &&
+      (info->owner != self || info->index != i ||
+       PyArray_DATA(info->space) != PyArray_DATA(pya))) info = NULL;
+  if (info != NULL) {
+    space = info->space;
+    capacity = info->capacity;
+    }
+  else {
+    if (newlast <= oldlast) return 0;
+    space = NULL;
+    capacity = oldlast;
+    }
+
+  /* When the array shrinks to less than half of the capacity, release */
+  /* the extra space by reallocating it normally. */
+  if (2*newlast < capacity) return 0;
+
+  oldsize = PyArray_SIZE(pya);
+  newsize = oldsize/oldlast*newlast;
+
+  if (newlast > capacity) {
+    /* Make new space with extra capacity and copy the old data into it. */
+    /* Since the leading dimensions are unchanged, the old data is at    */
+    /* the beginning of the new space. */
+    capacity = capacity + capacity/2;
+    if (capacity < newlast) capacity = newlast;
+    spacedims = PyDimMem_NEW(nd);
+    for (j=0;j<nd-1;j++) spacedims[j] = farray->dimensions[j];
+    spacedims[nd-1] = capacity;
+    space = Forthon_newarray(nd,spacedims,farray->type,
+                             farray->initvalue == 0.);
+    PyDimMem_FREE(spacedims);
+    if (space == NULL) return 0;
+    memcpy(PyArray_DATA(space),PyArray_DATA(pya),PyArray_NBYTES(pya));
+    if (iverbose) printf("Growing %s.%s capacity to %ld\n",self->name,
+                         farray->name,(long)capacity);
+    }
+  else {
+    Py_INCREF(space);
+    }
+
+  info = (Forthon_growinfo *)PyMem_Malloc(sizeof(Forthon_growinfo));
+  if (info == NULL) {
+    Py_DECREF(space);
+    return 0;
+    }
+  info->space = space;
+  info->capacity = capacity;
+  info->owner = self;
+  info->index = i;
+  capsule = PyCapsule_New((void *)info,"Forthon_growinfo",
+                          Forthon_freegrowcapsule);
+  if (capsule == NULL) {
+    Py_DECREF(space);
+    PyMem_Free(info);
+    PyErr_Clear();
+    return 0;
+    }
+
+  /* Create the view of the space with the exact dimensions. */
+  ax = (PyArrayObject *)PyArray_New(&PyArray_Type,nd,farray->dimensions,
+                                    farray->type,NULL,PyArray_DATA(space),0,
+                                    NPY_ARRAY_FARRAY,NULL);
+  if (ax == NULL) {
+    Py_DECREF(capsule);
+    PyErr_Clear();
+    return 0;
+    }
+#if NPY_API_VERSION >= 0x00000007
+  PyArray_SetBaseObject(ax,capsule);
+#else
+  ax->base = capsule;
+#endif
+
+  /* Fill in the newly exposed part. This is needed even when the space */
+  /* is reused since it may hold old data from before a shrink. */
+  if (newsize > oldsize) {
+    newsize -= oldsize;
+    newpart = (PyArrayObject *)PyArray_New(&PyArray_Type,1,&newsize,
+                                           farray->type,NULL,
+                                           PyArray_BYTES(ax)+oldsize*PyArray_ITEMSIZE(ax),
+                                           0,NPY_ARRAY_FARRAY,NULL);
+    Forthon_fillinitvalue(newpart,farray);
+    Py_DECREF(newpart);
+    }
+
+  /* Replace the old array and point fortran to the new view. */
+  Forthon_freearray(self,(void *)i);
+  farray->pya = ax;
+  (farray->setarraypointer)(PyArray_BYTES(farray->pya),(self->fobj),
+                            PyArray_DIMS(farray->pya));
+  Forthon_addmembytes(self,i,Forthon_arraymembytes(farray->pya));
+  if (iverbose) printf("Changing %s.%s %d in place\n",self->name,farray->name,
+                                 (int)PyArray_SIZE(farray->pya));
+  return 1;
+#else
+  return 0;
+#endif
+}
+
 /* ######################################################################### */
 /* # Group allocation change routine */
 static char gchange_doc[] = "Changes allocation of all dynamic arrays in a group if needed";
@@ -1289,31 +2722,37 @@ static PyObject *ForthonPackage_gchange(PyObject *_self_,PyObject *args)
   ForthonObject *self = (ForthonObject *)_self_;
   char *s=NULL;
   long i;
+  Py_ssize_t k;
   int r=0;
   PyArrayObject *ax;
   int j,rt,changeit,freeit,iverbose=0;
   npy_intp *pyadims,*axdims;
-  PyObject *star;
+  PyObject *star,*slist,*alist;
 
   if (!PyArg_ParseTuple(args,"|si",&s,&iverbose)) return NULL;
   self->allocated = 1;
   if (s == NULL) s = "*";
 
+  /* Get the lists of the variables in the group. If the group is not */
+  /* found, then there is nothing to do. */
+  if (!Forthon_getgroupmembers(self,s,&slist,&alist))
+    return Py_BuildValue("i",0);
+
   /* Check for any scalars of derived type. These must also be allocated */
-  for (i=0;i<self->nscalars;i++) {
-    if (strcmp(s,self->fscalars[i].group)==0 || strcmp(s,"*")==0) {
-      if (!(self->fscalars[i].dynamic)) {
-        if (self->fscalars[i].type == NPY_OBJECT &&
-            self->fscalars[i].data != NULL) {
-          r = 1;
-          star = Py_BuildValue("(s)","*");
-          ForthonPackage_gchange((PyObject *)self->fscalars[i].data,star);
-          Py_DECREF(star);
-      }}}}
+  for (k=0;k<PyList_GET_SIZE(slist);k++) {
+    i = Forthon_slotfromobject(PyList_GET_ITEM(slist,k));
+    if (!(self->fscalars[i].dynamic)) {
+      if (self->fscalars[i].type == NPY_OBJECT &&
+          self->fscalars[i].data != NULL) {
+        r = 1;
+        star = Py_BuildValue("(s)","*");
+        ForthonPackage_gchange((PyObject *)self->fscalars[i].data,star);
+        Py_DECREF(star);
+    }}}
 
   /* Process the arrays now that the dimensions are set */
-  for (i=0;i<self->narrays;i++) {
-   if (strcmp(s,self->farrays[i].group)==0 || strcmp(s,"*")==0) {
+  for (k=0;k<PyList_GET_SIZE(alist);k++) {
+    i = Forthon_slotfromobject(PyList_GET_ITEM(alist,k));
     r = 1;
     if (self->farrays[i].dynamic) {
       /* Update the array if it is dynamic and fortran assignable. */
@@ -1339,10 +2778,12 @@ static PyObject *ForthonPackage_gchange(PyObject *_self_,PyObject *args)
         if (self->farrays[i].dimensions[j] <= 0) freeit = 1;
       if (freeit) Forthon_freearray(self,(void *)i);
       /* Only allocate new space and copy old data if */
-      /* any dimensions are different. */
-      if (changeit && !freeit) {
-        /* Use array routine to create new space */
-        ax = ForthonPackage_PyArrayFromFarray(&(self->farrays[i]),NULL);
+      /* any dimensions are different. Arrays with the growable */
+      /* attribute may be changed in place instead. */
+      if (changeit && !freeit && !ForthonPackage_growarray(self,i,iverbose)) {
+        /* Use array routine to create new space, filled with the */
+        /* initial value. */
+        ax = ForthonPackage_allocatearray(self,&(self->farrays[i]),iverbose);
         /* Check if the allocation was unsuccessful. */
         if (ax==NULL) {
           long arraysize=1;
@@ -1352,25 +2793,6 @@ static PyObject *ForthonPackage_gchange(PyObject *_self_,PyObject *args)
                  self->farrays[i].name,arraysize);
           exit(EXIT_FAILURE);
           }
-        /* Fill array with initial value. A check could probably be made */
-        /* of whether the initial value is zero since the initialization */
-        /* doesn't need to be done then. Not having the check gaurantees */
-        /* that it is set correctly, but is slower. */
-        if (self->farrays[i].type == NPY_STRING) {
-          PyArray_FILLWBYTE(ax,(int)' ');
-          }
-        else if (self->farrays[i].type == NPY_LONG) {
-          for (j=0;j<PyArray_SIZE(ax);j++)
-            *((long *)(PyArray_BYTES(ax))+j) = self->farrays[i].initvalue;
-          }
-        else if (self->farrays[i].type == NPY_DOUBLE) {
-          for (j=0;j<PyArray_SIZE(ax);j++)
-            *((double *)(PyArray_BYTES(ax))+j) = self->farrays[i].initvalue;
-          }
-        else if (self->farrays[i].type == NPY_FLOAT) {
-          for (j=0;j<PyArray_SIZE(ax);j++)
-            *((float *)(PyArray_BYTES(ax))+j) = (float)self->farrays[i].initvalue;
-          }
         /* Copy the existing data to the new space. The       */
         /* minimum of each dimension is found and put into    */
         /* the old arrays dimensions. The new arrays          */
@@ -1411,13 +2833,10 @@ static PyObject *ForthonPackage_gchange(PyObject *_self_,PyObject *args)
         (self->farrays[i].setarraypointer)(PyArray_BYTES(self->farrays[i].pya),
                                            (self->fobj),
                                            PyArray_DIMS(self->farrays[i].pya));
-        /* Add the array size to totmembytes. */
-        totmembytes += (long)PyArray_NBYTES(self->farrays[i].pya);
-        if (iverbose) printf("Allocating %s.%s %d\n",self->name,self->farrays[i].name,
-                                       (int)PyArray_SIZE(self->farrays[i].pya));
+        /* Add the array size to the memory statistics. */
+        Forthon_addmembytes(self,i,Forthon_arraymembytes(self->farrays[i].pya));
         }
       }
-    }
   }
 
   /* If a variable was found, returns 1, otherwise returns 0. */
@@ -1504,6 +2923,9 @@ static PyObject *ForthonPackage_addvarattr(PyObject *_self_,PyObject *args)
   char *name,*attr,*newattr;
   if (!PyArg_ParseTuple(args,"ss",&name,&attr)) return NULL;
 
+  /* The attributes are changing so the attribute index must be rebuilt */
+  Forthon_DeleteAttrDict(self);
+
   /* Get index for variable from scalar dictionary */
   /* If it is not found, the pyi is returned as NULL */
   pyi = PyDict_GetItemString(self->scalardict,name);
@@ -1594,6 +3016,9 @@ static PyObject *ForthonPackage_setvarattr(PyObject *_self_,PyObject *args)
   char *name,*attr;
   if (!PyArg_ParseTuple(args,"ss",&name,&attr)) return NULL;
 
+  /* The attributes are changing so the attribute index must be rebuilt */
+  Forthon_DeleteAttrDict(self);
+
   /* Get index for variable from scalar dictionary */
   /* If it is not found, the pyi is returned as NULL */
   pyi = PyDict_GetItemString(self->scalardict,name);
@@ -1631,6 +3056,9 @@ static PyObject *ForthonPackage_delvarattr(PyObject *_self_,PyObject *args)
   char *name,*attr,*newattr;
   if (!PyArg_ParseTuple(args,"ss",&name,&attr)) return NULL;
 
+  /* The attributes are changing so the attribute index must be rebuilt */
+  Forthon_DeleteAttrDict(self);
+
   /* Get index for variable from scalar dictionary */
   /* If it is not found, the pyi is returned as NULL */
   pyi = PyDict_GetItemString(self->scalardict,name);
@@ -1825,35 +3253,40 @@ static PyObject *ForthonPackage_gfree(PyObject *_self_,PyObject *args)
 {
   ForthonObject *self = (ForthonObject *)_self_;
   long i;
+  Py_ssize_t k;
   int r=0;
   char *s=NULL;
-  PyObject *star;
+  PyObject *star,*slist,*alist;
 
   if (!PyArg_ParseTuple(args,"|s",&s)) return NULL;
   if (s == NULL) s = "*";
 
   self->allocated = 0;
 
-  /* Check for any scalars of derived type. These must also be freed */
-  for (i=0;i<self->nscalars;i++) {
-    if (strcmp(s,self->fscalars[i].group)==0 || strcmp(s,"*")==0) {
-      if (!(self->fscalars[i].dynamic)) {
-        if (self->fscalars[i].type == NPY_OBJECT &&
-            self->fscalars[i].data != NULL) {
-          r = 1;
-          star = Py_BuildValue("(s)","*");
-          ForthonPackage_gfree((PyObject *)self->fscalars[i].data,star);
-          Py_DECREF(star);
-      }}}}
+  /* Get the lists of the variables in the group. If the group is not */
+  /* found, then there is nothing to do. */
+  if (!Forthon_getgroupmembers(self,s,&slist,&alist))
+    return Py_BuildValue("i",0);
 
-  for (i=0;i<self->narrays;i++) {
-    if (strcmp(s,self->farrays[i].group)==0 || strcmp(s,"*")==0) {
-      r = 1;
-      /* Update the array if it is dynamic and fortran assignable. */
-      ForthonPackage_updatearray(self,i);
-      /* Then free it */
-      Forthon_freearray(self,(void *)i);
-      }
+  /* Check for any scalars of derived type. These must also be freed */
+  for (k=0;k<PyList_GET_SIZE(slist);k++) {
+    i = Forthon_slotfromobject(PyList_GET_ITEM(slist,k));
+    if (!(self->fscalars[i].dynamic)) {
+      if (self->fscalars[i].type == NPY_OBJECT &&
+          self->fscalars[i].data != NULL) {
+        r = 1;
+        star = Py_BuildValue("(s)","*");
+        ForthonPackage_gfree((PyObject *)self->fscalars[i].data,star);
+        Py_DECREF(star);
+    }}}
+
+  for (k=0;k<PyList_GET_SIZE(alist);k++) {
+    i = Forthon_slotfromobject(PyList_GET_ITEM(alist,k));
+    r = 1;
+    /* Update the array if it is dynamic and fortran assignable. */
+    ForthonPackage_updatearray(self,i);
+    /* Then free it */
+    Forthon_freearray(self,(void *)i);
     }
 
   return Py_BuildValue("i",r);
@@ -1869,13 +3302,15 @@ static PyObject *ForthonPackage_gsetdims(PyObject *_self_,PyObject *args)
   ForthonObject *self = (ForthonObject *)_self_;
   char *s=NULL;
   int i,iverbose;
-  PyObject *star;
+  Py_ssize_t k;
+  PyObject *star,*slist,*alist;
   if (!PyArg_ParseTuple(args,"|si",&s,&iverbose)) return NULL;
   if (s == NULL) s = "*";
 
   /* Check for any scalars of derived type. These must also be allocated */
-  for (i=0;i<self->nscalars;i++) {
-    if (strcmp(s,self->fscalars[i].group)==0 || strcmp(s,"*")==0) {
+  if (Forthon_getgroupmembers(self,s,&slist,&alist)) {
+    for (k=0;k<PyList_GET_SIZE(slist);k++) {
+      i = Forthon_slotfromobject(PyList_GET_ITEM(slist,k));
       if (!(self->fscalars[i].dynamic)) {
         if (self->fscalars[i].type == NPY_OBJECT &&
             self->fscalars[i].data != NULL) {
@@ -2162,6 +3597,368 @@ static PyObject *ForthonPackage_setdict(PyObject *_self_,PyObject *args)
   returnnone;
 }
 
+/* ######################################################################### */
+/* # Sets the directory where the files for mapped arrays are created.      */
+static char setscratchdir_doc[] = "setscratchdir(dirname) Sets the directory where the files backing arrays with the mmap attribute are created. If dirname is None, the environment variable FORTHON_SCRATCHDIR or the current directory is used.";
+static PyObject *ForthonPackage_setscratchdir(PyObject *self,PyObject *args)
+{
+  char *dirname=NULL;
+  if (!PyArg_ParseTuple(args,"z",&dirname)) return NULL;
+  if (Forthon_scratchdir != NULL) PyMem_Free(Forthon_scratchdir);
+  Forthon_scratchdir = NULL;
+  if (dirname != NULL) {
+    Forthon_scratchdir = (char *)PyMem_Malloc(strlen(dirname)+1);
+    strcpy(Forthon_scratchdir,dirname);
+    }
+  returnnone;
+}
+
+/* ######################################################################### */
+/* # Selects how the space for dynamic arrays is allocated.                 */
+static char setallocator_doc[] = "setallocator(alignment=0,hugepages=0,firsttouch=0) Selects how the space for dynamic arrays is allocated. The data is aligned to alignment bytes, which must be a power of two. With hugepages, the space is advised to use transparent huge pages. With firsttouch, zero initialized arrays are not touched when allocated so that pages are placed by the threads that first use them. With no arguments, numpy's allocator is used. This only affects arrays allocated afterward.";
+static PyObject *ForthonPackage_setallocator(PyObject *self,PyObject *args)
+{
+  long alignment=0;
+  int hugepages=0,firsttouch=0;
+  if (!PyArg_ParseTuple(args,"|lii",&alignment,&hugepages,&firsttouch))
+    return NULL;
+  if (alignment < 0 || (alignment & (alignment - 1)) != 0) {
+    PyErr_SetString(ErrorObject,"alignment must be a power of two");
+    return NULL;
+    }
+  Forthon_alignment = alignment;
+  Forthon_hugepages = hugepages;
+  Forthon_firsttouch = firsttouch;
+  returnnone;
+}
+
+/* ######################################################################### */
+/* # Returns the allocator settings.                                        */
+static char getallocator_doc[] = "Returns the allocator settings as a tuple (alignment,hugepages,firsttouch)";
+static PyObject *ForthonPackage_getallocator(PyObject *self,PyObject *args)
+{
+  return Py_BuildValue("(lii)",Forthon_alignment,Forthon_hugepages,
+                       Forthon_firsttouch);
+}
+
+/* ######################################################################### */
+/* # Controls and returns the call statistics of the wrapped routines.      */
+static char instrumentroutines_doc[] = "instrumentroutines(flag=1,reset=0) Turns on or off the recording of call statistics of the wrapped fortran routines of the package. If reset is true, the statistics are zeroed. Returns the previous setting. See getroutinestats.";
+static PyObject *ForthonPackage_instrumentroutines(PyObject *_self_,PyObject *args)
+{
+  int flag=1,reset=0,previous;
+  if (!PyArg_ParseTuple(args,"|ii",&flag,&reset)) return NULL;
+  previous = Forthon_instrumenting;
+  if (reset && Forthon_routinestatslist != NULL)
+    memset(Forthon_routinestatslist,0,
+           Forthon_nroutines*sizeof(Forthon_routinestats));
+  Forthon_instrumenting = flag;
+  return Py_BuildValue("i",previous);
+}
+
+static char getroutinestats_doc[] = "getroutinestats() Returns the call statistics of the wrapped fortran routines of the package, as a numpy record array with the fields name, ncalls, total, min and max (the wall clock time in seconds) and bytes (the total size of the array arguments). The statistics are only recorded after instrumentroutines is called.";
+static PyObject *ForthonPackage_getroutinestats(PyObject *_self_,PyObject *args)
+{
+  PyObject *list,*item,*dtype;
+  PyArray_Descr *descr;
+  Forthon_routinestats *stats;
+  int k;
+  if (!PyArg_ParseTuple(args,"")) return NULL;
+  dtype = Py_BuildValue("[(ss)(ss)(ss)(ss)(ss)(ss)]","name","S32","ncalls","i8",
+                        "total","f8","min","f8","max","f8","bytes","i8");
+  if (!PyArray_DescrConverter(dtype,&descr)) {
+    Py_DECREF(dtype);
+    return NULL;
+    }
+  Py_DECREF(dtype);
+  list = PyList_New(0);
+  for (k=0;k<Forthon_nroutines;k++) {
+    stats = Forthon_routinestatslist + k;
+    item = Py_BuildValue("(sldddl)",Forthon_routinemethods[k].ml_name,
+                         stats->ncalls,stats->total,stats->min,stats->max,
+                         stats->bytes);
+    PyList_Append(list,item);
+    Py_DECREF(item);
+    }
+  /* PyArray_FromAny steals the reference to descr */
+  item = PyArray_FromAny(list,descr,1,1,0,NULL);
+  Py_DECREF(list);
+  return item;
+}
+
+/* ######################################################################### */
+/* # Returns the memory statistics of the object, a group or an array.      */
+static char getmemstats_doc[] = "getmemstats([name]) Returns the memory statistics of the object, or of the group or array with the given name, as a tuple (live bytes, peak bytes, number of allocations, time of the last change in size)";
+static PyObject *ForthonPackage_getmemstats(PyObject *_self_,PyObject *args)
+{
+  ForthonObject *self = (ForthonObject *)_self_;
+  static Forthon_memstats nostats = {0,0,0,0.};
+  Forthon_memstats *stats = &nostats;
+  PyObject *pyi,*slist,*alist;
+  long i;
+  char *name=NULL;
+  if (!PyArg_ParseTuple(args,"|s",&name)) return NULL;
+
+  if (name == NULL || strcmp(name,"*") == 0) {
+    if (self->memstats != NULL) stats = &(self->memstats[2*self->narrays]);
+    }
+  else if ((pyi = PyDict_GetItemString(self->arraydict,name)) != NULL) {
+    i = Forthon_slotfromobject(pyi);
+    if (self->memstats != NULL) stats = &(self->memstats[i]);
+    }
+  else if (Forthon_getgroupmembers(self,name,&slist,&alist)) {
+    if (self->memstats != NULL && PyList_GET_SIZE(alist) > 0) {
+      i = Forthon_slotfromobject(PyList_GET_ITEM(alist,0));
+      stats = &(self->memstats[self->narrays+self->memgroup[i]]);
+      }
+    }
+  else {
+    PyErr_SetString(ErrorObject,"No such array or group");
+    return NULL;
+    }
+
+  return Py_BuildValue("(llld)",stats->live,stats->peak,stats->nallocs,
+                       stats->lastresize);
+}
+
+/* ######################################################################### */
+/* # Get the slot of a variable, given either its name or the slot itself.  */
+static int Forthon_getslot(ForthonObject *self,PyObject *item,long *i)
+{
+  PyObject *pyi;
+#if PY_MAJOR_VERSION < 3
+  if (PyInt_Check(item)) {
+    *i = PyInt_AsLong(item);
+#else
+  if (PyLong_Check(item)) {
+    *i = PyLong_AsLong(item);
+#endif
+    if (*i >= self->nscalars || *i < -self->narrays) {
+      PyErr_SetString(ErrorObject,"No such variable slot");
+      return 0;
+      }
+    return 1;
+    }
+  pyi = PyDict_GetItem(self->vardict,item);
+  if (pyi == NULL) {
+    PyErr_SetString(ErrorObject,"No such variable");
+    return 0;
+    }
+  *i = Forthon_slotfromobject(pyi);
+  return 1;
+}
+
+/* ######################################################################### */
+/* # Returns the slots of a list of variables.                              */
+static char getvarslots_doc[] = "getvarslots(names) Returns a tuple of the slots of the variables, which can be passed to getvars and setvars in place of the names, avoiding the lookup of the names";
+static PyObject *ForthonPackage_getvarslots(PyObject *_self_,PyObject *args)
+{
+  ForthonObject *self = (ForthonObject *)_self_;
+  PyObject *names,*seq,*result;
+  Py_ssize_t k,n;
+  long i;
+  if (!PyArg_ParseTuple(args,"O",&names)) return NULL;
+  seq = PySequence_Fast(names,"getvarslots requires a sequence of names");
+  if (seq == NULL) return NULL;
+  n = PySequence_Fast_GET_SIZE(seq);
+  result = PyTuple_New(n);
+  for (k=0;k<n;k++) {
+    if (!Forthon_getslot(self,PySequence_Fast_GET_ITEM(seq,k),&i)) {
+      Py_DECREF(seq);
+      Py_DECREF(result);
+      return NULL;
+      }
+    PyTuple_SET_ITEM(result,k,Py_BuildValue("l",i));
+    }
+  Py_DECREF(seq);
+  return result;
+}
+
+/* ######################################################################### */
+/* # Returns the values of a list of variables.                             */
+static char getvars_doc[] = "getvars(names) Returns a tuple of the values of the variables. The names can be replaced by the slots returned by getvarslots.";
+static PyObject *ForthonPackage_getvars(PyObject *_self_,PyObject *args)
+{
+  ForthonObject *self = (ForthonObject *)_self_;
+  PyObject *names,*seq,*result,*v;
+  Py_ssize_t k,n;
+  long i;
+  if (!PyArg_ParseTuple(args,"O",&names)) return NULL;
+  seq = PySequence_Fast(names,"getvars requires a sequence of names");
+  if (seq == NULL) return NULL;
+  n = PySequence_Fast_GET_SIZE(seq);
+  result = PyTuple_New(n);
+  for (k=0;k<n;k++) {
+    if (!Forthon_getslot(self,PySequence_Fast_GET_ITEM(seq,k),&i) ||
+        (v = Forthon_getvariable(self,i)) == NULL) {
+      Py_DECREF(seq);
+      Py_DECREF(result);
+      return NULL;
+      }
+    PyTuple_SET_ITEM(result,k,v);
+    }
+  Py_DECREF(seq);
+  return result;
+}
+
+/* ######################################################################### */
+/* # Sets the values of a list of variables.                                */
+static char setvars_doc[] = "setvars(names,values) Sets the values of the variables. The names can be replaced by the slots returned by getvarslots. All of the names and values are checked before anything is set. The scalars are set before the arrays, since the shapes of the arrays can depend on them, and the shapes are checked as the arrays are set.";
+static PyObject *ForthonPackage_setvars(PyObject *_self_,PyObject *args)
+{
+  ForthonObject *self = (ForthonObject *)_self_;
+  PyObject *names,*values,*nseq,*vseq=NULL,*v;
+  PyArrayObject **ax=NULL;
+  Py_ssize_t k,n=0;
+  long *slots=NULL;
+  int r=-1;
+  if (!PyArg_ParseTuple(args,"OO",&names,&values)) return NULL;
+  nseq = PySequence_Fast(names,"setvars requires a sequence of names");
+  if (nseq == NULL) return NULL;
+  vseq = PySequence_Fast(values,"setvars requires a sequence of values");
+  if (vseq == NULL) goto done;
+  n = PySequence_Fast_GET_SIZE(nseq);
+  if (PySequence_Fast_GET_SIZE(vseq) != n) {
+    PyErr_SetString(ErrorObject,"The number of names and values differ");
+    goto done;
+    }
+  slots = (long *)PyMem_Malloc((n+1)*sizeof(long));
+  ax = (PyArrayObject **)PyMem_Malloc((n+1)*sizeof(PyArrayObject *));
+  for (k=0;k<n;k++) ax[k] = NULL;
+
+  /* First, check everything. */
+  for (k=0;k<n;k++) {
+    if (!Forthon_getslot(self,PySequence_Fast_GET_ITEM(nseq,k),&slots[k]) ||
+        !Forthon_checkvariablevalue(self,slots[k],
+                                    PySequence_Fast_GET_ITEM(vseq,k),&ax[k]))
+      goto done;
+    }
+
+  /* Set the scalars, then the arrays. For arrays, the already converted */
+  /* values are used. */
+  for (k=0;k<n;k++) {
+    if (slots[k] >= 0 &&
+        Forthon_setvariable(self,slots[k],PySequence_Fast_GET_ITEM(vseq,k)))
+      goto done;
+    }
+  for (k=0;k<n;k++) {
+    if (slots[k] < 0) {
+      v = (ax[k] == NULL)?Py_None:(PyObject *)ax[k];
+      if (Forthon_setvariable(self,slots[k],v)) goto done;
+      }
+    }
+  r = 0;
+
+done:
+  if (ax != NULL) {
+    for (k=0;k<n;k++) Py_XDECREF(ax[k]);
+    PyMem_Free(ax);
+    }
+  if (slots != NULL) PyMem_Free(slots);
+  Py_XDECREF(vseq);
+  Py_DECREF(nseq);
+  if (r) return NULL;
+  returnnone;
+}
+
+/* ######################################################################### */
+/* # Returns the scalars of a group as a numpy structured array.            */
+/* # The layout of the record for each group is saved in the recorddict, as */
+/* # a tuple of the dtype, the slots of the scalars and their sizes, so     */
+/* # that each call only needs to copy the data.                            */
+static PyObject *Forthon_getrecordlayout(ForthonObject *self,char *group)
+{
+  PyObject *layout,*slist,*fields,*slots,*sizes,*field;
+  PyArray_Descr *descr;
+  Py_ssize_t k;
+  long i;
+
+  if (self->recorddict == NULL) self->recorddict = PyDict_New();
+  layout = PyDict_GetItemString(self->recorddict,group);
+  if (layout != NULL) return layout;
+
+  if (!Forthon_getgroupmembers(self,group,&slist,&fields)) {
+    PyErr_SetString(ErrorObject,"No such group");
+    return NULL;
+    }
+  fields = PyList_New(0);
+  slots = PyList_New(0);
+  sizes = PyList_New(0);
+  for (k=0;k<PyList_GET_SIZE(slist);k++) {
+    i = Forthon_slotfromobject(PyList_GET_ITEM(slist,k));
+    if (self->fscalars[i].type == NPY_OBJECT) continue;
+    descr = PyArray_DescrFromType(self->fscalars[i].type);
+    field = Py_BuildValue("(sN)",self->fscalars[i].name,(PyObject *)descr);
+    PyList_Append(fields,field);
+    Py_DECREF(field);
+    PyList_Append(slots,PyList_GET_ITEM(slist,k));
+    field = Py_BuildValue("i",descr->elsize);
+    PyList_Append(sizes,field);
+    Py_DECREF(field);
+    }
+  if (!PyArray_DescrConverter(fields,&descr)) {
+    Py_DECREF(fields);
+    Py_DECREF(slots);
+    Py_DECREF(sizes);
+    return NULL;
+    }
+  Py_DECREF(fields);
+  layout = Py_BuildValue("(NNN)",(PyObject *)descr,slots,sizes);
+  PyDict_SetItemString(self->recorddict,group,layout);
+  Py_DECREF(layout);
+  return layout;
+}
+
+static char getscalarrecord_doc[] = "getscalarrecord(group='*',out=None) Returns the values of the scalars in the group (or of all scalars) as a numpy structured array of one element, with a field for each scalar. Derived type scalars are skipped. If out is given, it must be an array with the same dtype, and the values are copied into its first element, for example, getscalarrecord(group,history[i:i+1]).";
+static PyObject *ForthonPackage_getscalarrecord(PyObject *_self_,PyObject *args)
+{
+  ForthonObject *self = (ForthonObject *)_self_;
+  PyObject *layout,*slots,*sizes;
+  PyArrayObject *out=NULL;
+  PyArray_Descr *descr;
+  npy_intp one=1;
+  Py_ssize_t k;
+  long i,size;
+  char *group="*",*data;
+  if (!PyArg_ParseTuple(args,"|sO!",&group,&PyArray_Type,&out)) return NULL;
+
+  layout = Forthon_getrecordlayout(self,group);
+  if (layout == NULL) return NULL;
+  descr = (PyArray_Descr *)PyTuple_GET_ITEM(layout,0);
+  slots = PyTuple_GET_ITEM(layout,1);
+  sizes = PyTuple_GET_ITEM(layout,2);
+
+  if (out == NULL) {
+    Py_INCREF(descr);
+    out = (PyArrayObject *)PyArray_NewFromDescr(&PyArray_Type,descr,1,&one,
+                                                NULL,NULL,0,NULL);
+    if (out == NULL) return NULL;
+    }
+  else {
+    if (!PyArray_EquivTypes(PyArray_DESCR(out),descr) ||
+        PyArray_SIZE(out) < 1 || !PyArray_ISWRITEABLE(out)) {
+      PyErr_SetString(ErrorObject,"out must be a writeable array with the dtype of the record");
+      return NULL;
+      }
+    Py_INCREF(out);
+    }
+
+  /* Gather the scalars into the record */
+  data = PyArray_BYTES(out);
+  for (k=0;k<PyList_GET_SIZE(slots);k++) {
+    i = Forthon_slotfromobject(PyList_GET_ITEM(slots,k));
+    size = Forthon_slotfromobject(PyList_GET_ITEM(sizes,k));
+    if (self->fscalars[i].getaction != NULL) {
+      if (self->fobj == NULL) self->fscalars[i].getaction();
+      else                    self->fscalars[i].getaction((self->fobj));
+      Forthon_fstate->generation++;
+      }
+    memcpy(data,self->fscalars[i].data,size);
+    data += size;
+    }
+  return (PyObject *)out;
+}
+
 /* ######################################################################### */
 /* # Returns the total number of bytes which have been allocated.           */
 static char totmembytes_doc[] = "Returns total number of bytes dynamically allocated for the object.";
@@ -2176,19 +3973,53 @@ static char varlist_doc[] = "Returns a list of variables having either an attrib
 static PyObject *ForthonPackage_varlist(PyObject *_self_,PyObject *args)
 {
   ForthonObject *self = (ForthonObject *)_self_;
-  PyObject *result,*pyname;
+  PyObject *result,*pyname,*slist,*alist,*key,*members;
+  Py_ssize_t k,pos;
   int i;
   char *name = "*";
+  char *smark,*amark;
   if (!PyArg_ParseTuple(args,"|s",&name)) return NULL;
 
-  /* # Create the list to be returned, initially an empty list */
+  /* # Mark the variables which are in the group or which have name as */
+  /* # an attribute. The marks are used so that the variables are returned */
+  /* # in the order in which they are defined and are only listed once. */
+  smark = (char *)PyMem_Malloc(self->nscalars + self->narrays + 1);
+  memset(smark,0,self->nscalars + self->narrays + 1);
+  amark = smark + self->nscalars;
+
+  if (Forthon_getgroupmembers(self,name,&slist,&alist)) {
+    for (k=0;k<PyList_GET_SIZE(slist);k++)
+      smark[Forthon_slotfromobject(PyList_GET_ITEM(slist,k))] = 1;
+    for (k=0;k<PyList_GET_SIZE(alist);k++)
+      amark[Forthon_slotfromobject(PyList_GET_ITEM(alist,k))] = 1;
+    }
+
+  if (self->attrdict == NULL) Forthon_BuildAttrDict(self);
+  pos = 0;
+  while (PyDict_Next(self->attrdict,&pos,&key,&members)) {
+#if PY_MAJOR_VERSION >= 3
+    pyname = PyUnicode_AsUTF8String(key);
+#else
+    pyname = key;
+    Py_INCREF(pyname);
+#endif
+    if (strfind(name,PyBytes_AS_STRING(pyname))>=0) {
+      slist = PyTuple_GET_ITEM(members,0);
+      alist = PyTuple_GET_ITEM(members,1);
+      for (k=0;k<PyList_GET_SIZE(slist);k++)
+        smark[Forthon_slotfromobject(PyList_GET_ITEM(slist,k))] = 1;
+      for (k=0;k<PyList_GET_SIZE(alist);k++)
+        amark[Forthon_slotfromobject(PyList_GET_ITEM(alist,k))] = 1;
+      }
+    Py_DECREF(pyname);
+    }
+
+  /* # Create the list to be returned */
   result = PyList_New(0);
 
   /* # Loop over scalars */
   for (i=0;i<self->nscalars;i++) {
-    if (strcmp(name,self->fscalars[i].group) == 0 ||
-        strcmp(name,"*")==0 ||
-        strfind(name,self->fscalars[i].attributes)>=0) {
+    if (smark[i]) {
       pyname = Py_BuildValue("s",self->fscalars[i].name);
       PyList_Append(result,pyname);
       Py_DECREF(pyname);
@@ -2197,15 +4028,14 @@ static PyObject *ForthonPackage_varlist(PyObject *_self_,PyObject *args)
 
   /* # Loop over arrays */
   for (i=0;i<self->narrays;i++) {
-    if (strcmp(name,self->farrays[i].group) == 0 ||
-        strcmp(name,"*")==0 ||
-        strfind(name,self->farrays[i].attributes)>=0) {
+    if (amark[i]) {
       pyname = Py_BuildValue("s",self->farrays[i].name);
       PyList_Append(result,pyname);
       Py_DECREF(pyname);
       }
     }
 
+  PyMem_Free(smark);
   return result;
 }
 
@@ -2217,12 +4047,19 @@ static struct PyMethodDef ForthonPackage_methods[] = {
   {"allocated"   ,(PyCFunction)ForthonPackage_allocated,1,allocated_doc},
   {"deprefix"    ,(PyCFunction)ForthonPackage_deprefix,1,deprefix_doc},
   {"forceassign" ,(PyCFunction)ForthonPackage_forceassign,1,forceassign_doc},
+  {"forceassignmany",(PyCFunction)ForthonPackage_forceassignmany,1,forceassignmany_doc},
   {"gallot"      ,(PyCFunction)ForthonPackage_gallot,1,gallot_doc},
   {"gchange"     ,(PyCFunction)ForthonPackage_gchange,1,gchange_doc},
   {"getdict"     ,(PyCFunction)ForthonPackage_getdict,1,getdict_doc},
+  {"getdictview" ,(PyCFunction)ForthonPackage_getdictview,1,getdictview_doc},
+  {"getallocator",(PyCFunction)ForthonPackage_getallocator,1,getallocator_doc},
   {"getfobject"  ,(PyCFunction)ForthonPackage_getfobject,1,getfobject_doc},
   {"getfunctions",(PyCFunction)ForthonPackage_getfunctions,1,getfunctions_doc},
+  {"getmemstats" ,(PyCFunction)ForthonPackage_getmemstats,1,getmemstats_doc},
+  {"instrumentroutines",(PyCFunction)ForthonPackage_instrumentroutines,1,instrumentroutines_doc},
+  {"getroutinestats",(PyCFunction)ForthonPackage_getroutinestats,1,getroutinestats_doc},
   {"getgroup"    ,(PyCFunction)ForthonPackage_getgroup,1,getgroup_doc},
+  {"getscalarrecord",(PyCFunction)ForthonPackage_getscalarrecord,1,getscalarrecord_doc},
   {"getpyobject" ,(PyCFunction)ForthonPackage_getpyobject,1,getpyobject_doc},
   {"gettypename" ,(PyCFunction)ForthonPackage_gettypename,1,gettypename_doc},
   {"getvarattr"  ,(PyCFunction)ForthonPackage_getvarattr,1,getvarattr_doc},
@@ -2238,8 +4075,13 @@ static struct PyMethodDef ForthonPackage_methods[] = {
   {"reprefix"    ,(PyCFunction)ForthonPackage_reprefix,1,reprefix_doc},
   {"setdict"     ,(PyCFunction)ForthonPackage_setdict,1,setdict_doc},
   {"__setstate__",(PyCFunction)ForthonPackage_setdict,1,setdict_doc},
+  {"setallocator",(PyCFunction)ForthonPackage_setallocator,1,setallocator_doc},
+  {"setscratchdir",(PyCFunction)ForthonPackage_setscratchdir,1,setscratchdir_doc},
   {"totmembytes" ,(PyCFunction)ForthonPackage_totmembytes,1,totmembytes_doc},
   {"varlist"     ,(PyCFunction)ForthonPackage_varlist,1,varlist_doc},
+  {"getvars"     ,(PyCFunction)ForthonPackage_getvars,1,getvars_doc},
+  {"getvarslots" ,(PyCFunction)ForthonPackage_getvarslots,1,getvarslots_doc},
+  {"setvars"     ,(PyCFunction)ForthonPackage_setvars,1,setvars_doc},
   {"getstrides"  ,(PyCFunction)ForthonPackage_getstrides,1,getstrides_doc},
   {"printtypenum"  ,(PyCFunction)ForthonPackage_printtypenum,1,printtypenum_doc},
   {"feenableexcept"  ,(PyCFunction)ForthonPackage_feenableexcept,1,feenableexcept_doc},
@@ -2254,6 +4096,7 @@ static void Forthon_dealloc(ForthonObject *self)
 {
   if (self->garbagecollected) PyObject_GC_UnTrack((PyObject *) self);
   Forthon_clear(self);
+  Forthon_free(self);
   PyObject_GC_Del((PyObject*)self);
   /* Py_TYPE(self)->tp_free((PyObject*)self); */
 }
@@ -2274,40 +4117,13 @@ static PyObject *Forthon_getattro(ForthonObject *self,PyObject *oname)
   char *name;
 #endif
 
-  /* Get index for variable from scalar dictionary */
+  /* Get index for variable from the variable dictionary */
   /* If it is not found, the pyi is returned as NULL */
-  pyi = PyDict_GetItem(self->scalardict,oname);
+  pyi = PyDict_GetItem(self->vardict,oname);
   if (pyi != NULL) {
-    PyArg_Parse(pyi,"l",&i);
-    if (self->fscalars[i].getaction != NULL) {
-      if (self->fobj == NULL) self->fscalars[i].getaction();
-      else                    self->fscalars[i].getaction((self->fobj));
-      }
-    if (self->fscalars[i].type == NPY_DOUBLE) {
-      return Forthon_getscalardouble(self,(void *)i);}
-    else if (self->fscalars[i].type == NPY_CDOUBLE) {
-      return Forthon_getscalarcdouble(self,(void *)i);}
-    else if (self->fscalars[i].type == NPY_FLOAT) {
-      return Forthon_getscalarfloat(self,(void *)i);}
-    else if (self->fscalars[i].type == NPY_CFLOAT) {
-      return Forthon_getscalarcfloat(self,(void *)i);}
-    else if (self->fscalars[i].type == NPY_OBJECT) {
-      return Forthon_getscalarderivedtype(self,(void *)i);}
-    else {
-      return Forthon_getscalarinteger(self,(void *)i);}
+    return Forthon_getvariable(self,Forthon_slotfromobject(pyi));
     }
 
-  /* Get index for variable from array dictionary */
-  /* If it is not found, the pyi is returned as NULL */
-  pyi = PyDict_GetItem(self->arraydict,oname);
-  if (pyi != NULL) {
-    PyArg_Parse(pyi,"l",&i);
-    if (self->farrays[i].getaction != NULL) {
-      if (self->fobj == NULL) self->farrays[i].getaction();
-      else                    self->farrays[i].getaction((self->fobj));
-      }
-    return Forthon_getarray(self,(void *)i);}
-
   /* Now convert oname into the actual string, checking for errors. */
 #if PY_MAJOR_VERSION < 3
   name = PyString_AsString(oname);
@@ -2331,14 +4147,28 @@ static PyObject *Forthon_getattro(ForthonObject *self,PyObject *oname)
 
   /* The code here used to be handled by calling Py_FindMethod, but */
   /* that is not defined in python3 */
-  /* Look through the Forthon generic methods */
-  ml = getForthonPackage_methods();
-  for (; ml->ml_name != NULL; ml++) {
-    if (CMPSTR(ml->ml_name) == 0) {
-      return (PyObject *)PyCFunction_New(ml,(PyObject *)self);
+  /* For packages, return the saved bound method */
+  if (self->methoddict != NULL) {
+    pyi = PyDict_GetItem(self->methoddict,oname);
+    if (pyi != NULL) {
+      Py_INCREF(pyi);
+      return pyi;
+      }
+    return PyObject_GenericGetAttr((PyObject *)self,oname);
     }
-  }
-  /* Look through the object specific methods */
+  /* For derived type instances, the bound method is created on each    */
+  /* lookup, since saving it in the instance would make a reference      */
+  /* cycle, delaying the freeing of the instance until the next garbage  */
+  /* collection. The method definition is found through the dictionary   */
+  /* of the generic methods, which is shared by all types.               */
+  pyi = PyDict_GetItem(ForthonPackage_methodindex,oname);
+  if (pyi != NULL) {
+    i = Forthon_slotfromobject(pyi);
+    ml = getForthonPackage_methods();
+    return (PyObject *)PyCFunction_New(&ml[i],(PyObject *)self);
+    }
+  /* Look through the object specific methods. Derived types do not */
+  /* have any, so this loop is normally empty. */
   ml = self->fmethods;
   for (; ml->ml_name != NULL; ml++) {
     if (CMPSTR(ml->ml_name) == 0) {
@@ -2354,39 +4184,15 @@ static PyObject *Forthon_getattro(ForthonObject *self,PyObject *oname)
 /* # Set attribute handler                                                   */
 static int Forthon_setattro(ForthonObject *self,PyObject *oname,PyObject *v)
 {
-  long i;
   PyObject *pyi;
 
-  /* Get index for variable from scalar dictionary */
+  /* Get index for variable from the variable dictionary */
   /* If it is not found, the pyi is returned as NULL */
-  pyi = PyDict_GetItem(self->scalardict,oname);
+  pyi = PyDict_GetItem(self->vardict,oname);
   if (pyi != NULL) {
-    PyArg_Parse(pyi,"l",&i);
-    if (self->fscalars[i].parameter) {
-      PyErr_SetString(PyExc_TypeError, "Cannot set a parameter");
-      return -1;
-      }
-    if (self->fscalars[i].type == NPY_DOUBLE) {
-      return Forthon_setscalardouble(self,v,(void *)i);}
-    else if (self->fscalars[i].type == NPY_CDOUBLE) {
-      return Forthon_setscalarcdouble(self,v,(void *)i);}
-    else if (self->fscalars[i].type == NPY_FLOAT) {
-      return Forthon_setscalarfloat(self,v,(void *)i);}
-    else if (self->fscalars[i].type == NPY_CFLOAT) {
-      return Forthon_setscalarcfloat(self,v,(void *)i);}
-    else if (self->fscalars[i].type == NPY_OBJECT) {
-      return Forthon_setscalarderivedtype(self,v,(void *)i);}
-    else {
-      return Forthon_setscalarinteger(self,v,(void *)i);}
+    return Forthon_setvariable(self,Forthon_slotfromobject(pyi),v);
     }
 
-  /* Get index for variable from array dictionary */
-  /* If it is not found, the pyi is returned as NULL */
-  pyi = PyDict_GetItem(self->arraydict,oname);
-  if (pyi != NULL) {
-    PyArg_Parse(pyi,"l",&i);
-    return Forthon_setarray(self,v,(void *)i);}
-
   PyErr_SetString(ErrorObject,"no such attribute");
   return -1;
 }
@@ -0,0 +1,340 @@
+"""Data writers and readers for pydump and pyrestore
+These conform to the API of PW.PW and PR.PR from the PyPDB package, so can be
+used as the datawriter and datareader in pydump and pyrestore, and write the
+same name@pkg layout. Arrays are written compressed, and can be read in part,
+without reading the whole array.
+NPZWriter, NPZReader: numpy npz files, needing only numpy
+H5Writer, H5Reader: HDF5 files, needing h5py
+writer(fname): returns a writer, choosing the format from the file name
+reader(fname): returns a reader, choosing the format from the file contents
+isforthonfile(fname): returns true if the file can be read by reader
+"""
+import os
+import io
+import struct
+import zipfile
+import cPickle
+import numpy
+try:
+    import h5py
+except ImportError:
+    h5py = None
+
+def ForthonIOdoc():
+    import ForthonIO
+    print ForthonIO.__doc__
+
+# --- Arrays smaller than this number of bytes are not compressed, since
+# --- the compression would not save much.
+mincompressbytes = 1024
+
+# --- The data of uncompressed arrays is aligned to this number of bytes in
+# --- npz files so that the arrays can be memory mapped and passed directly
+# --- to fortran.
+npzalignment = 64
+
+# --- Values are tagged with how they were converted to arrays so that the
+# --- reader can convert them back.
+_arraykind = 'array'
+_scalarkind = 'scalar'
+_picklekind = 'pickle'
+
+def _toarray(v):
+    """Converts the value into an array, returning the array and its kind."""
+    if isinstance(v,numpy.ndarray):
+        return v,_arraykind
+    if isinstance(v,(int,long,float,complex,str,numpy.generic)):
+        return numpy.array(v),_scalarkind
+    return numpy.frombuffer(cPickle.dumps(v,-1),numpy.uint8),_picklekind
+
+def _fromarray(a,kind):
+    """Converts the array back into the value that was written."""
+    if kind == _scalarkind:
+        return a[()].item()
+    if kind == _picklekind:
+        return cPickle.loads(numpy.asarray(a).tobytes())
+    return a
+
+#############################################################################
+class _ForthonWriter:
+    """
+    Methods common to the writers.
+     - setcompression(name,level): sets the compression for the variable.
+                                   A level of 0 means no compression.
+    """
+    def __init__(self,compression):
+        self.compression = compression
+        self.compressionlevels = {}
+    def setcompression(self,name,level):
+        self.compressionlevels[name] = level
+    def getcompression(self,name,a,compression=None):
+        if compression is None:
+            compression = self.compressionlevels.get(name,self.compression)
+        if a.nbytes < mincompressbytes: compression = 0
+        return compression
+    def defent(self,name,v,shape):
+        """Makes space in the file for the variable, with zeros."""
+        self.write(name,numpy.zeros(shape,dtype=numpy.asarray(v).dtype))
+    def __enter__(self):
+        return self
+    def __exit__(self,type,value,traceback):
+        self.close()
+
+class _ForthonReader:
+    """
+    Methods common to the readers.
+     - inquire_names(): returns the list of names in the file
+     - read(name,index=None): returns the variable. If index is given, only
+                              that part of the array is read, for example
+                              ff.read('x@pkg',numpy.s_[10:20,:])
+     - inquire_shape(name): returns the shape of the array, without reading it
+     - inquire_isarray(name): returns true if the variable is read as an array
+     - map(name): returns a copy on write memory map of the array in the file,
+                  or None if the array cannot be mapped, for example if it is
+                  compressed. Changes to the mapped array are not written to
+                  the file.
+    """
+    def __getattr__(self,name):
+        if name[:2] == '__' and name[-2:] == '__': raise AttributeError(name)
+        try:
+            return self.read(name)
+        except KeyError:
+            raise AttributeError(name)
+    def __enter__(self):
+        return self
+    def __exit__(self,type,value,traceback):
+        self.close()
+
+#############################################################################
+class NPZWriter(_ForthonWriter):
+    """
+    Writes a numpy npz file. Each variable is written as its own member of
+    the zip file, so that the compression can be set for each variable, and
+    the file can be read with numpy.load.
+     - fname: name of the file
+     - compression=1: when true, arrays are deflated. Uncompressed arrays can
+                      be read in part without reading the whole array.
+    """
+    file_type = 'npz'
+    def __init__(self,fname,compression=1):
+        _ForthonWriter.__init__(self,compression)
+        self.fname = fname
+        self.kinds = {}
+        self.zfile = zipfile.ZipFile(fname,'w',allowZip64=True)
+    def write(self,name,v,compression=None):
+        """Writes the variable, with the optional compression overriding the
+        default."""
+        a,kind = _toarray(v)
+        info = zipfile.ZipInfo(name+'.npy')
+        info.external_attr = 0644 << 16
+        data = _npybytes(a)
+        if self.getcompression(name,a,compression):
+            info.compress_type = zipfile.ZIP_DEFLATED
+        else:
+            info.compress_type = zipfile.ZIP_STORED
+            info.extra = self.alignmentpadding(info,data)
+        self.zfile.writestr(info,data)
+        self.kinds[name] = kind
+    def alignmentpadding(self,info,data):
+        """Returns an extra field for the zip local header that aligns the
+        start of the npy data."""
+        offset = self.zfile.fp.tell() + 30 + len(info.filename) + 4
+        if len(data) > zipfile.ZIP64_LIMIT: offset += 20
+        # --- The npy header is itself padded to a multiple of 64 bytes.
+        npad = -offset%npzalignment
+        return struct.pack('<HH%dx'%npad,0xf041,npad)
+    def close(self):
+        if self.zfile is None: return
+        self.write('__forthon__',self.kinds,compression=0)
+        self.zfile.close()
+        self.zfile = None
+
+def _npybytes(a):
+    s = io.BytesIO()
+    numpy.lib.format.write_array(s,a,allow_pickle=False)
+    return s.getvalue()
+
+class NPZReader(_ForthonReader):
+    """
+    Reads a numpy npz file written by NPZWriter.
+    Parts of arrays that were written uncompressed are read by memory mapping
+    the file.
+    """
+    file_type = 'npz'
+    def __init__(self,fname):
+        self.fname = fname
+        self.zfile = zipfile.ZipFile(fname,'r')
+        self.kinds = {}
+        if '__forthon__.npy' in self.zfile.namelist():
+            self.kinds = self.read('__forthon__')
+    def inquire_names(self):
+        # --- If a name was written more than once, the last one is read.
+        return [n[:-4] for n in self.zfile.NameToInfo if n != '__forthon__.npy']
+    def _kind(self,name):
+        if name == '__forthon__': return _picklekind
+        return self.kinds.get(name,_arraykind)
+    def read(self,name,index=None):
+        kind = self._kind(name)
+        if index is not None and kind == _arraykind:
+            a = self._memmap(name)
+            if a is not None: return numpy.array(a[index])
+        with self.zfile.open(name+'.npy') as f:
+            a = numpy.lib.format.read_array(f,allow_pickle=False)
+        a = _fromarray(a,kind)
+        if index is not None: a = a[index]
+        return a
+    def inquire_shape(self,name):
+        with self.zfile.open(name+'.npy') as f:
+            shape,fortran_order,dtype = _readnpyheader(f)
+        return shape
+    def inquire_isarray(self,name):
+        return self._kind(name) == _arraykind
+    def map(self,name):
+        if self._kind(name) != _arraykind: return None
+        return self._memmap(name,'c')
+    def _memmap(self,name,mode='r'):
+        """Returns a memory map of the array, or None if it was compressed."""
+        info = self.zfile.getinfo(name+'.npy')
+        if info.compress_type != zipfile.ZIP_STORED: return None
+        with open(self.fname,'rb') as f:
+            # --- Skip over the zip local file header to get to the data.
+            f.seek(info.header_offset)
+            header = f.read(30)
+            namelen = int(numpy.frombuffer(header[26:28],'<u2')[0])
+            extralen = int(numpy.frombuffer(header[28:30],'<u2')[0])
+            f.seek(info.header_offset + 30 + namelen + extralen)
+            shape,fortran_order,dtype = _readnpyheader(f)
+            offset = f.tell()
+        if len(shape) == 0 or dtype.hasobject: return None
+        if fortran_order: order = 'F'
+        else:             order = 'C'
+        return numpy.memmap(self.fname,dtype=dtype,mode=mode,offset=offset,
+                            shape=shape,order=order)
+    def close(self):
+        self.zfile.close()
+
+def _readnpyheader(f):
+    version = numpy.lib.format.read_magic(f)
+    if version == (1,0):
+        return numpy.lib.format.read_array_header_1_0(f)
+    else:
+        return numpy.lib.format.read_array_header_2_0(f)
+
+#############################################################################
+class H5Writer(_ForthonWriter):
+    """
+    Writes an HDF5 file using h5py. Arrays are written chunked and compressed
+    with gzip. Fortran ordered arrays are written transposed so that the data
+    in the file is in the same order as in memory.
+     - fname: name of the file
+     - compression=4: the gzip level, from 0 (no compression) to 9
+    """
+    file_type = 'hdf5'
+    def __init__(self,fname,compression=4):
+        assert h5py is not None,"h5py is needed to write HDF5 files"
+        _ForthonWriter.__init__(self,compression)
+        self.h5file = h5py.File(fname,'w')
+    def write(self,name,v,compression=None):
+        """Writes the variable, with the optional compression overriding the
+        default."""
+        a,kind = _toarray(v)
+        compression = self.getcompression(name,a,compression)
+        fortran_order = a.ndim > 1 and a.flags.f_contiguous
+        if fortran_order: a = a.T
+        if kind == _arraykind and compression and a.ndim > 0:
+            ds = self.h5file.create_dataset(name,data=a,chunks=True,shuffle=True,
+                                            compression='gzip',
+                                            compression_opts=compression)
+        else:
+            ds = self.h5file.create_dataset(name,data=a)
+        ds.attrs['kind'] = kind
+        ds.attrs['fortran_order'] = fortran_order
+    def close(self):
+        if self.h5file is None: return
+        self.h5file.close()
+        self.h5file = None
+
+class H5Reader(_ForthonReader):
+    """
+    Reads an HDF5 file written by H5Writer. Only the chunks that are needed
+    are read for parts of arrays.
+    """
+    file_type = 'hdf5'
+    def __init__(self,fname):
+        assert h5py is not None,"h5py is needed to read HDF5 files"
+        self.h5file = h5py.File(fname,'r')
+    def inquire_names(self):
+        return list(self.h5file.keys())
+    def read(self,name,index=None):
+        ds = self.h5file[name]
+        kind = ds.attrs.get('kind',_arraykind)
+        fortran_order = ds.attrs.get('fortran_order',False)
+        if index is not None and kind == _arraykind:
+            if not fortran_order: return ds[index]
+            tindex = _transposeindex(index,ds.ndim)
+            if tindex is not None: return ds[tindex].T
+        a = _fromarray(ds[()],kind)
+        if kind == _arraykind and fortran_order: a = a.T
+        if index is not None: a = a[index]
+        return a
+    def inquire_shape(self,name):
+        ds = self.h5file[name]
+        if ds.attrs.get('fortran_order',False): return ds.shape[::-1]
+        return ds.shape
+    def inquire_isarray(self,name):
+        return self.h5file[name].attrs.get('kind',_arraykind) == _arraykind
+    def map(self,name):
+        ds = self.h5file[name]
+        if ds.attrs.get('kind',_arraykind) != _arraykind: return None
+        if ds.chunks is not None or ds.ndim == 0: return None
+        offset = ds.id.get_offset()
+        if offset is None: return None
+        a = numpy.memmap(self.h5file.filename,dtype=ds.dtype,mode='c',
+                         offset=offset,shape=ds.shape)
+        if ds.attrs.get('fortran_order',False): a = a.T
+        return a
+    def close(self):
+        self.h5file.close()
+
+def _transposeindex(index,ndim):
+    """Returns the index into the transposed array, or None if the index
+    cannot be transposed."""
+    if not isinstance(index,tuple): index = (index,)
+    if len(index) > ndim: return None
+    for i in index:
+        if not isinstance(i,(int,long,slice)): return None
+    index = index + (ndim - len(index))*(slice(None),)
+    return index[::-1]
+
+#############################################################################
+def writer(fname,compression=None):
+    """
+    Returns a writer for the file. HDF5 is used if the file name ends in .h5
+    or .hdf5, otherwise npz is used.
+     - compression: the compression level, defaulting to that of the writer
+    """
+    if os.path.splitext(fname)[1] in ['.h5','.hdf5']: writerclass = H5Writer
+    else:                                              writerclass = NPZWriter
+    if compression is None: return writerclass(fname)
+    else:                   return writerclass(fname,compression)
+
+# --- The first bytes of zip (and so npz) and HDF5 files
+_npzmagic = b'PK\x03\x04'
+_hdf5magic = b'\x89HDF\r\n\x1a\n'
+
+def _filemagic(fname):
+    with open(fname,'rb') as f:
+        return f.read(8)
+
+def isforthonfile(fname):
+    """Returns true if the file is an npz or HDF5 file."""
+    try:
+        magic = _filemagic(fname)
+    except IOError:
+        return False
+    return magic[:4] == _npzmagic or magic == _hdf5magic
+
+def reader(fname):
+    """Returns a reader for the file, checking whether it is npz or HDF5."""
+    if _filemagic(fname) == _hdf5magic: return H5Reader(fname)
+    else:                               return NPZReader(fname)
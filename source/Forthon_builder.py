@@ -40,6 +40,7 @@ fcompexec      = options.fcompexec
 f90            = options.f90
 writemodules   = options.writemodules
 timeroutines   = options.timeroutines
+releasegil     = options.releasegil
 othermacros    = options.othermacros
 debug          = options.debug
 underscoring   = options.underscoring
@@ -100,6 +101,7 @@ if twounderscores: forthonargs.append('--2underscores')
 else:              forthonargs.append('--no2underscores')
 if not writemodules: forthonargs.append('--nowritemodules')
 if timeroutines: forthonargs.append('--timeroutines')
+if releasegil: forthonargs.append('--releasegil')
 
 # --- Get the numpy headers path
 import numpy
@@ -69,6 +69,9 @@ parser.add_option('--pkgsuffix',default='',help='Suffix added to the name of the
 
 parser.add_option('--realsize',choices=['4','8'],default='8',metavar='[4,8]',help='The size of reals to use for variables that are declared to of type real in the variable description file. It defaults to 8.')
 
+parser.add_option('--releasegil',action='store_true',default=False)
+parser.add_option('--noreleasegil',action='store_false',default=False,dest='releasegil',help='Specifies whether the python global interpreter lock is released during the calls to all of the python callable fortran routines, allowing other python threads to run. Individual routines can also be given the releasegil attribute in the interface file. The default is --noreleasegil.')
+
 parser.add_option('--static',action='store_true',default=False,help='Build the static version of the code by default, rather than the dynamically linker version. Not yet supported.')
 
 parser.add_option('--timeroutines',action='store_true',default=False)
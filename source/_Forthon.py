@@ -17,10 +17,13 @@ import os
 import copy
 import warnings
 import cPickle
+import threading
+import hashlib
 try:
     from PyPDB import PW,PR
 except ImportError:
     pass
+import ForthonIO
 try:
     import inspect
 except ImportError:
@@ -165,12 +168,14 @@ def gsetdims(group='*'):
         if r and (group != '*'): return
     if group != '*': raise NameError("No such group")
 
-def forceassign(name,v):
+def forceassign(name,v,adopt=0):
     """
     Forces the assignment to an array, resizing the array is necessary.
+    If adopt is true, the array is used without being copied, raising an
+    exception if that is not possible.
     """
     for pkg in _pkg_dict.itervalues():
-        pkg.forceassign(name,v)
+        pkg.forceassign(name,v,adopt)
 
 def listvar(name):
     """
@@ -208,6 +213,77 @@ def totmembytes():
         tot = tot + pkg.totmembytes()
     return tot
 
+def setscratchdir(dirname=None):
+    """
+    Sets the directory where the files backing dynamic arrays with the mmap
+    attribute are created, for all packages. If dirname is None, the
+    environment variable FORTHON_SCRATCHDIR is used if set, otherwise the
+    current directory.
+    """
+    for pkg in _pkg_dict.itervalues():
+        pkg.setscratchdir(dirname)
+
+def setallocator(alignment=0,hugepages=0,firsttouch=0):
+    """
+    Selects how the space for dynamic arrays is allocated, for all packages.
+     - alignment=0: the data is aligned to this many bytes, which must be a
+                    power of two
+     - hugepages=0: when true, the space is advised to be backed by
+                    transparent huge pages
+     - firsttouch=0: when true, zero initialized arrays are not touched when
+                     allocated, so that with NUMA first touch placement, the
+                     pages are placed by the threads that first use them
+    With no arguments, numpy's allocator is used. Only arrays allocated
+    afterward are affected.
+    """
+    for pkg in _pkg_dict.itervalues():
+        pkg.setallocator(alignment,hugepages,firsttouch)
+
+def getmemstats(group=None):
+    """
+    Returns a dictionary with the memory statistics of each package, or of
+    the specified group in each package that has it. Each value is a tuple
+    (live bytes, peak bytes, number of allocations, time of the last change
+    in size). The statistics are kept as arrays are allocated so this is
+    cheap enough to call often.
+    """
+    result = {}
+    for name,pkg in _pkg_dict.iteritems():
+        if not IsForthonType(pkg): continue
+        if group is None:
+            result[name] = pkg.getmemstats()
+        else:
+            # --- Skip packages that do not have the group
+            try: result[name] = pkg.getmemstats(group)
+            except Exception: pass
+    return result
+
+def instrumentroutines(flag=1,reset=0):
+    """
+    Turns on or off the recording of call statistics of the wrapped fortran
+    routines in all packages. If reset is true, the statistics are zeroed.
+    See getroutinestats.
+    """
+    for pkg in _pkg_dict.itervalues():
+        if IsForthonType(pkg): pkg.instrumentroutines(flag,reset)
+
+def getroutinestats():
+    """
+    Returns the call statistics of the wrapped fortran routines of all
+    packages, as a numpy record array with the fields package, name, ncalls,
+    total, min and max (the wall clock time in seconds), and bytes (the total
+    size of the array arguments). The statistics are only recorded after
+    instrumentroutines is called.
+    """
+    stats = []
+    for name,pkg in _pkg_dict.iteritems():
+        if not IsForthonType(pkg): continue
+        for r in pkg.getroutinestats():
+            stats.append((name,)+tuple(r))
+    return array(stats,dtype=[('package','S32'),('name','S32'),('ncalls','i8'),
+                              ('total','f8'),('min','f8'),('max','f8'),
+                              ('bytes','i8')])
+
 def IsForthonType(v):
     t = repr(type(v))
     if re.search("Forthon",t): return 1
@@ -224,10 +300,14 @@ class PackageBase(object):
     def gchange(self,group='*',iverbose=0): return 0
     def gfree(self,group='*'): return 0
     def gsetdims(self,group='*'): return 0
-    def forceassign(self,name,v): pass
+    def forceassign(self,name,v,adopt=0): pass
+    def forceassignmany(self,arrays,adopt=0): pass
     def listvar(self,name): return name
     def deprefix(self): pass
     def reprefix(self): pass
+    def setscratchdir(self,dirname): pass
+    def setallocator(self,alignment=0,hugepages=0,firsttouch=0): pass
+    def instrumentroutines(self,flag=1,reset=0): return 0
     def totmembytes(self): return getobjectsize(self)
 
 # --- Some platforms have a different value of .true. in fortran.
@@ -645,7 +725,25 @@ def printgroup(pkg,group='',maxelements=10,sumarrays=0):
 ##############################################################################
 ##############################################################################
 def pydumpforthonobject(ff,attr,objname,obj,varsuffix,writtenvars,fobjlist,
-                        serial,verbose,lonlymakespace=0):
+                        serial,verbose,lonlymakespace=0,checkpoint=None):
+    # --- writtenvars and fobjlist are dictionaries, with the values giving
+    # --- the order in which the items were added. They used to be lists, so
+    # --- lists are still accepted. Dictionaries are used in their place and
+    # --- the new items are then appended to the lists.
+    if isinstance(writtenvars,list) or isinstance(fobjlist,list):
+        wdict = writtenvars
+        fdict = fobjlist
+        if isinstance(writtenvars,list):
+            wdict = dict([(v,i) for i,v in enumerate(writtenvars)])
+        if isinstance(fobjlist,list):
+            fdict = dict([(f,i) for i,f in enumerate(fobjlist)])
+        pydumpforthonobject(ff,attr,objname,obj,varsuffix,wdict,fdict,
+                            serial,verbose,lonlymakespace,checkpoint)
+        if isinstance(writtenvars,list):
+            writtenvars[:] = sorted(wdict,key=wdict.get)
+        if isinstance(fobjlist,list):
+            fobjlist[:] = sorted(fdict,key=fdict.get)
+        return
     # --- General work of this object
     if verbose: print "object "+objname+" being written"
     # --- Write out the value of fobj so that in restore, any links to this
@@ -658,13 +756,20 @@ def pydumpforthonobject(ff,attr,objname,obj,varsuffix,writtenvars,fobjlist,
         # --- If this object has already be written out, then return.
         if fobj in fobjlist: return
         # --- Add this object to the list of object already written out.
-        fobjlist.append(fobj)
+        # --- A dictionary is used so that the check above is fast even when
+        # --- there are many objects. The value records the order in which
+        # --- the objects were written.
+        fobjlist[fobj] = len(fobjlist)
     # --- Get variables in this package which have attribute attr.
     vlist = []
     for a in attr:
         if isinstance(a,str): vlist = vlist + obj.varlist(a)
-    # --- Loop over list of variables
+    # --- Loop over list of variables, skipping variables that have more
+    # --- than one of the attributes so that they are only written once.
+    vseen = {}
     for vname in vlist:
+        if vname in vseen: continue
+        vseen[vname] = 1
         # --- Check if object is available (i.e. check if dynamic array is
         # --- allocated).
         v = obj.getpyobject(vname)
@@ -683,14 +788,21 @@ def pydumpforthonobject(ff,attr,objname,obj,varsuffix,writtenvars,fobjlist,
             if vname in writtenvars:
                 if verbose: print "variable "+objname+"."+vname+" skipped since other variable would have same name in the file"
                 continue
-            writtenvars.append(vname)
+            writtenvars[vname] = len(writtenvars)
         # --- Check if variable is a Forthon object, if so, recursively call this
         # --- function.
         if IsForthonType(v):
             # --- Note that the attribute passed in is blank, since all components
             # --- are to be written out to the file.
             pydumpforthonobject(ff,[''],vname,v,'@'+vname+varsuffix,writtenvars,
-                                fobjlist,serial,verbose,lonlymakespace)
+                                fobjlist,serial,verbose,lonlymakespace,
+                                checkpoint)
+            continue
+        # --- For incremental dumps, arrays that are unchanged since the base
+        # --- dump are not written.
+        if (checkpoint is not None and not lonlymakespace and
+            isinstance(v,ndarray) and checkpoint.isunchanged(vname+varsuffix,v)):
+            if verbose: print "skipping "+objname+"."+vname+" since it is unchanged"
             continue
         # --- If this point is reached, then variable is written out to file
         if verbose: print "writing "+objname+"."+vname+" as "+vname+varsuffix
@@ -702,6 +814,104 @@ def pydumpforthonobject(ff,attr,objname,obj,varsuffix,writtenvars,fobjlist,
         else:
             ff.write(vname+varsuffix,v)
 
+##############################################################################
+class _DumpCheckpoint:
+    """
+    Keeps track of the hashes of the arrays for incremental dumps.
+    The hashes of the arrays in the base dump are compared to the current
+    ones to find which arrays are unchanged.
+    """
+    def __init__(self,base=None,datareader=None):
+        self.hashes = {}
+        self.unchanged = []
+        self.basehashes = {}
+        if base is not None:
+            ff = openrestorefile(base,datareader)
+            if 'hashes@checkpoint' in ff.inquire_names():
+                self.basehashes = ff.__getattr__('hashes@checkpoint')
+            ff.close()
+    def isunchanged(self,name,v):
+        h = hashlib.sha1((str(v.dtype)+str(v.shape)).encode())
+        # --- ravel with order K does not copy contiguous arrays of either order
+        h.update(v.ravel(order='K'))
+        self.hashes[name] = h.hexdigest()
+        if self.basehashes.get(name) == self.hashes[name]:
+            self.unchanged.append(name)
+            return 1
+        return 0
+    def write(self,ff,base):
+        ff.write('hashes@checkpoint',self.hashes)
+        if base is not None:
+            ff.write('base@checkpoint',base)
+            ff.write('unchanged@checkpoint',self.unchanged)
+
+##############################################################################
+class _DumpStager:
+    """
+    Stands in for the data writer when pydump is run in the background.
+    The data is copied when it is written, so that the simulation can
+    continue and change it, and the copies are written to the real data
+    writer later by a separate thread.
+    """
+    def __init__(self,file_type):
+        self.file_type = file_type
+        self.items = []
+    def write(self,name,v):
+        if isinstance(v,ndarray):
+            v = v.copy(order='A')
+        else:
+            try: v = copy.deepcopy(v)
+            except Exception: pass
+        self.items.append(('write',name,v))
+    def defent(self,name,v,shape):
+        self.items.append(('defent',name,(v,shape)))
+
+class DumpHandle:
+    """
+    Handle on a dump being written in the background, returned by pydump
+    when background is true.
+     - done(): returns true when the writing is finished
+     - wait(timeout=None): waits for the writing to finish and returns the
+                           list of errors. If the file could not be written or
+                           closed, the exception is raised.
+     - errors: list of (name,exception) for variables that could not be written
+     - fobjlist: list of fobjects that were written to the file
+    The writing thread is not a daemon, so python waits for the writing to
+    finish before exiting.
+    """
+    def __init__(self,ff,items,closefile,fobjlist):
+        self.errors = []
+        self.fobjlist = fobjlist
+        self._exception = None
+        self._thread = threading.Thread(target=self._write,
+                                        args=(ff,items,closefile))
+        self._thread.start()
+    def _write(self,ff,items,closefile):
+        try:
+            for kind,name,v in items:
+                try:
+                    if kind == 'write': ff.write(name,v)
+                    else:               ff.defent(name,v[0],v[1])
+                except Exception,e:
+                    # --- As in pydump, try writing as a pickled object if
+                    # --- the old pdb wrapper cannot write the value.
+                    if kind == 'write' and ff.file_type == 'unknown':
+                        try:
+                            ff.write(name+'@pickle',cPickle.dumps(v,-1))
+                            continue
+                        except (cPickle.PicklingError,TypeError):
+                            pass
+                    self.errors.append((name,e))
+            if closefile: ff.close()
+        except Exception,e:
+            self._exception = e
+    def done(self):
+        return not self._thread.is_alive()
+    def wait(self,timeout=None):
+        self._thread.join(timeout)
+        if self._exception is not None: raise self._exception
+        return self.errors
+
 ##############################################################################
 # Python version of the dump routine. This uses the varlist command to
 # list of all of the variables in each package which have the
@@ -718,7 +928,8 @@ def pydumpforthonobject(ff,attr,objname,obj,varsuffix,writtenvars,fobjlist,
 # a pdb file.
 def pydump(fname=None,attr=["dump"],vars=[],serial=0,ff=None,varsuffix=None,
            verbose=false,hdf=0,returnfobjlist=0,lonlymakespace=0,
-           datawriter=None):
+           datawriter=None,background=0,base=None,savehashes=0,
+           datareader=None):
     """
     Dump data into a pdb file
       - fname: dump file name
@@ -742,20 +953,46 @@ def pydump(fname=None,attr=["dump"],vars=[],serial=0,ff=None,varsuffix=None,
                           written to the file
       - datawriter=PW.PW: datawriter is the data writer class to use. This can be any
                           class that conforms to the API of PW.PW from the PyPDB package.
+                          If fname ends in .npz, .h5, or .hdf5, or PyPDB is not
+                          available, ForthonIO.writer is used, which writes a
+                          compressed npz or HDF5 file.
+      - background=0: when true, the data is copied and then written to the file
+                      by a separate thread, so that pydump returns as soon as the
+                      copies are made. A DumpHandle is returned, which can be
+                      used to wait for the writing to finish and to get any
+                      errors. Note that this needs memory for a copy of the data.
+                      The file must be opened by pydump, since the data is
+                      written after pydump returns, so ff cannot be given.
+      - base=None: name of the file of a previous dump. When given, an incremental
+                   dump is made, where only the arrays that have changed since
+                   the base dump are written, and pyrestore reads the unchanged
+                   arrays from the base file. The base file must have been
+                   written with savehashes or be an incremental dump itself,
+                   otherwise all arrays are written.
+      - savehashes=0: when true, the hashes of the arrays are written to the file
+                      so that it can be used as the base of an incremental dump
+      - datareader=None: data reader class used to read the base file, as in
+                         pyrestore
     """
     assert fname is not None or ff is not None,\
            "Either a filename must be specified or a data writer instance"
+    assert not (background and ff is not None),\
+           "A data writer instance cannot be given for a background dump"
     if hdf:
         warnings.warn("the hdf argument is no longer used and is ignored")
     # --- Open the file if the file object was not passed in.
     # --- If the file object was passed in, then don't close it.
     if ff is None:
         if datawriter is None:
-            # --- PyPDB is the default data format.
-            try:
-                datawriter = PW.PW
-            except NameError:
-                pass
+            # --- PyPDB is the default data format, unless the file name
+            # --- specifies a npz or HDF5 file, or PyPDB is not available.
+            if os.path.splitext(fname)[1] in ['.npz','.h5','.hdf5']:
+                datawriter = ForthonIO.writer
+            else:
+                try:
+                    datawriter = PW.PW
+                except NameError:
+                    datawriter = ForthonIO.writer
 
         # --- Try to open the file using the datawriter.
         if datawriter is not None:
@@ -780,6 +1017,18 @@ def pydump(fname=None,attr=["dump"],vars=[],serial=0,ff=None,varsuffix=None,
 
     if verbose: print "Data will be written using %s format"%ff.file_type
 
+    # --- For a background dump, the data is collected by the stager and
+    # --- written to the file after the walk through the packages.
+    if background:
+        realff = ff
+        ff = _DumpStager(realff.file_type)
+
+    # --- For an incremental dump, get the hashes of the arrays in the base.
+    if base is not None or savehashes:
+        checkpoint = _DumpCheckpoint(base,datareader)
+    else:
+        checkpoint = None
+
     # --- Convert attr into a list if needed
     if not isinstance(attr,list): attr = [attr]
 
@@ -792,14 +1041,14 @@ def pydump(fname=None,attr=["dump"],vars=[],serial=0,ff=None,varsuffix=None,
     # --- properly written. The pdb code should really be fixed.
     pkgsuffix = varsuffix
     packagelist = package()
-    writtenvars = []
-    fobjlist = []
+    writtenvars = {}
+    fobjlist = {}
     for pname in packagelist:
         pkg = packageobject(pname)
         if isinstance(pkg,PackageBase): continue
         if varsuffix is None: pkgsuffix = '@' + pname
         pydumpforthonobject(ff,attr,pname,pkg,pkgsuffix,writtenvars,fobjlist,
-                            serial,verbose,lonlymakespace)
+                            serial,verbose,lonlymakespace,checkpoint)
         # --- Make sure that pname does not appear in vars
         try: vars.remove(pname)
         except ValueError: pass
@@ -874,11 +1123,22 @@ def pydump(fname=None,attr=["dump"],vars=[],serial=0,ff=None,varsuffix=None,
             if docontinue: continue
         # --- All attempts failed so write warning message
         if verbose: print "cannot write python variable "+vname
+
+    # --- The base file is found relative to the directory of the dump file.
+    if checkpoint is not None:
+        if base is not None and fname is not None and not os.path.isabs(base):
+            base = os.path.relpath(base,os.path.dirname(os.path.abspath(fname)))
+        checkpoint.write(ff,base)
+
+    if background:
+        return DumpHandle(realff,ff.items,closefile,
+                          sorted(fobjlist,key=fobjlist.get))
+
     if closefile: ff.close()
 
     # --- Return the fobjlist for cases when pydump is called multiple times
     # --- for a single file.
-    if returnfobjlist: return fobjlist
+    if returnfobjlist: return sorted(fobjlist,key=fobjlist.get)
 
 
 #############################################################################
@@ -891,7 +1151,7 @@ def pydump(fname=None,attr=["dump"],vars=[],serial=0,ff=None,varsuffix=None,
 # global dictionary.
 def pyrestore(filename=None,fname=None,verbose=0,skip=[],ff=None,
               varsuffix=None,ls=0,lreturnfobjdict=0,lreturnff=0,
-              datareader=None,main=None):
+              datareader=None,main=None,packages=None,attr=None,lazy=0):
     """
     Restores all of the variables in the specified file.
       - filename: file to read in from (assumes PDB format)
@@ -907,9 +1167,23 @@ def pyrestore(filename=None,fname=None,verbose=0,skip=[],ff=None,
               when 1 prints as tuple
               when 2 prints in a column
       - datareader=PR.PR: data reader object, can be any class that conforms to the
-                          API of the PR.PR class from PyPDB
+                          API of the PR.PR class from PyPDB. npz and HDF5 files
+                          are read with ForthonIO.reader.
       - main=__main__: main object that Forthon objects are restored into
                        Used when the Forthon package is not "import *" into main.
+      - packages=None: list of the names of the packages to restore. When given,
+                       only those packages are restored.
+      - attr=None: group name or attribute, or list of them. When given, only
+                   the package variables in the groups or with the attributes
+                   are restored.
+                   When either packages or attr is given, python variables
+                   are not restored.
+      - lazy=0: when true, dynamic arrays are mapped from the file instead of
+                being read in, so that the data is only read from the file when
+                it is accessed, from fortran or python. Changes to the arrays
+                are not written to the file. This only works for uncompressed
+                arrays in files read with ForthonIO.reader, and any other
+                arrays are read in.
     Note that it will automatically detect whether the file is PDB or HDF.
     """
     # --- fname is the old input argument name
@@ -917,23 +1191,7 @@ def pyrestore(filename=None,fname=None,verbose=0,skip=[],ff=None,
     assert filename is not None or ff is not None,\
            "Either a filename must be specified or a data reader instance"
     if ff is None:
-        if datareader==None:
-            try:
-                # --- PyPDB is the default data format.
-                datareader = PR.PR
-            except NameError:
-                pass
-
-        # --- Check if file exists
-        assert os.access(filename,os.F_OK),"File %s does not exist"%filename
-
-        # --- Try opening file with either the default PR or user supplied reader
-        try:
-            ff = datareader(filename)
-        except:
-            pass
-
-        assert ff is not None,"File %s could not be opened"%filename
+        ff = openrestorefile(filename,datareader)
         closefile = 1
     else:
         closefile = 0
@@ -949,6 +1207,11 @@ def pyrestore(filename=None,fname=None,verbose=0,skip=[],ff=None,
 
     if verbose: print "Data will be read using %s format"%ff.file_type
 
+    # --- If the file is an incremental dump, the variables that were not
+    # --- written are read from the base files.
+    if 'base@checkpoint' in ff.inquire_names():
+        ff = CheckpointReader(ff,filename,datareader)
+
     # --- Get a list of all of the variables in the file, loop over that list
     vlist = ff.inquire_names()
 
@@ -963,6 +1226,17 @@ def pyrestore(filename=None,fname=None,verbose=0,skip=[],ff=None,
     groups = sortrestorevarsbysuffix(vlist,skip)
     fobjdict = {}
 
+    # --- Select the packages to restore.
+    if packages is not None or attr is not None:
+        if attr is not None and not isinstance(attr,list): attr = [attr]
+        if packages is not None and not isinstance(packages,list):
+            packages = [packages]
+        for gname in groups.keys():
+            if gname in ['','pickle','global','function','parallel']:
+                del groups[gname]
+            elif packages is not None and gname not in packages:
+                del groups[gname]
+
     # --- Read in the variables with the standard suffices.
 
     # --- These would be interpreter variables written to the file
@@ -1039,12 +1313,17 @@ def pyrestore(filename=None,fname=None,verbose=0,skip=[],ff=None,
     if 'parallel' in groups:
         del groups['parallel']
 
+    # --- Ignore the checkpoint information of incremental dumps
+    if 'checkpoint' in groups:
+        del groups['checkpoint']
+
     for gname in groups.iterkeys():
         pyrestoreforthonobject(ff,gname,groups[gname],fobjdict,varsuffix,
-                               verbose,doarrays=0,main=main)
+                               verbose,doarrays=0,main=main,attr=attr)
     for gname in groups.iterkeys():
         pyrestoreforthonobject(ff,gname,groups[gname],fobjdict,varsuffix,
-                               verbose,doarrays=1,main=main)
+                               verbose,doarrays=1,main=main,attr=attr,
+                               lazy=lazy)
 
     if closefile: ff.close()
     resultlist = []
@@ -1053,8 +1332,76 @@ def pyrestore(filename=None,fname=None,verbose=0,skip=[],ff=None,
     if len(resultlist) == 1: return resultlist[0]
     elif len(resultlist) > 1: return resultlist
 
+def openrestorefile(filename,datareader=None):
+    """Opens the file for reading, returning the reader instance."""
+    ff = None
+    if datareader==None:
+        # --- PyPDB is the default data format. Files written by
+        # --- ForthonIO are recognized by their contents.
+        if ForthonIO.isforthonfile(filename):
+            datareader = ForthonIO.reader
+        else:
+            try:
+                datareader = PR.PR
+            except NameError:
+                pass
+
+    # --- Check if file exists
+    assert os.access(filename,os.F_OK),"File %s does not exist"%filename
+
+    # --- Try opening file with either the default PR or user supplied reader
+    try:
+        ff = datareader(filename)
+    except:
+        pass
+
+    assert ff is not None,"File %s could not be opened"%filename
+    return ff
+
+class CheckpointReader:
+    """
+    Reader for an incremental dump, made with pydump using the base argument.
+    Variables that were unchanged, and so not written to the file, are read
+    from the base file, which may itself be an incremental dump.
+     - ff: reader instance of the incremental dump
+     - filename: name of the incremental dump, used to find the base file
+     - datareader: reader class used to open the base file
+    """
+    def __init__(self,ff,filename=None,datareader=None):
+        self.ff = ff
+        self.file_type = getattr(ff,'file_type','unknown')
+        base = ff.__getattr__('base@checkpoint')
+        if filename is not None and not os.path.isabs(base):
+            base = os.path.join(os.path.dirname(filename),base)
+        self.base = openrestorefile(base,datareader)
+        if 'base@checkpoint' in self.base.inquire_names():
+            self.base = CheckpointReader(self.base,base,datareader)
+        self.unchanged = {}
+        for name in ff.__getattr__('unchanged@checkpoint'):
+            self.unchanged[name] = 1
+    def inquire_names(self):
+        names = self.ff.inquire_names() + self.unchanged.keys()
+        return [n for n in names if not n.endswith('@checkpoint')]
+    def _reader(self,name):
+        if name in self.unchanged: return self.base
+        else:                      return self.ff
+    def __getattr__(self,name):
+        if name[:2] == '__' and name[-2:] == '__': raise AttributeError(name)
+        return self._reader(name).__getattr__(name)
+    def read(self,name,*args):
+        return self._reader(name).read(name,*args)
+    def inquire_isarray(self,name):
+        return self._reader(name).inquire_isarray(name)
+    def map(self,name):
+        return self._reader(name).map(name)
+    def close(self):
+        self.ff.close()
+        self.base.close()
+
 def sortrestorevarsbysuffix(vlist,skip):
     # --- Sort the variables, collecting them in groups based on their suffix.
+    # --- The skip list is put in a dictionary so that the checks are fast.
+    skip = dict.fromkeys(skip)
     groups = {}
     for v in vlist:
         if '@' in v:
@@ -1079,7 +1426,7 @@ def sortrestorevarsbysuffix(vlist,skip):
 
 #-----------------------------------------------------------------------------
 def pyrestoreforthonobject(ff,gname,vlist,fobjdict,varsuffix,verbose,doarrays,
-                           gpdbname=None,main=None):
+                           gpdbname=None,main=None,attr=None,lazy=0):
     """
       - ff: reference to file being written to
       - gname: name (in python format) of object to read in
@@ -1090,6 +1437,9 @@ def pyrestoreforthonobject(ff,gname,vlist,fobjdict,varsuffix,verbose,doarrays,
       - doarrays: when true, reads in arrays, otherwise only scalars
       - gpdbname: actual name of object in the data file. If None, extracted
                   from gname.
+      - attr: list of groups or attributes of the variables to read in.
+              If None, all variables are read in.
+      - lazy: when true, arrays are mapped from the file when possible
     """
 
     if main is None:
@@ -1145,6 +1495,17 @@ def pyrestoreforthonobject(ff,gname,vlist,fobjdict,varsuffix,verbose,doarrays,
     else:
         leafvars = []
 
+    # --- Select the variables in the groups or with the attributes.
+    if attr is not None:
+        obj = eval(gname,main.__dict__)
+        selected = {}
+        for a in attr:
+            for vname in obj.varlist(a): selected[vname] = 1
+        leafvars = [vname for vname in leafvars
+                    if vname in selected or vname in ['FOBJ','TYPENAME']]
+        for g in groups.keys():
+            if g not in selected: del groups[g]
+
     # --- Fix the case when the variable ff appears in the main dictionary.
     # --- This messes up the exec commands below
     def doassignment(fullname,val):
@@ -1157,6 +1518,9 @@ def pyrestoreforthonobject(ff,gname,vlist,fobjdict,varsuffix,verbose,doarrays,
         setattr(v,n[-1],val)
 
     # --- Read in leafs.
+    # --- The dynamic arrays are collected in dynarrays and assigned all at
+    # --- once with forceassignmany after the loop.
+    dynarrays = []
     for vname in leafvars:
         if vname == 'FOBJ' or vname == 'TYPENAME': continue
         fullname = gname + '.' + vname
@@ -1167,6 +1531,15 @@ def pyrestoreforthonobject(ff,gname,vlist,fobjdict,varsuffix,verbose,doarrays,
         if varsuffix is not None: fullname = vname + str(varsuffix)
 
         try:
+            # --- Skip reading variables that are not needed in this pass,
+            # --- when the reader can tell which variables are arrays.
+            isarray = inquireisarray(ff,vpdbname)
+            if isarray is not None and isarray != bool(doarrays): continue
+            # --- Map the array from the file, if possible, rather than read it.
+            if lazy and doarrays and varsuffix is None:
+                if mapforthonarray(ff,vpdbname,eval(gname,main.__dict__),vname):
+                    if verbose: print "mapping in "+fullname
+                    continue
             val = ff.__getattr__(vpdbname)
             if not isinstance(val,ndarray) and not doarrays:
                 # --- Simple assignment is done for scalars, using the exec command
@@ -1192,6 +1565,8 @@ def pyrestoreforthonobject(ff,gname,vlist,fobjdict,varsuffix,verbose,doarrays,
                         # --- into a single string before doing the setattr. The change
                         # --- affects restart dumps make before July 2008.
                         setattr(pkg,vname,''.join(val))
+                    elif pkg.isdynamic(vname):
+                        dynarrays.append((vname,val))
                     else:
                         setattr(pkg,vname,val)
                 else:
@@ -1210,10 +1585,48 @@ def pyrestoreforthonobject(ff,gname,vlist,fobjdict,varsuffix,verbose,doarrays,
             # --- Print out information about exactly what went wrong.
             if verbose: sys.excepthook(*sys.exc_info())
 
+    # --- The dynamic arrays are pointed to the arrays read in, without
+    # --- copying them. If that fails, they are assigned one at a time to
+    # --- find which ones had the problem.
+    if len(dynarrays) > 0:
+        pkg = eval(gname,main.__dict__)
+        try:
+            pkg.forceassignmany(dynarrays)
+        except:
+            for vname,val in dynarrays:
+                try:
+                    pkg.forceassign(vname,val)
+                except:
+                    print "Warning: There was a problem restoring %s"% (gname+'.'+vname)
+                    if verbose: sys.excepthook(*sys.exc_info())
+
     # --- Read in rest of groups.
     for g,v in groups.iteritems():
         pyrestoreforthonobject(ff,gname+'.'+g,v,fobjdict,varsuffix,verbose,doarrays,
-                               g+'@'+gpdbname,main=main)
+                               g+'@'+gpdbname,main=main,lazy=lazy)
+
+def inquireisarray(ff,name):
+    """Returns whether the variable in the file is an array, or None if the
+    reader cannot tell without reading it."""
+    try:
+        return bool(ff.inquire_isarray(name))
+    except Exception:
+        return None
+
+def mapforthonarray(ff,name,pkg,vname):
+    """Points the dynamic array in the package to a memory map of the array
+    in the file. Returns true if successful."""
+    try:
+        if not pkg.isdynamic(vname): return 0
+        a = ff.map(name)
+    except Exception:
+        return 0
+    if a is None: return 0
+    try:
+        pkg.forceassign(vname,a,1)
+    except Exception:
+        return 0
+    return 1
 
 
 # --- create an alias for pyrestore
@@ -1238,6 +1651,11 @@ listvar(): prints information about a variable
 deprefix(): creates a python variable for each package variable
 reprefix(): copies python variables into packages variables of the same name
 totmembytes(): returns total memory allocated for dynamic arrays
+setscratchdir(): sets the directory for files backing mmap arrays
+setallocator(): selects alignment, huge pages and first touch for arrays
+getmemstats(): returns the memory statistics of each package
+instrumentroutines(): turns on the recording of call statistics of routines
+getroutinestats(): returns the call statistics of the fortran routines
 PackageBase: Base class for classes that can be registered as a package
 arraytostr(): converts an array of chars to a string
 int(): converts data to integer
@@ -1246,8 +1664,8 @@ fones(): returns multi-dimensional array with fortran ordering
 fzeros(): returns multi-dimensional array with fortran ordering
 doc(): prints info about variables and functions
 printgroup(): prints all variables in the group or with an attribute
-pydump(): dumps data into pdb format file
-pyrestore(): reads data from pdb format file
+pydump(): dumps data into pdb, npz, or HDF5 format file
+pyrestore(): reads data from pdb, npz, or HDF5 format file
 restore(): equivalent to pyrestore
 """
 
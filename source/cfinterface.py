@@ -99,6 +99,19 @@ elif machine in ['MAC']:
 else:
     raise ValueError('Machine %s not supported'%machine)
 
+# --- The stack environment used for error handling is made thread local
+# --- since fortran routines may be run concurrently in several threads
+# --- when the GIL is released.
+forthonf2c = forthonf2c + """
+#if defined(_MSC_VER)
+#define FORTHON_THREADLOCAL __declspec(thread)
+#elif defined(__STDC_VERSION__) && __STDC_VERSION__ >= 201112L && !defined(__STDC_NO_THREADS__)
+#define FORTHON_THREADLOCAL _Thread_local
+#else
+#define FORTHON_THREADLOCAL __thread
+#endif
+"""
+
 def writeforthonf2c():
     # --- Create the forthonf2c.h file
     ff = open('forthonf2c.h','w')
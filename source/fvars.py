@@ -27,6 +27,8 @@ class Fvars:
 class Fargs:
     name = ''
     type = ''
+    intent = 'inout'
+    assumedshape = 0
     dimstring = ''
     dims = []
 
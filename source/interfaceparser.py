@@ -464,7 +464,13 @@ def processfile(packname,filename,othermacros=[],timeroutines=0):
                     i = findmatchingparenthesis(ma.start(),a,v.name)
                     fa.dimstring = a[ma.start():i+1]
                     dimlist = fa.dimstring[1:-1].split(',')
-                    fa.dims = processargdimvars(dimlist,v.dimvars)
+                    if dimlist == len(dimlist)*[':']:
+                        # --- Assumed shape arguments, e.g. x(:,:), are passed
+                        # --- with their strides in a C descriptor.
+                        fa.assumedshape = len(dimlist)
+                        fa.dims = []
+                    else:
+                        fa.dims = processargdimvars(dimlist,v.dimvars)
                     a = a[i+1:]
                     ma = re.search("[:]|\Z",a)
                 else:
@@ -474,6 +480,13 @@ def processfile(packname,filename,othermacros=[],timeroutines=0):
                 if ma.group() == ':':
                     fa.type = a[ma.start()+1:]
                 else:
+                    fa.type = ''
+                # --- The type can be followed by the intent, name:type:intent
+                if ':' in fa.type:
+                    fa.type,fa.intent = fa.type.split(':',1)
+                    if fa.intent not in ['in','out','inout']:
+                        raise SyntaxError("%s: The intent of argument %s must be one of in, out, or inout"%(v.name,fa.name))
+                if fa.type == '':
                     # --- Use implicit typing if the type was not specified
                     fa.type = 'real'
                     if 'i' <= fa.name[0] and fa.name[0] <= 'n':
@@ -291,6 +291,7 @@ class ForthonDerivedType:
                 self.cw('obj->farrays[%d].comment = "%s";'%(i,
                                     repr(a.comment)[1:-1].replace('"','\\"')))
                 self.cw('obj->farrays[%d].dimstring = "%s";'%(i,repr(a.dimstring)[1:-1]))
+                self.cw('obj->farrays[%d].generation = 0;'%i)
             self.cw('}')
 
 #     # --- Write out the table of getset routines
@@ -413,8 +414,12 @@ class ForthonDerivedType:
             self.cw('void '+fname('init'+t.name+'py')+
                          '(long *i,char *fobj,ForthonObject **cobj__,'+
                           'long *setinitvalues,long *deallocatable)')
+            # --- These routines are called from fortran, possibly while the
+            # --- GIL is released, so the GIL must be acquired.
             self.cw('{')
             self.cw('  ForthonObject *obj;')
+            self.cw('  PyGILState_STATE gstate;')
+            self.cw('  gstate = PyGILState_Ensure();')
             self.cw('  obj=(ForthonObject *) PyObject_GC_New(ForthonObject,'+
                        '&ForthonType);')
             self.cw('  if (*i > 0) {obj->name = '+pname+'_fscalars[*i].name;}')
@@ -445,6 +450,7 @@ class ForthonDerivedType:
             self.cw('  ForthonPackage_staticarrays(obj);')
             if garbagecollected:
                 self.cw('  PyObject_GC_Track((PyObject *)obj);')
+            self.cw('  PyGILState_Release(gstate);')
             self.cw('}')
 
             #########################################################################
@@ -460,12 +466,18 @@ class ForthonDerivedType:
             self.cw('    long i=-1,s=0,d=0;')
             self.cw('    '+fname('init'+t.name+'py')+'(&i,fobj,cobj__,&s,&d);}')
             self.cw('  else {')
-            self.cw('    Py_INCREF(*cobj__);}')
+            self.cw('    PyGILState_STATE gstate;')
+            self.cw('    gstate = PyGILState_Ensure();')
+            self.cw('    Py_INCREF(*cobj__);')
+            self.cw('    PyGILState_Release(gstate);}')
             self.cw('}')
             # --- decrements the python reference counter
             self.cw('void '+fname('decref'+t.name+'py')+'(ForthonObject **cobj__)')
             self.cw('{')
+            self.cw('  PyGILState_STATE gstate;')
+            self.cw('  gstate = PyGILState_Ensure();')
             self.cw('  Py_XDECREF(*cobj__);')
+            self.cw('  PyGILState_Release(gstate);')
             self.cw('}')
 
             # --- This is called when an object is released by fortran. It is then
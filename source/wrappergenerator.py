@@ -33,13 +33,16 @@ class PyWrap:
       --macros pkg.v Other interface files that are needed for the definition
                      of macros.
       --timeroutines Calls to the routines from python will be timed
+      --releasegil The python GIL is released during calls to all of the
+                   fortran routines (otherwise only those with the
+                   releasegil attribute)
       file1    Main variable description file for the package
       [file2, ...] Subsidiary variable description files
     """
 
     def __init__(self,ifile,pname,psuffix,pkgbase,initialgallot=1,writemodules=1,
                  otherinterfacefiles=[],other_scalar_vars=[],timeroutines=0,
-                 otherfortranfiles=[],fcompname=None):
+                 otherfortranfiles=[],fcompname=None,releasegil=0):
         self.ifile = ifile
         self.pname = pname
         self.psuffix = psuffix
@@ -47,6 +50,7 @@ class PyWrap:
         self.initialgallot = initialgallot
         self.writemodules = writemodules
         self.timeroutines = timeroutines
+        self.releasegil = releasegil
         self.otherinterfacefiles = otherinterfacefiles
         self.other_scalar_vars = other_scalar_vars
         self.otherfortranfiles = otherfortranfiles
@@ -143,6 +147,34 @@ class PyWrap:
                         raise SyntaxError(ss + ' is not declared in the interface file')
         return groups
 
+    def isreleasegil(self,f):
+        # --- Returns true if the GIL should be released during the call to
+        # --- the routine, either for all routines or for those with the
+        # --- releasegil attribute.
+        return self.releasegil or 'releasegil' in f.attr.split()
+
+    def isbindc(self,f):
+        # --- Returns true if the routine has assumed shape arguments. These are
+        # --- passed using C descriptors, which requires that the fortran
+        # --- routine be declared bind(C). Its name then has no trailing
+        # --- underscores and strings cannot be passed.
+        bindc = 0
+        for a in f.args:
+            if a.assumedshape:
+                if a.type not in ['integer','real','double','float','complex']:
+                    raise SyntaxError("%s: Assumed shape argument %s must be numeric"%(f.name,a.name))
+                bindc = 1
+        if bindc:
+            for a in f.args:
+                if a.type == 'string' or a.type == 'character':
+                    raise SyntaxError("%s: Routines with assumed shape arguments cannot have string arguments"%f.name)
+        return bindc
+
+    def fortranname(self,f):
+        # --- Returns the name used to call the fortran routine from C
+        if self.isbindc(f): return f.name.lower()
+        else:               return fname(f.name)
+
     def getmodulename(self):
         if self.pkgbase is not None:
             return self.pkgbase
@@ -253,14 +285,19 @@ class PyWrap:
 
         # --- Create the module file
         self.cfile = open(self.pname+'pymodule.c','w')
+        # --- The C descriptors are only needed if there are assumed shape
+        # --- arguments, so that the header is otherwise not required.
+        if [f for f in self.flist if self.isbindc(f)]:
+            self.cw('#define FORTHON_CFI')
         self.cw('#include "Forthon.h"')
         self.cw('#include <setjmp.h>')
         self.cw('ForthonObject *'+self.pname+'Object;')
 
-        # --- See the kaboom command in Forthon.c for information on these two
+        # --- See the kaboom command in Forthon.c for information on these
         # --- variables.
-        self.cw('extern jmp_buf stackenvironment;')
-        self.cw('extern int lstackenvironmentset;')
+        self.cw('extern FORTHON_THREADLOCAL jmp_buf stackenvironment;')
+        self.cw('extern FORTHON_THREADLOCAL int lstackenvironmentset;')
+        self.cw('extern FORTHON_THREADLOCAL long lnreleased;')
 
         # --- Print out the external commands
         self.cw('extern void '+fname(self.fsub('passpointers'))+'(void);')
@@ -269,7 +306,7 @@ class PyWrap:
         # --- fortran routine prototypes
         for f in self.flist:
             # --- Functions
-            self.cw('extern '+fvars.ftoc(f.type)+' '+fname(f.name)+'(',noreturn=1)
+            self.cw('extern '+fvars.ftoc(f.type)+' '+self.fortranname(f)+'(',noreturn=1)
             i = 0
             istr = 0
             if len(f.args) == 0: self.cw('void',noreturn=1)
@@ -277,8 +314,13 @@ class PyWrap:
                 if i > 0:
                     self.cw(',',noreturn=1)
                 i = i + 1
-                self.cw(fvars.ftoc(a.type)+' ',noreturn=1)
-                if a.type == 'string' or a.type == 'character':
+                if a.assumedshape:
+                    self.cw('CFI_cdesc_t *',noreturn=1)
+                else:
+                    self.cw(fvars.ftoc(a.type)+' ',noreturn=1)
+                if a.assumedshape:
+                    pass
+                elif a.type == 'string' or a.type == 'character':
                     istr = istr + 1
                 else:
                     self.cw('*',noreturn=1)
@@ -484,7 +526,11 @@ class PyWrap:
         ###########################################################################
         # --- Now, the fun part, writing out the wrapper for the subroutine and
         # --- function calls.
+        # --- kroutine is the index of the routine in the method list, which is
+        # --- also its index in the call statistics.
+        kroutine = -1
         for f in self.flist:
+            if f.function: kroutine += 1
             # --- Write out the documentation first.
             docstring = ('static char doc_'+self.cname(f.name)+'[] = "'+f.name+
                          f.dimstring+'\n'+f.comment+'";')
@@ -496,22 +542,56 @@ class PyWrap:
             self.cw(repr(docstring)[1:-1])
             # --- Now write out the wrapper
             self.cw('static PyObject *')
-            self.cw(self.cname(f.name)+'(PyObject *self, PyObject *args)')
+            self.cw(self.cname(f.name)+'(PyObject *self, FORTHON_WRAPPERARGS)')
             self.cw('{')
 
+            # --- Scalar arguments passed in as python numbers are converted
+            # --- directly into C variables, avoiding the creation of a
+            # --- temporary array. This is only done for numeric arguments
+            # --- without dimensions.
+            # --- The data pointers of the other arguments, except strings and
+            # --- derived types, are held in data.
+            dataargs = [not fvars.isderivedtype(a) and
+                        a.type not in ['string','character'] for a in f.args]
+            scalarargs = [dataargs[i] and len(f.args[i].dims) == 0 and
+                          not f.args[i].assumedshape
+                          for i in range(len(f.args))]
+            # --- Numeric scalar arguments that are intent(out) are not passed
+            # --- in from python. They are held in sargs and their values are
+            # --- returned, after the function result if there is one.
+            outargs = [scalarargs[i] and f.args[i].intent == 'out' and
+                       f.args[i].type in ['integer','logical','real','double',
+                                          'float','complex']
+                       for i in range(len(f.args))]
+            nin = len(f.args) - outargs.count(True)
+
             # --- With arguments, it gets very messy
             lv = repr(len(f.args))
             if len(f.args) > 0:
                 self.cw('  PyObject * pyobj['+lv+'];')
                 self.cw('  PyArrayObject * ax['+lv+'];')
+                if True in dataargs:
+                    self.cw('  char * data['+lv+'];')
+                if True in scalarargs:
+                    self.cw('  Forthon_scalararg sargs['+lv+'];')
+                for i in range(len(f.args)):
+                    if f.args[i].assumedshape:
+                        self.cw('  CFI_CDESC_T(%d) cdesc%d;'%(f.args[i].assumedshape,i))
                 self.cw('  int i;')
                 self.cw('  char e[256];')
 
+            # --- Start time for the call statistics, see instrumentroutines
+            self.cw('  double fstart=0.;')
+
             if self.timeroutines:
                 # --- Setup for the timer, getting time routine started.
                 self.cw('  double time1,time2;')
                 self.cw('  time1 = cputime();')
 
+            # --- Holds the thread state while the GIL is released.
+            if self.isreleasegil(f):
+                self.cw('  PyThreadState *_save;')
+
             # --- For character arguments, need to create an FSTRING array.
             istr = 0
             for a in f.args:
@@ -521,43 +601,88 @@ class PyWrap:
                 self.cw('  FSTRING fstr['+repr(istr)+'];')
 
             # --- If this is a function, set up variables to hold return value
-            if f.type != 'void':
+            if f.type != 'void' or True in outargs:
                 self.cw('  PyObject * ret_val;')
+            if f.type != 'void':
                 self.cw('  '+fvars.ftoc(f.type)+' r;')
 
             # --- Set all of the ax's to NULL
             if len(f.args) > 0:
                 self.cw('  for (i=0;i<'+repr(len(f.args))+';i++) ax[i] = NULL;')
 
-            # --- Parse incoming arguments into a list of PyObjects
-            self.cw('  if (!PyArg_ParseTuple(args, "'+'O'*len(f.args)+'"',noreturn=1)
-            for i in range(len(f.args)):
-                self.cw(',&pyobj['+repr(i)+']',noreturn=1)
-            self.cw(')) return NULL;')
+            self.cw('  if (Forthon_instrumenting) fstart = Forthon_walltime();')
+
+            # --- Get the incoming arguments as a list of PyObjects
+            if len(f.args) > 0:
+                self.cw('  if (!Forthon_getsubroutineargs(FORTHON_WRAPPERPASSARGS,"'+f.name+'",'+
+                        repr(nin)+',pyobj)) return NULL;')
+                # --- Move the inputs to the positions of their arguments,
+                # --- skipping the out arguments. This is done from the end
+                # --- so that no input is overwritten before it is moved.
+                if nin < len(f.args):
+                    k = nin
+                    for i in range(len(f.args)-1,-1,-1):
+                        if outargs[i]:
+                            self.cw('  pyobj[%d] = Py_None;'%i)
+                        else:
+                            k -= 1
+                            if k != i: self.cw('  pyobj[%d] = pyobj[%d];'%(i,k))
+            else:
+                self.cw('  if (!Forthon_getsubroutineargs(FORTHON_WRAPPERPASSARGS,"'+f.name+'",'+
+                        '0,NULL)) return NULL;')
 
             # --- Loop over arguments, extracting the data addresses.
             # --- Convert all arguments into arrays. This allows complete flexibility
             # --- in what can be passed to fortran functions.
             istr = 0
             for i in range(len(f.args)):
-                if not fvars.isderivedtype(f.args[i]):
-                    self.cw('  if (!Forthon_checksubroutineargtype(pyobj['+repr(i)+'],'+
+                if outargs[i]:
+                    self.cw('  memset(&sargs['+repr(i)+'],0,sizeof(Forthon_scalararg));')
+                    self.cw('  data['+repr(i)+'] = (char *)&sargs['+repr(i)+'];')
+                elif not fvars.isderivedtype(f.args[i]):
+                    if scalarargs[i]:
+                        self.cw('  if (Forthon_getscalararg(pyobj['+repr(i)+'],'+
+                                'NPY_'+fvars.ftop(f.args[i].type)+',&sargs['+repr(i)+'])) {')
+                        self.cw('    data['+repr(i)+'] = (char *)&sargs['+repr(i)+'];}')
+                        self.cw('  else {')
+                        ind = '  '
+                    else:
+                        ind = ''
+                    self.cw(ind+'  if (!Forthon_checksubroutineargtype(pyobj['+repr(i)+'],'+
                         'NPY_'+fvars.ftop(f.args[i].type)+')) {')
-                    self.cw('    sprintf(e,"Argument '+f.args[i].name+ ' in '+f.name+
+                    self.cw(ind+'    sprintf(e,"Argument '+f.args[i].name+ ' in '+f.name+
                                          ' has the wrong type");')
-                    self.cw('    PyErr_SetString(ErrorObject,e);')
-                    self.cw('    goto err;}')
-                    if f.function == 'fsub':
-                        self.cw('  ax['+repr(i)+'] = FARRAY_FROMOBJECT('+
+                    self.cw(ind+'    PyErr_SetString(ErrorObject,e);')
+                    self.cw(ind+'    goto err;}')
+                    if f.args[i].assumedshape:
+                        # --- Strided arrays are passed as is, without a copy.
+                        self.cw(ind+'  ax['+repr(i)+'] = Forthon_stridedarrayfromobject('+
+                              'pyobj['+repr(i)+'], NPY_'+fvars.ftop(f.args[i].type)+');')
+                    elif f.function == 'fsub' and f.args[i].intent == 'out':
+                        # --- The input data is not needed for intent(out), so
+                        # --- it is not copied into a temporary.
+                        self.cw(ind+'  ax['+repr(i)+'] = Forthon_outarrayfromobject('+
+                              'pyobj['+repr(i)+'], NPY_'+fvars.ftop(f.args[i].type)+');')
+                    elif f.function == 'fsub':
+                        self.cw(ind+'  ax['+repr(i)+'] = FARRAY_FROMOBJECT('+
                               'pyobj['+repr(i)+'], NPY_'+fvars.ftop(f.args[i].type)+');')
                     elif f.function == 'csub':
-                        self.cw('  ax['+repr(i)+']=(PyArrayObject *)PyArray_ContiguousFromObject('+
+                        self.cw(ind+'  ax['+repr(i)+']=(PyArrayObject *)PyArray_ContiguousFromObject('+
                               'pyobj['+repr(i)+'], NPY_'+fvars.ftop(f.args[i].type)+',0,0);')
-                    self.cw('  if (ax['+repr(i)+'] == NULL) {')
-                    self.cw('    sprintf(e,"There is an error in argument '+f.args[i].name+
+                    self.cw(ind+'  if (ax['+repr(i)+'] == NULL) {')
+                    self.cw(ind+'    sprintf(e,"There is an error in argument '+f.args[i].name+
                                          ' in '+f.name+'");')
-                    self.cw('    PyErr_SetString(ErrorObject,e);')
-                    self.cw('    goto err;}')
+                    self.cw(ind+'    PyErr_SetString(ErrorObject,e);')
+                    self.cw(ind+'    goto err;}')
+                    if f.args[i].assumedshape:
+                        self.cw(ind+'  if (!Forthon_setcdesc((CFI_cdesc_t *)&cdesc%d,ax[%d],%d,"%s","%s"))'%
+                                (i,i,f.args[i].assumedshape,f.args[i].name,f.name))
+                        self.cw(ind+'    goto err;')
+                        self.cw(ind+'  data['+repr(i)+'] = (char *)&cdesc%d;'%i)
+                    elif dataargs[i]:
+                        self.cw(ind+'  data['+repr(i)+'] = PyArray_BYTES(ax['+repr(i)+']);')
+                    if scalarargs[i]:
+                        self.cw('    }')
                     if f.args[i].type == 'string' or f.args[i].type == 'character':
                         self.cw(' FSETSTRING(fstr[%d],PyArray_BYTES(ax[%d]),PyArray_ITEMSIZE(ax[%d]));'
                                 %(istr,i,i))
@@ -592,7 +717,7 @@ class PyWrap:
                 # --- Declare the dimension variables.
                 for var,i in f.dimvars:
                     self.cw('  '+fvars.ftoc(var.type)+' '+var.name+'=*'+
-                            '('+fvars.ftoc(var.type)+' *)(PyArray_BYTES(ax['+repr(i)+']));')
+                            '('+fvars.ftoc(var.type)+' *)(data['+repr(i)+']);')
                 # --- Loop over the arguments, looking for dimensioned arrays
                 i = -1
                 for arg in f.args:
@@ -651,24 +776,34 @@ class PyWrap:
             # --- reset it.
             self.cw('  if (!(lstackenvironmentset++) && setjmp(stackenvironment)) goto err;')
 
+            # --- Release the GIL so that other python threads can run while
+            # --- in fortran. Any callbacks to python from fortran (such as
+            # --- gallot, gchange and kaboom in Forthon.c) reacquire it.
+            if self.isreleasegil(f):
+                self.cw('  Forthon_fstate->nreleased++;')
+                self.cw('  lnreleased++;')
+                self.cw('  _save = PyEval_SaveThread();')
+
             # --- Write the actual call to the fortran routine.
             if f.type == 'void':
                 self.cw('  ')
             else:
                 self.cw('  r = ')
-            self.cw(fname(f.name)+'(',noreturn=1)
+            self.cw(self.fortranname(f)+'(',noreturn=1)
             i = 0
             istr = 0
             for a in f.args:
                 if i > 0:
                     self.cw(',',noreturn=1)
-                if fvars.isderivedtype(a):
+                if a.assumedshape:
+                    self.cw('(CFI_cdesc_t *)(data['+repr(i)+'])',noreturn=1)
+                elif fvars.isderivedtype(a):
                     self.cw('((ForthonObject *)(pyobj['+repr(i)+']))->fobj',noreturn=1)
                 elif a.type == 'string' or a.type == 'character':
                     self.cw('fstr[%d]'%(istr),noreturn=1)
                     istr = istr + 1
                 else:
-                    self.cw('('+fvars.ftoc(a.type)+' *)(PyArray_BYTES(ax['+repr(i)+']))',noreturn=1)
+                    self.cw('('+fvars.ftoc(a.type)+' *)(data['+repr(i)+'])',noreturn=1)
                 i = i + 1
             if charlen_at_end:
                 i = 0
@@ -681,18 +816,40 @@ class PyWrap:
 
             self.cw(');') # --- Closing parenthesis on the call list
 
+            if self.isreleasegil(f):
+                self.cw('  PyEval_RestoreThread(_save);')
+                self.cw('  lnreleased--;')
+                self.cw('  Forthon_fstate->nreleased--;')
+
             # --- Decrement the counter. This will reach zero when the top of the
             # --- fortran call chain is reached and is about to return to the top
             # --- level python.
             self.cw('  lstackenvironmentset--;')
 
+            # --- Fortran may have changed array pointers, so mark the pointers
+            # --- as out of date. See updatearray in Forthon.h.
+            self.cw('  Forthon_fstate->generation++;')
+
             # --- Copy the data that was sent to the routine back into the passed
             # --- in object if it is an PyArray.
             # --- Decrement reference counts of array objects created.
             # --- This is now handled by a separate subroutine included in Forthon.h
+            # --- Arguments that are intent(in) are not copied back.
+            # --- The call statistics are recorded first since they include the
+            # --- size of the array arguments.
+            if len(f.args) > 0:
+                self.cw('  if (Forthon_instrumenting && fstart > 0.)')
+                self.cw('    Forthon_addroutinestats(%d,fstart,%d,ax);'%(kroutine,len(f.args)))
+            else:
+                self.cw('  if (Forthon_instrumenting && fstart > 0.)')
+                self.cw('    Forthon_addroutinestats(%d,fstart,0,(PyArrayObject **)NULL);'%kroutine)
             if len(f.args) > 0:
+                intents = ''.join([{'in':'i','out':'o','inout':'b'}[a.intent]
+                                   for a in f.args])
+                if intents == len(f.args)*'b': intents = 'NULL'
+                else:                          intents = '"'+intents+'"'
                 self.cw('  Forthon_restoresubroutineargs('+repr(len(f.args))+
-                           ',pyobj,ax);')
+                           ',pyobj,ax,'+intents+');')
 
             if self.timeroutines:
                 # --- Now get ending time and add to timer variable
@@ -701,16 +858,44 @@ class PyWrap:
                              repr(self.sdict[f.name+'runtime'])+'].data += (time2-time1);')
 
             # --- Write return sequence
-            if f.type == 'void':
+            # --- The out arguments are returned with the function result, as a
+            # --- tuple if there is more than one value.
+            retformat = ''
+            retvalues = ''
+            if f.type != 'void':
+                retformat = fvars.fto1[f.type]
+                retvalues = ', r'
+            for i in range(len(f.args)):
+                if outargs[i]:
+                    member = {'long':'l','double':'d','float':'f',
+                              'Py_complex':'c'}[fvars.ftoc(f.args[i].type)]
+                    retformat += fvars.fto1[f.args[i].type]
+                    if member == 'c':
+                        retvalues += ', &sargs[%d].c'%i
+                    else:
+                        retvalues += ', sargs[%d].%s'%(i,member)
+            if len(retformat) > 1: retformat = '('+retformat+')'
+            if retformat == '':
                 self.cw('  returnnone;')
             else:
-                self.cw('  ret_val = Py_BuildValue ("'+fvars.fto1[f.type]+'", r);')
+                self.cw('  ret_val = Py_BuildValue ("'+retformat+'"'+retvalues+');')
                 self.cw('  return ret_val;')
 
             # --- Error section, in case there was an error above or in the
             # --- fortran call
             self.cw('err:')
 
+            # --- After a longjmp from kaboom, which is the only way to get
+            # --- here with lstackenvironmentset zero and GIL releases counted,
+            # --- undo the counts of the releases by this wrapper and by any
+            # --- nested wrappers that the longjmp skipped over. The GIL has
+            # --- already been reacquired, see kaboom in Forthon.c.
+            self.cw('  if (lstackenvironmentset == 0 && lnreleased > 0) {')
+            self.cw('    Forthon_fstate->nreleased -= lnreleased;')
+            self.cw('    lnreleased = 0;')
+            self.cw('    }')
+            self.cw('  Forthon_fstate->generation++;')
+
             if len(f.args) > 0:
                 # --- Decrement reference counts of array objects created.
                 self.cw('  for (i=0;i<'+repr(len(f.args))+';i++)')
@@ -728,13 +913,17 @@ class PyWrap:
         self.cw('static struct PyMethodDef '+self.pname+'_methods[] = {')
         for f in self.flist:
             if f.function:
-                self.cw('{"'+f.name+'",(PyCFunction)'+self.cname(f.name)+',1,'+
-                        'doc_'+self.cname(f.name)+'},')
+                self.cw('{"'+f.name+'",(PyCFunction)(void(*)(void))'+self.cname(f.name)+
+                        ',FORTHON_WRAPPERFLAGS,doc_'+self.cname(f.name)+'},')
         for t in self.typelist:
             self.cw('{"'+t.name+'",(PyCFunction)'+self.cname(t.name)+'New,1,'+
                     '"Creates a new instance of fortran derived type '+t.name+'"},')
         self.cw('{NULL,NULL}};')
         self.cw('')
+        nroutines = len([f for f in self.flist if f.function])
+        self.cw('static Forthon_routinestats '+self.pname+'_routinestats[%d];'%
+                max(1,nroutines))
+        self.cw('')
 
         ###########################################################################
         # --- Write static array initialization routines
@@ -904,6 +1093,10 @@ class PyWrap:
             self.cw('    return NULL;')
         else:
             self.cw('    return;')
+        self.cw('  Forthon_initfortranstate();')
+        self.cw('  Forthon_nroutines = %d;'%nroutines)
+        self.cw('  Forthon_routinemethods = '+self.pname+'_methods;')
+        self.cw('  Forthon_routinestatslist = '+self.pname+'_routinestats;')
 
         if sys.hexversion >= 0x03000000:
             self.cw('  m = PyModule_Create(&moduledef);')
@@ -944,6 +1137,12 @@ class PyWrap:
         self.cw('    Py_FatalError("can not initialize module '+self.pname+'");')
         self.cw('    }')
         self.cw('  import_array();')
+        if [f for f in self.flist if self.isreleasegil(f)]:
+            # --- Make sure that the GIL exists so that it can be released.
+            # --- This is automatic in newer versions of python.
+            self.cw('#if PY_VERSION_HEX < 0x03070000')
+            self.cw('  PyEval_InitThreads();')
+            self.cw('#endif')
         self.cw('  '+self.pname+'declarevars('+self.pname+'Object);')
         self.cw('  Forthon_BuildDicts('+self.pname+'Object);')
         self.cw('  ForthonPackage_allotdims('+self.pname+'Object);')
@@ -1242,6 +1441,7 @@ def wrappergenerator_main(argv=None,writef90modulesonly=0):
     fcompname = options.fcomp
     writemodules = options.writemodules
     timeroutines = options.timeroutines
+    releasegil = options.releasegil
     otherinterfacefiles = options.othermacros
 
     # --- a list of scalar dictionaries from other modules.
@@ -1251,7 +1451,7 @@ def wrappergenerator_main(argv=None,writef90modulesonly=0):
 
     cc = PyWrap(ifile,pname,psuffix,pkgbase,initialgallot,writemodules,
                 otherinterfacefiles,other_scalar_vars,timeroutines,
-                otherfortranfiles,fcompname)
+                otherfortranfiles,fcompname,releasegil)
     if writef90modulesonly:
         cc.writef90modules()
     else: